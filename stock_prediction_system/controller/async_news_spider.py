@@ -0,0 +1,223 @@
+import asyncio
+import math
+import random
+import time
+from datetime import datetime
+
+import aiohttp
+from tqdm import tqdm
+
+from stock_prediction_system.controller.google_real_time_news import CnyesNewsSpider
+
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity):
+        """
+        令牌桶限流器，平均每秒最多放行 rate 個請求，瞬間最多放行 capacity 個。
+
+        :param rate: 每秒補充的令牌數
+        :param capacity: 令牌桶容量（允許的瞬間請求數）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """ 取得一個令牌，令牌不足時等待補充 """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncCnyesNewsSpider(CnyesNewsSpider):
+
+    def __init__(self, rate_limit=2.0, burst=4, max_concurrency=4, max_retries=5,
+                 backoff_base=1.0, backoff_max=30.0, api_url=None):
+        """
+        以 asyncio 並行抓取鉅亨網新聞列表，共用 keep-alive 連線池。
+
+        :param rate_limit: 每秒最多發出的請求數（令牌桶補充速率）
+        :param burst: 令牌桶容量，允許的瞬間請求數
+        :param max_concurrency: 同時進行中的請求上限
+        :param max_retries: 單頁最多重試次數
+        :param backoff_base: 指數退避的基準秒數
+        :param backoff_max: 指數退避的最長等待秒數
+        :param api_url: 新聞列表 API 位址，預設為鉅亨網，測試時可指向本機 stub server
+        """
+        super().__init__()
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        if api_url:
+            self.api_url = api_url
+
+    def get_backoff_delay(self, attempt):
+        """ 帶隨機抖動的指數退避（full jitter），避免所有請求同時重試 """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def get_newslist_info_async(self, session, bucket, semaphore, page=1, limit=30,
+                                      start_time=None, end_time=None):
+        """ 新聞列表（非同步版本），重試時使用指數退避取代固定延遲
+
+        :param session: 共用的 aiohttp.ClientSession
+        :param bucket: 共用的 TokenBucket
+        :param semaphore: 限制並行數量的 asyncio.Semaphore
+        :return newslist_info: 新聞資料
+        :raises ConnectionError: 重試 max_retries 次後仍失敗
+        """
+        params = self.get_params(page=page, limit=limit, start_time=start_time, end_time=end_time)
+
+        for attempt in range(self.max_retries):
+            await bucket.acquire()
+            try:
+                async with semaphore:
+                    async with session.get(self.api_url, headers=self.get_headers(), params=params) as r:
+                        if r.status == 200:
+                            return (await r.json(content_type=None))['items']
+                        print(f'請求失敗，頁數: {page}，狀態碼: {r.status}')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f'請求失敗，頁數: {page}，錯誤: {e}')
+            await asyncio.sleep(self.get_backoff_delay(attempt))
+
+        # 不以空頁代替，否則呼叫端會把有缺漏的結果當成完整抓取，增量模式的 high-water mark 也會越過缺漏的新聞
+        raise ConnectionError(f'新聞列表第 {page} 頁重試 {self.max_retries} 次後仍失敗')
+
+    @staticmethod
+    def _raise_failed_pages(pages, results):
+        """ 檢查 gather(return_exceptions=True) 的結果，有頁面抓取失敗時一次回報所有失敗的頁數 """
+        failed_pages = []
+        for page, result in zip(pages, results):
+            if isinstance(result, ConnectionError):
+                failed_pages.append(page)
+            elif isinstance(result, BaseException):
+                raise result
+        if failed_pages:
+            raise ConnectionError(f'新聞列表第 {failed_pages} 頁重試後仍失敗，停止抓取以免留下缺漏')
+
+    async def fetch_all_news_within_timeframe_async(self, limit=30, start_time=None, end_time=None):
+        """ 根據起訖時間並行抓取所有新聞資料，結果依發佈順序排列並以 newsId 去重；任一頁重試後仍失敗時拋出 ConnectionError """
+        bucket = TokenBucket(self.rate_limit, self.burst)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+
+        async with aiohttp.ClientSession(connector=connector) as session:
+            # 第一頁回傳新聞總數，據此決定需要抓取的頁數
+            first_page = await self.get_newslist_info_async(
+                session, bucket, semaphore, page=1, limit=limit, start_time=start_time, end_time=end_time
+            )
+            if not first_page or not first_page.get("data"):
+                return []
+
+            last_page = first_page.get("last_page") or math.ceil(first_page.get("total", 0) / limit)
+            pages = [first_page]
+
+            with tqdm(total=first_page.get("total", 0), desc="Fetching News", unit="news") as pbar:
+                pbar.update(len(first_page["data"]))
+
+                async def fetch_page(page):
+                    newslist_info = await self.get_newslist_info_async(
+                        session, bucket, semaphore, page=page, limit=limit, start_time=start_time, end_time=end_time
+                    )
+                    if newslist_info and newslist_info.get("data"):
+                        pbar.update(len(newslist_info["data"]))
+                    return newslist_info
+
+                # gather 會依照傳入順序回傳結果，保持頁面順序；等所有頁面結束後才檢查失敗，連線池關閉時沒有進行中的請求
+                page_numbers = range(2, last_page + 1)
+                results = await asyncio.gather(*(fetch_page(page) for page in page_numbers), return_exceptions=True)
+                self._raise_failed_pages(page_numbers, results)
+                pages += results
+
+        all_news_data = []
+        seen_news_ids = set()
+        for newslist_info in pages:
+            all_news_data.extend(self.filter_news_page(newslist_info, seen_news_ids, start_time, end_time))
+
+        return all_news_data
+
+    def filter_news_page(self, newslist_info, seen_news_ids, start_time=None, end_time=None):
+        """ 篩選單頁新聞：只保留起訖時間內且尚未出現過的 newsId """
+        if not newslist_info:
+            return []
+
+        start_at = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S") if start_time else None
+        end_at = datetime.strptime(end_time, "%Y-%m-%d %H:%M:%S") if end_time else None
+
+        news_page = []
+        for news in newslist_info["data"]:
+            # 並行抓取期間若有新文章發佈，頁面會位移，同一篇新聞可能出現在相鄰兩頁
+            if news["newsId"] in seen_news_ids:
+                continue
+            news_publish_time = datetime.fromtimestamp(news["publishAt"])
+            if end_at and news_publish_time > end_at:
+                continue  # 跳過超過結束時間的新聞
+            if start_at and news_publish_time < start_at:
+                continue  # 跳過早於開始時間的新聞
+            seen_news_ids.add(news["newsId"])
+            news_page.append(self.parse_news(news))
+
+        return news_page
+
+    def iter_news_pages(self, limit=30, start_time=None, end_time=None):
+        """ 逐批並行抓取新聞，每批最多 max_concurrency 頁，依頁面順序逐頁產出，記憶體只保留一批；
+        某一批有頁面重試後仍失敗時拋出 ConnectionError，已產出的頁面不受影響 """
+        loop = asyncio.new_event_loop()
+        bucket = TokenBucket(self.rate_limit, self.burst)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def open_session():
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+            return aiohttp.ClientSession(connector=connector)
+
+        async def fetch_pages(session, pages):
+            results = await asyncio.gather(*(
+                self.get_newslist_info_async(session, bucket, semaphore, page=page, limit=limit,
+                                             start_time=start_time, end_time=end_time)
+                for page in pages
+            ), return_exceptions=True)
+            self._raise_failed_pages(pages, results)
+            return results
+
+        session = loop.run_until_complete(open_session())
+        try:
+            seen_news_ids = set()
+            first_page = loop.run_until_complete(fetch_pages(session, [1]))[0]
+            if not first_page or not first_page.get("data"):
+                return
+            yield self.filter_news_page(first_page, seen_news_ids, start_time, end_time)
+
+            last_page = first_page.get("last_page") or math.ceil(first_page.get("total", 0) / limit)
+            for batch_start in range(2, last_page + 1, self.max_concurrency):
+                batch_pages = range(batch_start, min(batch_start + self.max_concurrency, last_page + 1))
+                for newslist_info in loop.run_until_complete(fetch_pages(session, batch_pages)):
+                    yield self.filter_news_page(newslist_info, seen_news_ids, start_time, end_time)
+        finally:
+            loop.run_until_complete(session.close())
+            loop.close()
+
+    def fetch_all_news_within_timeframe(self, limit=30, start_time=None, end_time=None):
+        """ 根據起訖時間抓取所有新聞資料（同步介面，內部以 asyncio 並行抓取） """
+        return asyncio.run(self.fetch_all_news_within_timeframe_async(
+            limit=limit, start_time=start_time, end_time=end_time
+        ))
+
+
+if __name__ == "__main__":
+    async_cnyes_news_spider = AsyncCnyesNewsSpider(rate_limit=2.0, max_concurrency=4)
+    all_news_data_json = async_cnyes_news_spider.fetch_all_news_within_timeframe(
+        start_time="2024-06-01 00:00:00",
+        end_time="2024-06-05 23:59:59"
+    )
+    print(f"fetched {len(all_news_data_json)} news")
@@ -0,0 +1,313 @@
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 年化報酬與 Sharpe 使用的年交易日數
+TRADING_DAYS_PER_YEAR = 252
+
+# 每個設定的預設值；rule 為 top_n（近期提及最多的前 N 檔）或 spike（提及次數 z-score 超過門檻）
+DEFAULT_CONFIG = {'rule': 'top_n', 'lookback': 5, 'top_n': 10, 'z_threshold': 3.0, 'min_mentions': 1,
+                  'holding_days': 1, 'cost_bps': 15.0}
+
+
+def expand_grid(param_grid: Dict[str, Iterable]) -> List[dict]:
+    """
+    展開參數網格。
+
+    :param param_grid: 參數名稱 -> 候選值列表，未列出的參數使用 DEFAULT_CONFIG。
+    :return: 所有組合的設定列表。
+    """
+    names = list(param_grid)
+    return [{**DEFAULT_CONFIG, **dict(zip(names, values))}
+            for values in itertools.product(*(param_grid[name] for name in names))]
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """沿日期軸的滾動加總（含當天），以累積和相減一次算完所有股票"""
+    cumulative = np.cumsum(values, axis=0, dtype=np.float64)
+    rolled = cumulative.copy()
+    rolled[window:] -= cumulative[:-window]
+    return rolled
+
+
+class MentionBacktester:
+
+    def __init__(self, mention_counts: pd.DataFrame, close: pd.DataFrame) -> None:
+        """
+        以 NumPy 陣列運算對所有日期與股票一次回測新聞提及訊號，沒有逐日或逐檔的迴圈。
+        第 t 日的訊號只使用 t 日收盤前的提及次數，於 t 日收盤進場，報酬從 t+1 日起計算。
+
+        :param mention_counts: index 為交易日、欄位為股票代碼的提及次數（MentionMatrixStore.trading_day_counts）。
+        :param close: 與 mention_counts 相同形狀的收盤價，停牌或未上市為 NaN。
+        """
+        close = close.reindex(index=mention_counts.index, columns=mention_counts.columns)
+        self.dates = mention_counts.index
+        self.stock_codes = mention_counts.columns
+        self.mentions = mention_counts.to_numpy(dtype=np.float64)
+        self.close = close.to_numpy(dtype=np.float64)
+        # 收盤價存在才可進場
+        self.tradable = ~np.isnan(self.close)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            next_returns = np.full(self.close.shape, np.nan)
+            next_returns[:-1] = self.close[1:] / self.close[:-1] - 1
+        # 持有期間遇到停牌視為報酬 0
+        self.next_returns = np.nan_to_num(next_returns, nan=0.0)
+        self._mention_sum_cache: Dict[int, np.ndarray] = {}
+        self._score_cache: Dict[Tuple[str, int], np.ndarray] = {}
+        self._candidate_cache: Dict[Tuple[str, int, float], Tuple[np.ndarray, np.ndarray]] = {}
+        self._excess_cache: Dict[int, np.ndarray] = {}
+
+    def _mention_sum(self, lookback: int) -> np.ndarray:
+        """最近 lookback 天（含當天）的提及次數"""
+        if lookback not in self._mention_sum_cache:
+            self._mention_sum_cache[lookback] = _rolling_sum(self.mentions, lookback)
+        return self._mention_sum_cache[lookback]
+
+    def _scores(self, rule: str, lookback: int) -> np.ndarray:
+        key = (rule, lookback)
+        if key not in self._score_cache:
+            if rule == 'top_n':
+                scores = self._mention_sum(lookback)
+            elif rule == 'spike':
+                # 今天的提及次數相對過去 lookback 天（不含今天）的 z-score；標準差至少 1 次
+                history_sum = self._mention_sum(lookback + 1) - self.mentions
+                history_square_sum = _rolling_sum(self.mentions ** 2, lookback + 1) - self.mentions ** 2
+                history_days = np.minimum(np.arange(len(self.mentions)), lookback)[:, None].astype(np.float64)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    mean = history_sum / history_days
+                    variance = history_square_sum / history_days - mean ** 2
+                std = np.sqrt(np.clip(np.nan_to_num(variance), 0, None))
+                scores = (self.mentions - np.nan_to_num(mean)) / np.maximum(std, 1.0)
+                scores[:lookback] = np.nan  # 歷史不足
+            else:
+                raise ValueError(f"unknown rule: {rule}")
+            self._score_cache[key] = scores
+        return self._score_cache[key]
+
+    def _forward_excess(self, holding_days: int) -> np.ndarray:
+        """持有 holding_days 天的報酬率減去同期全市場平均，用於計算命中率"""
+        if holding_days not in self._excess_cache:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                forward = np.full(self.close.shape, np.nan)
+                forward[:-holding_days] = self.close[holding_days:] / self.close[:-holding_days] - 1
+            market = np.nanmean(np.where(np.isnan(forward).all(axis=1, keepdims=True), 0, forward), axis=1,
+                                keepdims=True)
+            self._excess_cache[holding_days] = forward - market
+        return self._excess_cache[holding_days]
+
+    def _candidates(self, rule: str, lookback: int, min_mentions: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        可進場的位置（攤平成 日期 * 股票數 + 股票 的索引）與分數，依日期、分數由高到低排序。
+        提及次數稀疏，之後的選股只需處理這些位置，不必對整張表運算。
+        """
+        key = (rule, lookback, min_mentions)
+        if key not in self._candidate_cache:
+            scores = self._scores(rule, lookback)
+            eligible = self.tradable & (self._mention_sum(lookback) >= min_mentions) & ~np.isnan(scores)
+            flat_index = np.flatnonzero(eligible)
+            candidate_scores = scores.ravel()[flat_index]
+            order = np.lexsort((-candidate_scores, flat_index // scores.shape[1]))
+            self._candidate_cache[key] = (flat_index[order], candidate_scores[order])
+        return self._candidate_cache[key]
+
+    def picks(self, config: dict) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        每日選股結果。
+
+        :return: (日期索引, 股票索引) 陣列，依日期排序。
+        """
+        config = {**DEFAULT_CONFIG, **config}
+        flat_index, scores = self._candidates(config['rule'], int(config['lookback']), config['min_mentions'])
+        stock_count = self.mentions.shape[1]
+        rows = flat_index // stock_count
+
+        if config['rule'] == 'top_n':
+            # 候選已依日期與分數排序，當天名次 = 位置 - 當天第一個候選的位置
+            row_starts = np.searchsorted(rows, rows, side='left')
+            keep = np.arange(len(rows)) - row_starts < int(config['top_n'])
+        else:
+            keep = scores >= config['z_threshold']
+        return rows[keep], flat_index[keep] % stock_count
+
+    def signals(self, config: dict) -> np.ndarray:
+        """
+        每日選股結果。
+
+        :return: 形狀為 (日期數, 股票數) 的布林陣列。
+        """
+        rows, columns = self.picks(config)
+        selected = np.zeros(self.mentions.shape, dtype=bool)
+        selected[rows, columns] = True
+        return selected
+
+    def run(self, config: dict, return_series: bool = False):
+        """
+        回測單一設定。持有 holding_days 天時，每天以 1 / holding_days 的資金建立當天的等權重投組，
+        持倉為最近 holding_days 天投組的平均，沒有訊號的部分保留現金。
+        只對選中的位置運算，成本與選股數 × 持有天數成正比，與股票總數無關。
+
+        :param config: 設定，未提供的參數使用 DEFAULT_CONFIG。
+        :param return_series: 是否同時回傳每日淨報酬。
+        :return: 績效指標 dict；return_series 為 True 時回傳 (指標, 每日淨報酬 Series)。
+        """
+        config = {**DEFAULT_CONFIG, **config}
+        holding_days = int(config['holding_days'])
+        day_count, stock_count = self.mentions.shape
+        rows, columns = self.picks(config)
+
+        pick_counts = np.bincount(rows, minlength=day_count)
+        pick_weights = 1.0 / (holding_days * pick_counts[rows])
+
+        # 第 t 日選出的股票在 t .. t + holding_days - 1 日持有，報酬為持有日的隔日報酬
+        held_rows = (rows[None, :] + np.arange(holding_days)[:, None]).ravel()
+        held_columns = np.tile(columns, holding_days)
+        held_weights = np.tile(pick_weights, holding_days)
+        in_range = held_rows < day_count
+        held_rows, held_columns, held_weights = held_rows[in_range], held_columns[in_range], held_weights[in_range]
+        gross_returns = np.bincount(held_rows, weights=held_weights * self.next_returns[held_rows, held_columns],
+                                    minlength=day_count)
+
+        # 持倉變動 = (當天新投組 - holding_days 天前的投組) / holding_days，同一股票的進出先相加再取絕對值
+        change_rows = np.concatenate([rows, rows + holding_days])
+        change_keys = change_rows * stock_count + np.concatenate([columns, columns])
+        change_weights = np.concatenate([pick_weights, -pick_weights])
+        unique_keys, key_positions = np.unique(change_keys, return_inverse=True)
+        net_changes = np.abs(np.bincount(key_positions, weights=change_weights))
+        turnover = np.bincount(unique_keys // stock_count, weights=net_changes,
+                               minlength=day_count + holding_days)[:day_count]
+        net_returns = (gross_returns - turnover * config['cost_bps'] / 10000)[:-1]  # 最後一天沒有隔日報酬
+
+        held_positions = np.bincount(np.unique(held_rows * stock_count + held_columns) // stock_count,
+                                     minlength=day_count)
+        exposure = np.bincount(held_rows, weights=held_weights, minlength=day_count)
+
+        pick_excess = self._forward_excess(holding_days)[rows, columns]
+        pick_excess = pick_excess[~np.isnan(pick_excess)]
+        pick_total = len(pick_excess)
+
+        equity = np.cumprod(1 + net_returns)
+        years = max(len(net_returns), 1) / TRADING_DAYS_PER_YEAR
+        volatility = net_returns.std() * np.sqrt(TRADING_DAYS_PER_YEAR) if len(net_returns) else 0.0
+        metrics = {
+            **config,
+            'total_return': float(equity[-1] - 1) if len(equity) else 0.0,
+            'annual_return': float(equity[-1] ** (1 / years) - 1) if len(equity) and equity[-1] > 0 else -1.0,
+            'annual_volatility': float(volatility),
+            'sharpe': float(net_returns.mean() * TRADING_DAYS_PER_YEAR / volatility) if volatility > 0 else 0.0,
+            'max_drawdown': float((equity / np.maximum.accumulate(equity) - 1).min()) if len(equity) else 0.0,
+            'hit_rate': float((pick_excess > 0).mean()) if pick_total else np.nan,
+            'avg_turnover': float(turnover[:-1].mean() / 2) if len(net_returns) else 0.0,
+            'avg_positions': float(held_positions.mean()),
+            'exposure': float(exposure.mean()),
+            'picks': pick_total,
+        }
+        if return_series:
+            return metrics, pd.Series(net_returns, index=self.dates[:-1], name='net_return')
+        return metrics
+
+
+def _init_backtest_worker(backtester: MentionBacktester) -> None:
+    global _worker_backtester
+    _worker_backtester = backtester
+
+
+def _run_configs(configs: List[dict]) -> List[Tuple[dict, np.ndarray]]:
+    results = []
+    for config in configs:
+        metrics, net_returns = _worker_backtester.run(config, return_series=True)
+        results.append((metrics, net_returns.to_numpy()))
+    return results
+
+
+def run_sweep(backtester: MentionBacktester, configs: List[dict], workers: int = 4,
+              batch_size: int = 20) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    平行回測多組設定。面板資料只在子程序啟動時傳送一次，設定分批送出，
+    同一子程序內相同 rule 與 lookback 的分數會重複使用。
+
+    :param backtester: 已載入面板資料的回測器。
+    :param configs: 設定列表，例如 expand_grid 的輸出。
+    :param workers: 子程序數，1 表示在目前程序中依序執行。
+    :param batch_size: 每次送給子程序的設定數。
+    :return: (每組設定的績效指標，依 sharpe 由高到低排序, index 為日期、欄位為設定編號的每日淨報酬)。
+    """
+    # 相同分數的設定放在同一批，提高子程序內快取的命中率
+    order = sorted(range(len(configs)), key=lambda position: (str(configs[position].get('rule')),
+                                                              int(configs[position].get('lookback', 0))))
+    batches = [[configs[position] for position in order[start:start + batch_size]]
+               for start in range(0, len(order), batch_size)]
+
+    if workers <= 1:
+        _init_backtest_worker(backtester)
+        batch_results = [_run_configs(batch) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_backtest_worker,
+                                 initargs=(backtester,)) as executor:
+            batch_results = list(executor.map(_run_configs, batches))
+
+    results = [None] * len(configs)
+    for position, result in zip(order, itertools.chain.from_iterable(batch_results)):
+        results[position] = result
+
+    metrics = pd.DataFrame([metrics for metrics, _ in results])
+    metrics.insert(0, 'config_id', np.arange(len(configs)))
+    daily_returns = pd.DataFrame(np.column_stack([net_returns for _, net_returns in results]),
+                                 index=backtester.dates[:-1])
+    return metrics.sort_values('sharpe', ascending=False, kind='stable').reset_index(drop=True), daily_returns
+
+
+def walk_forward(daily_returns: pd.DataFrame, train_days: int = 252, test_days: int = 63) -> pd.DataFrame:
+    """
+    滾動樣本外驗證：每個區段以前 train_days 天 Sharpe 最高的設定，套用到接下來 test_days 天。
+
+    :param daily_returns: run_sweep 回傳的每日淨報酬，欄位為設定編號。
+    :return: 每個測試區段的 開始日期、結束日期、選用設定、訓練 Sharpe、測試報酬。
+    """
+    returns = daily_returns.to_numpy()
+    folds = []
+    for test_start in range(train_days, len(returns), test_days):
+        train = returns[test_start - train_days:test_start]
+        std = train.std(axis=0)
+        train_sharpe = np.divide(train.mean(axis=0), std, out=np.zeros(train.shape[1]), where=std > 0) \
+            * np.sqrt(TRADING_DAYS_PER_YEAR)
+        best = int(np.argmax(train_sharpe))
+        test = returns[test_start:test_start + test_days, best]
+        folds.append({
+            '開始日期': daily_returns.index[test_start],
+            '結束日期': daily_returns.index[min(test_start + test_days, len(returns)) - 1],
+            'config_id': daily_returns.columns[best],
+            'train_sharpe': float(train_sharpe[best]),
+            'test_return': float(np.prod(1 + test) - 1),
+        })
+    return pd.DataFrame(folds)
+
+
+if __name__ == "__main__":
+    # 模擬約 1,800 檔股票、5 年交易日，提及次數對隔日報酬有微弱的正向影響
+    rng = np.random.default_rng(0)
+    trade_dates = pd.DatetimeIndex(pd.bdate_range('2019-09-02', periods=1250), name='日期')
+    codes = pd.Index([str(code) for code in range(1101, 1101 + 1800)], name='股票代碼')
+    mention_panel = pd.DataFrame(rng.poisson(0.2, size=(len(trade_dates), len(codes))), index=trade_dates,
+                                 columns=codes)
+    daily_moves = rng.normal(0, 0.02, size=mention_panel.shape)
+    daily_moves[1:] += 0.002 * np.log1p(mention_panel.to_numpy()[:-1])
+    close_panel = pd.DataFrame(50 * np.exp(np.cumsum(daily_moves, axis=0)), index=trade_dates, columns=codes)
+
+    # 1,000 組設定
+    grid = expand_grid({'rule': ['top_n'], 'lookback': [1, 3, 5, 10, 20], 'top_n': [5, 10, 20, 50, 100],
+                        'holding_days': [1, 2, 3, 5, 10], 'cost_bps': [0, 10, 15, 30]})
+    grid += expand_grid({'rule': ['spike'], 'lookback': [5, 10, 20, 40, 60], 'z_threshold': [2, 3, 4, 5, 6],
+                         'holding_days': [1, 2, 3, 5, 10], 'cost_bps': [0, 10, 15, 30]})
+    sweep_backtester = MentionBacktester(mention_panel, close_panel)
+    start = time.perf_counter()
+    sweep_metrics, sweep_returns = run_sweep(sweep_backtester, grid, workers=4)
+    print(f"{len(grid)} configs over {len(trade_dates)} days x {len(codes)} stocks: "
+          f"{time.perf_counter() - start:.1f}s")
+    print(sweep_metrics[['rule', 'lookback', 'top_n', 'z_threshold', 'holding_days', 'cost_bps', 'annual_return',
+                         'sharpe', 'hit_rate', 'avg_turnover']].head(5).to_string(index=False))
+    print(walk_forward(sweep_returns).tail(3).to_string(index=False))
@@ -0,0 +1,215 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+import time
+import types
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+
+def code_fingerprint(code: types.CodeType) -> Dict[str, Any]:
+    """
+    將 code object 轉為可穩定序列化的內容，供指紋計算。
+
+    co_code 只有位元碼，修改字串或數字常數、改呼叫其他函式時不會改變，因此一併納入 co_consts 與 co_names；
+    巢狀函式與 lambda 的 code object 位於 co_consts 中，遞迴展開。
+
+    :param code: 函式的 __code__。
+    :return: 包含位元碼、常數與引用名稱的 dict。
+    """
+    consts = []
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            consts.append(code_fingerprint(const))
+        elif isinstance(const, frozenset):
+            # frozenset 的迭代順序受字串雜湊隨機化影響，排序後才能跨行程比較
+            consts.append(sorted(repr(item) for item in const))
+        else:
+            consts.append(repr(const))
+    return {"code": code.co_code.hex(), "consts": consts, "names": list(code.co_names)}
+
+
+class PipelineStep:
+
+    def __init__(self, name: str, func: Callable[..., Any], depends_on: Iterable[str] = (),
+                 params: Optional[Dict[str, Any]] = None, input_files: Iterable[str] = (),
+                 output_files: Iterable[str] = (), cache: bool = True, ttl_seconds: Optional[int] = None,
+                 version: Optional[Union[int, str]] = None) -> None:
+        """
+        DAG 中的單一步驟。
+
+        :param name: 步驟名稱，亦為其他步驟引用的鍵值。
+        :param func: 執行函式，呼叫方式為 func(*上游步驟輸出, **params)。
+        :param depends_on: 上游步驟名稱，輸出依序作為 func 的位置參數。
+        :param params: 步驟參數，會納入指紋計算。
+        :param input_files: 步驟讀取的檔案，檔案大小與修改時間會納入指紋計算。
+        :param output_files: 步驟產生的檔案，快取命中時若檔案不存在仍會重新執行。
+        :param cache: 是否快取步驟輸出。
+        :param ttl_seconds: 快取有效秒數，None 表示只要指紋不變就一直有效。
+        :param version: 步驟版本，會納入指紋計算。指紋只涵蓋 func 本身的程式碼，func 呼叫的其他模組
+                        （例如 pipelines 中的類別）修改後需調高 version，或手動清除 step_cache_path 下的快取。
+        """
+        self.name = name
+        self.func = func
+        self.depends_on: List[str] = list(depends_on)
+        self.params: Dict[str, Any] = params or {}
+        self.input_files: List[str] = list(input_files)
+        self.output_files: List[str] = list(output_files)
+        self.cache = cache
+        self.ttl_seconds = ttl_seconds
+        self.version = version
+
+    def fingerprint(self, upstream_fingerprints: List[str]) -> str:
+        """
+        以步驟參數、程式碼、上游指紋與輸入檔案狀態計算指紋。
+
+        :param upstream_fingerprints: 上游步驟的指紋，順序同 depends_on。
+        :return: sha256 十六進位字串。
+        """
+        input_files_state = []
+        for file_path in self.input_files:
+            if os.path.exists(file_path):
+                stat = os.stat(file_path)
+                input_files_state.append([file_path, stat.st_size, stat.st_mtime_ns])
+            else:
+                input_files_state.append([file_path, None, None])
+
+        code = getattr(self.func, "__code__", None)
+        payload = {
+            "name": self.name,
+            "func": getattr(self.func, "__qualname__", repr(self.func)),
+            "code": code_fingerprint(code) if code else None,
+            "version": self.version,
+            "params": self.params,
+            "upstream": upstream_fingerprints,
+            "input_files": input_files_state,
+            # 設定 ttl 時，每經過 ttl 秒指紋就會改變一次
+            "ttl_bucket": int(time.time() // self.ttl_seconds) if self.ttl_seconds else None,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class DagRunner:
+
+    def __init__(self, cache_dir: str, max_workers: int = 4) -> None:
+        """
+        依相依關係執行 PipelineStep，互不相依的步驟以執行緒並行，指紋未改變的步驟直接讀取快取。
+
+        :param cache_dir: 步驟輸出快取的資料夾。
+        :param max_workers: 同時執行的步驟數上限。
+        """
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.steps: Dict[str, PipelineStep] = {}
+        self.results: Dict[str, Any] = {}
+        self.fingerprints: Dict[str, str] = {}
+        self.run_stats: Dict[str, Dict[str, Any]] = {}
+
+    def add_step(self, name: str, func: Callable[..., Any], **kwargs: Any) -> PipelineStep:
+        """
+        新增步驟，參數同 PipelineStep。
+
+        :return: 新增的 PipelineStep。
+        """
+        if name in self.steps:
+            raise ValueError(f"Duplicated step name: {name}")
+        step = PipelineStep(name, func, **kwargs)
+        self.steps[name] = step
+        return step
+
+    def _cache_path(self, step: PipelineStep, fingerprint: str) -> str:
+        return os.path.join(self.cache_dir, f"{step.name}-{fingerprint[:16]}.pkl")
+
+    def _validate(self) -> None:
+        # 檢查未定義的上游步驟與循環相依
+        for step in self.steps.values():
+            for dependency in step.depends_on:
+                if dependency not in self.steps:
+                    raise ValueError(f"Step {step.name} depends on unknown step {dependency}")
+
+        visiting, visited = set(), set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle detected at step {name}")
+            visiting.add(name)
+            for dependency in self.steps[name].depends_on:
+                visit(dependency)
+            visiting.remove(name)
+            visited.add(name)
+
+        for name in self.steps:
+            visit(name)
+
+    def _run_step(self, step: PipelineStep) -> Any:
+        start = time.perf_counter()
+        fingerprint = step.fingerprint([self.fingerprints[dependency] for dependency in step.depends_on])
+        self.fingerprints[step.name] = fingerprint
+        cache_path = self._cache_path(step, fingerprint)
+
+        outputs_exist = all(os.path.exists(file_path) for file_path in step.output_files)
+        if step.cache and outputs_exist and os.path.exists(cache_path):
+            with open(cache_path, "rb") as cache_file:
+                result = pickle.load(cache_file)
+            self.run_stats[step.name] = {"cache": "hit", "seconds": time.perf_counter() - start}
+            return result
+
+        result = step.func(*[self.results[dependency] for dependency in step.depends_on], **step.params)
+
+        if step.cache:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # 同一步驟只保留最新一份快取
+            for stale_path in glob.glob(os.path.join(self.cache_dir, f"{step.name}-*.pkl")):
+                os.remove(stale_path)
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, "wb") as cache_file:
+                pickle.dump(result, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+
+        self.run_stats[step.name] = {"cache": "miss" if step.cache else "off", "seconds": time.perf_counter() - start}
+        return result
+
+    def run(self) -> Dict[str, Any]:
+        """
+        執行所有步驟。
+
+        :return: 步驟名稱 -> 步驟輸出。
+        """
+        self._validate()
+        pending = dict(self.steps)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                ready = [step for step in pending.values()
+                         if all(dependency in self.results for dependency in step.depends_on)]
+                for step in ready:
+                    del pending[step.name]
+                    running[executor.submit(self._run_step, step)] = step.name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    # 步驟失敗時直接拋出例外，尚未開始的步驟不再執行
+                    self.results[name] = future.result()
+
+        return self.results
+
+    def report(self) -> str:
+        """
+        產生每個步驟的執行時間與快取命中狀態。
+
+        :return: 報表文字。
+        """
+        lines = [f"{'step':<32}{'cache':<8}{'seconds':>10}"]
+        for name in self.steps:
+            stats = self.run_stats.get(name)
+            if stats:
+                lines.append(f"{name:<32}{stats['cache']:<8}{stats['seconds']:>10.3f}")
+        hits = sum(stats["cache"] == "hit" for stats in self.run_stats.values())
+        lines.append(f"cache hit {hits}/{len(self.run_stats)}")
+        return "\n".join(lines)
@@ -6,6 +6,9 @@ from tqdm import tqdm  # 引入 tqdm 進度條庫
 
 class CnyesNewsSpider():
 
+    source = "cnyes"
+    api_url = "https://api.cnyes.com/media/api/v1/newslist/category/headline"
+
     def __init__(self):
         self.user_agents = [
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.159 Safari/537.36',
@@ -13,6 +16,8 @@ class CnyesNewsSpider():
             'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
             # 更多 User-Agent 可隨時增加
         ]
+        # 重複使用同一個 Session，保持 keep-alive 連線
+        self.session = requests.Session()
 
     def get_headers(self):
         return {
@@ -21,15 +26,8 @@ class CnyesNewsSpider():
             'User-Agent': random.choice(self.user_agents),
         }
 
-    def get_newslist_info(self, page=1, limit=30, start_time=None, end_time=None):
-        """ 房屋詳情
-
-        :param page: 頁數
-        :param limit: 一頁新聞數量
-        :param start_time: 起始時間（格式：'YYYY-MM-DD HH:MM:SS'）
-        :param end_time: 結束時間（格式：'YYYY-MM-DD HH:MM:SS'）
-        :return newslist_info: 新聞資料
-        """
+    def get_params(self, page=1, limit=30, start_time=None, end_time=None):
+        """ 組合新聞列表 API 的查詢參數 """
         params = {
             'page': page,
             'limit': limit
@@ -41,11 +39,41 @@ class CnyesNewsSpider():
         if end_time:
             params['endAt'] = int(time.mktime(datetime.strptime(end_time, "%Y-%m-%d %H:%M:%S").timetuple()))
 
+        return params
+
+    @staticmethod
+    def parse_news(news):
+        """ 將 API 回傳的單篇新聞轉為統一的新聞資料格式 """
+        news_publish_time = datetime.fromtimestamp(news["publishAt"])
+        return {
+            "news_id": news["newsId"],
+            "url": f'https://news.cnyes.com/news/id/{news["newsId"]}',
+            "title": news["title"],
+            "content": news["content"],
+            "summary": news["summary"],
+            "keyword": news["keyword"],
+            "publish_at": news_publish_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "category_name": news["categoryName"],
+            "category_id": news["categoryId"],
+            "source": CnyesNewsSpider.source
+        }
+
+    def get_newslist_info(self, page=1, limit=30, start_time=None, end_time=None):
+        """ 新聞列表
+
+        :param page: 頁數
+        :param limit: 一頁新聞數量
+        :param start_time: 起始時間（格式：'YYYY-MM-DD HH:MM:SS'）
+        :param end_time: 結束時間（格式：'YYYY-MM-DD HH:MM:SS'）
+        :return newslist_info: 新聞資料
+        """
+        params = self.get_params(page=page, limit=limit, start_time=start_time, end_time=end_time)
+
         retry_count = 5
         while retry_count > 0:
             try:
-                r = requests.get(
-                    f"https://api.cnyes.com/media/api/v1/newslist/category/headline",
+                r = self.session.get(
+                    self.api_url,
                     headers=self.get_headers(),
                     params=params
                 )
@@ -66,6 +94,13 @@ class CnyesNewsSpider():
     def fetch_all_news_within_timeframe(self, limit=30, start_time=None, end_time=None):
         """ 根據起訖時間抓取所有新聞資料 """
         all_news_data = []
+        for news_page in self.iter_news_pages(limit=limit, start_time=start_time, end_time=end_time):
+            all_news_data.extend(news_page)
+
+        return all_news_data
+
+    def iter_news_pages(self, limit=30, start_time=None, end_time=None):
+        """ 根據起訖時間逐頁抓取新聞，每抓完一頁就產出該頁的新聞資料，下游可邊抓邊處理 """
         page = 1
         total_news_count = 0
 
@@ -79,39 +114,69 @@ class CnyesNewsSpider():
         # 使用 tqdm 進度條
         with tqdm(total=total_news_count, desc="Fetching News", unit="news") as pbar:
             while True:
-                newslist_info = self.get_newslist_info(page=page, limit=limit, start_time=start_time, end_time=end_time)
+                if page == 1 and initial_newslist_info:
+                    newslist_info = initial_newslist_info  # 第一頁已經抓過，不再重複請求
+                else:
+                    newslist_info = self.get_newslist_info(page=page, limit=limit, start_time=start_time, end_time=end_time)
                 if not newslist_info or not newslist_info["data"]:
                     break
 
+                news_page = []
                 for news in newslist_info["data"]:
                     news_publish_time = datetime.fromtimestamp(news["publishAt"])
                     if news_publish_time > datetime.strptime(end_time, "%Y-%m-%d %H:%M:%S"):
                         continue  # 跳過超過結束時間的新聞
                     if news_publish_time < datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S"):
-                        return all_news_data  # 如果新聞時間小於開始時間，則完成抓取
-
-                    news_data = {
-                        "news_id": news["newsId"],
-                        "url": f'https://news.cnyes.com/news/id/{news["newsId"]}',
-                        "title": news["title"],
-                        "content": news["content"],
-                        "summary": news["summary"],
-                        "keyword": news["keyword"],
-                        "publish_at": news_publish_time.strftime("%Y-%m-%d %H:%M:%S"),
-                        "category_name": news["categoryName"],
-                        "category_id": news["categoryId"]
-                    }
-                    all_news_data.append(news_data)
+                        yield news_page
+                        return  # 如果新聞時間小於開始時間，則完成抓取
+
+                    news_data = self.parse_news(news)
+                    news_page.append(news_data)
 
                     # 更新進度條
                     pbar.update(1)
 
+                yield news_page
+
                 if len(newslist_info["data"]) < limit:
                     break  # 如果返回的新聞數量小於限制，意味著沒有更多的新聞了
 
                 page += 1
                 time.sleep(random.uniform(3, 7))  # 隨機延遲，避免被反爬蟲機制偵測
 
+    def fetch_news_since(self, high_water_mark, limit=30, end_time=None):
+        """ 增量抓取：只抓取 high-water mark 之後的新聞，遇到已匯入的新聞即停止翻頁
+
+        :param high_water_mark: {"publish_at": 'YYYY-MM-DD HH:MM:SS', "news_ids": [...]}
+        :param limit: 一頁新聞數量
+        :param end_time: 結束時間（格式：'YYYY-MM-DD HH:MM:SS'），預設為現在
+        :return all_news_data: 新聞資料，由新到舊排列
+        """
+        last_publish_at = high_water_mark["publish_at"]
+        last_news_ids = set(high_water_mark["news_ids"])
+        end_time = end_time or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        all_news_data = []
+        page = 1
+        while True:
+            newslist_info = self.get_newslist_info(page=page, limit=limit, start_time=last_publish_at, end_time=end_time)
+            if not newslist_info or not newslist_info["data"]:
+                break
+
+            for news in newslist_info["data"]:
+                news_data = self.parse_news(news)
+                if news_data["publish_at"] > end_time:
+                    continue  # 跳過超過結束時間的新聞
+                if news_data["publish_at"] < last_publish_at or news_data["news_id"] in last_news_ids:
+                    return all_news_data  # 已到達上次匯入的位置，後面的新聞都已匯入過
+                all_news_data.append(news_data)
+
+            if len(newslist_info["data"]) < limit:
+                break  # 如果返回的新聞數量小於限制，意味著沒有更多的新聞了
+
+            page += 1
+            time.sleep(random.uniform(3, 7))  # 隨機延遲，避免被反爬蟲機制偵測
+
         return all_news_data
 
 if __name__ == "__main__":
@@ -0,0 +1,161 @@
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from stock_prediction_system.controller.security_master import SecurityMaster
+from stock_prediction_system.controller.sub_industry import SubIndustryTaxonomy
+
+
+class MentionAggregator:
+
+    def __init__(self, security_master: SecurityMaster, initial_days: int = 32,
+                 sub_industry: Optional[SubIndustryTaxonomy] = None) -> None:
+        """
+        以股票主檔的 stock_id 為索引，把提及次數直接累加在 NumPy 計數陣列中，不需逐筆保留命中紀錄。
+
+        :param security_master: 股票主檔，計數陣列長度等於主檔股票數。
+        :param initial_days: 每日計數矩陣預先配置的天數，不足時自動加倍。
+        :param sub_industry: 細產業分類，提供時可依細產業加總提及次數。
+        """
+        self.security_master = security_master
+        self.stock_counts: np.ndarray = np.zeros(len(security_master), dtype=np.int64)
+        # 依命中位置加權的次數，例如標題命中的權重高於內文
+        self.weighted_counts: np.ndarray = np.zeros(len(security_master), dtype=np.float64)
+        # 權重乘上提及情緒分數（-1 ~ 1）的加總，正值代表偏正面的報導較多；有評分時 stock_frame 才輸出情緒欄位
+        self.sentiment_counts: np.ndarray = np.zeros(len(security_master), dtype=np.float64)
+        self.has_sentiment = False
+        self.article_count = 0
+
+        industry = security_master.securities['產業別']
+        self._industry_codes: np.ndarray = industry.cat.codes.to_numpy()
+        self._industry_names = industry.cat.categories
+
+        # 股票 × 細產業 的 0/1 矩陣，一支股票可屬於多個細產業
+        self._sub_industry_names = np.array([], dtype=str)
+        self._sub_industry_indicator = None
+        if sub_industry is not None:
+            self._sub_industry_names = sub_industry.categories
+            self._sub_industry_indicator = sub_industry.indicator(security_master).T.tocsr()
+
+        # 每日計數矩陣：天 × 股票，記憶體只與天數和股票數有關
+        self._day_index: Dict[str, int] = {}
+        self._daily_counts: np.ndarray = np.zeros((initial_days, len(security_master)), dtype=np.int32)
+
+    def _day_row(self, publish_date: str) -> int:
+        row = self._day_index.get(publish_date)
+        if row is None:
+            row = len(self._day_index)
+            if row >= len(self._daily_counts):
+                self._daily_counts = np.vstack([self._daily_counts, np.zeros_like(self._daily_counts)])
+            self._day_index[publish_date] = row
+        return row
+
+    def add(self, stock_ids: Iterable[int], publish_at: Optional[str] = None,
+            weights: Optional[Iterable[float]] = None, sentiments: Optional[Iterable[float]] = None) -> None:
+        """
+        累加單篇文章提及的股票。
+
+        :param stock_ids: 文章提及的 stock_id，同一篇文章內不重複。
+        :param publish_at: 文章發佈時間（格式：'YYYY-MM-DD HH:MM:SS'），用於每日計數。
+        :param weights: 每個 stock_id 的權重，預設皆為 1。
+        :param sentiments: 每個 stock_id 的提及情緒分數（SentimentScorer），None 表示未評分。
+        """
+        stock_ids = np.asarray(stock_ids, dtype=np.int64)
+        self.article_count += 1
+        if sentiments is not None:
+            self.has_sentiment = True
+        if not len(stock_ids):
+            return
+        weights = np.ones(len(stock_ids)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.stock_counts[stock_ids] += 1
+        self.weighted_counts[stock_ids] += weights
+        if sentiments is not None:
+            self.sentiment_counts[stock_ids] += weights * np.asarray(sentiments, dtype=np.float64)
+        if publish_at:
+            self._daily_counts[self._day_row(publish_at[:10]), stock_ids] += 1
+
+    def stock_frame(self) -> pd.DataFrame:
+        """
+        個股提及次數，只包含至少被提及一次的股票。
+
+        :return: 欄位為 股票名稱、股票代碼、產業別、出現次數、加權次數 的 DataFrame；
+                 有情緒評分時另有 情緒加權次數（權重 × 情緒分數的加總）與 情緒分數（情緒加權次數 / 加權次數）。
+        """
+        mentioned = np.flatnonzero(self.stock_counts)
+        securities = self.security_master.securities.iloc[mentioned]
+        stock_frame = pd.DataFrame({
+            '股票名稱': securities['股票名稱'].to_numpy(),
+            '股票代碼': securities['股票代碼'].to_numpy(),
+            '產業別': securities['產業別'].astype(str).to_numpy(),
+            '出現次數': self.stock_counts[mentioned],
+            '加權次數': self.weighted_counts[mentioned],
+        })
+        if self.has_sentiment:
+            weighted_counts = self.weighted_counts[mentioned]
+            stock_frame['情緒加權次數'] = self.sentiment_counts[mentioned]
+            stock_frame['情緒分數'] = np.divide(self.sentiment_counts[mentioned], weighted_counts,
+                                            out=np.zeros_like(weighted_counts), where=weighted_counts > 0)
+        return stock_frame
+
+    def industry_frame(self) -> pd.DataFrame:
+        """
+        產業提及次數，以 bincount 依產業編碼加總個股計數。
+
+        :return: 欄位為 產業別、出現次數 的 DataFrame。
+        """
+        industry_counts = np.bincount(self._industry_codes, weights=self.stock_counts,
+                                      minlength=len(self._industry_names)).astype(np.int64)
+        mentioned = np.flatnonzero(industry_counts)
+        return pd.DataFrame({
+            '產業別': np.asarray(self._industry_names)[mentioned],
+            '出現次數': industry_counts[mentioned],
+        })
+
+    def sub_industry_frame(self) -> pd.DataFrame:
+        """
+        細產業提及次數，以稀疏矩陣乘上個股計數加總；同時屬於多個細產業的股票會分別計入。
+
+        :return: 欄位為 細產業、出現次數、加權次數 的 DataFrame，未提供細產業分類時為空表。
+        """
+        if self._sub_industry_indicator is None:
+            return pd.DataFrame({'細產業': [], '出現次數': [], '加權次數': []})
+        sub_industry_counts = (self._sub_industry_indicator @ self.stock_counts).astype(np.int64)
+        sub_industry_weighted = self._sub_industry_indicator @ self.weighted_counts
+        mentioned = np.flatnonzero(sub_industry_counts)
+        return pd.DataFrame({
+            '細產業': self._sub_industry_names[mentioned],
+            '出現次數': sub_industry_counts[mentioned],
+            '加權次數': sub_industry_weighted[mentioned],
+        })
+
+    def top_stocks(self, n: int = 10, by: str = '出現次數') -> pd.DataFrame:
+        """提及次數最多的前 n 支股票，by 可為 出現次數、加權次數 或 情緒加權次數（有情緒評分時）"""
+        return self.stock_frame().nlargest(n, by)
+
+    def top_industries(self, n: int = 3) -> pd.DataFrame:
+        """提及次數最多的前 n 個產業"""
+        return self.industry_frame().nlargest(n, '出現次數')
+
+    def top_sub_industries(self, n: int = 3) -> pd.DataFrame:
+        """提及次數最多的前 n 個細產業"""
+        return self.sub_industry_frame().nlargest(n, '出現次數')
+
+    def daily_frame(self, stock_ids: Optional[Iterable[int]] = None) -> pd.DataFrame:
+        """
+        每日提及次數。
+
+        :param stock_ids: 只取指定的 stock_id，預設為曾被提及的股票。
+        :return: index 為日期、欄位為股票代碼的 DataFrame。
+        """
+        if stock_ids is None:
+            stock_ids = np.flatnonzero(self.stock_counts)
+        stock_ids = np.asarray(stock_ids, dtype=np.int64)
+
+        publish_dates = sorted(self._day_index)
+        rows = [self._day_index[publish_date] for publish_date in publish_dates]
+        return pd.DataFrame(
+            self._daily_counts[np.ix_(rows, stock_ids)],
+            index=pd.to_datetime(publish_dates),
+            columns=self.security_master.securities['股票代碼'].to_numpy()[stock_ids],
+        )
@@ -0,0 +1,279 @@
+import glob
+import os
+import uuid
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from stock_prediction_system.controller.security_master import SecurityMaster
+
+
+class MentionMatrixStore:
+
+    def __init__(self, root_path: str, security_master: SecurityMaster) -> None:
+        """
+        以 scipy.sparse 儲存「文章 × 股票」提及矩陣，並附上每篇文章的 news_id 與發佈時間。
+        新資料以 chunk 檔追加，查詢時合併，分析不需再掃描新聞原文。
+
+        :param root_path: 儲存 chunk 檔（.npz）的資料夾。
+        :param security_master: 股票主檔，欄位索引即為 stock_id。
+        """
+        self.root_path = root_path
+        self.security_master = security_master
+        self._loaded_chunks: Tuple[str, ...] = ()
+        self._matrix = sparse.csr_matrix((0, len(security_master)), dtype=np.int32)
+        self._news_ids = np.array([], dtype=np.int64)
+        self._published = np.array([], dtype='datetime64[s]')
+
+    def _chunk_paths(self) -> Tuple[str, ...]:
+        return tuple(sorted(glob.glob(os.path.join(self.root_path, 'chunk-*.npz'))))
+
+    def _remap_columns(self, chunk_codes: np.ndarray) -> np.ndarray:
+        """chunk 寫入時的 stock_id 依股票代碼對應到目前主檔的 stock_id，已下市的股票對應為 -1"""
+        code_to_id = self.security_master.code_to_id
+        return np.array([code_to_id.get(code, -1) for code in chunk_codes.tolist()], dtype=np.int64)
+
+    def _load(self) -> None:
+        chunk_paths = self._chunk_paths()
+        if chunk_paths == self._loaded_chunks:
+            return
+
+        matrices: List[sparse.csr_matrix] = []
+        news_ids: List[np.ndarray] = []
+        published: List[np.ndarray] = []
+        current_codes = self.security_master.securities['股票代碼'].to_numpy().astype(str)
+        for chunk_path in chunk_paths:
+            with np.load(chunk_path) as chunk:
+                indices = chunk['indices']
+                if not np.array_equal(chunk['stock_codes'], current_codes):
+                    # 主檔更新過，依代碼重新對應欄位，並移除已不存在的股票
+                    indices = self._remap_columns(chunk['stock_codes'])[indices]
+                matrix = sparse.csr_matrix(
+                    (np.ones(len(indices), dtype=np.int32), np.where(indices >= 0, indices, 0), chunk['indptr']),
+                    shape=(len(chunk['news_ids']), len(self.security_master))
+                )
+                if (indices < 0).any():
+                    matrix.data[indices < 0] = 0
+                    matrix.eliminate_zeros()
+                matrices.append(matrix)
+                news_ids.append(chunk['news_ids'])
+                published.append(chunk['published'].astype('datetime64[s]'))
+
+        if matrices:
+            self._matrix = sparse.vstack(matrices, format='csr')
+            self._news_ids = np.concatenate(news_ids)
+            self._published = np.concatenate(published)
+        self._loaded_chunks = chunk_paths
+
+    def add_articles(self, article_matches: Iterable[Tuple[int, str, np.ndarray]]) -> int:
+        """
+        追加文章比對結果，已存在的 news_id 會略過。
+
+        :param article_matches: (news_id, publish_at, stock_ids) 列表，publish_at 格式為 'YYYY-MM-DD HH:MM:SS'。
+        :return: 實際寫入的文章數。
+        """
+        self._load()
+        existing_news_ids = set(self._news_ids.tolist())
+
+        news_ids, published, indptr, indices = [], [], [0], []
+        for news_id, publish_at, stock_ids in article_matches:
+            if news_id in existing_news_ids:
+                continue
+            existing_news_ids.add(news_id)
+            news_ids.append(news_id)
+            published.append(publish_at)
+            indices.append(np.asarray(stock_ids, dtype=np.int32))
+            indptr.append(indptr[-1] + len(stock_ids))
+
+        if not news_ids:
+            return 0
+
+        os.makedirs(self.root_path, exist_ok=True)
+        chunk_path = os.path.join(self.root_path, f'chunk-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.npz')
+        np.savez_compressed(
+            chunk_path,
+            news_ids=np.asarray(news_ids, dtype=np.int64),
+            published=np.asarray(published, dtype='datetime64[s]').astype(np.int64),
+            indptr=np.asarray(indptr, dtype=np.int64),
+            indices=np.concatenate(indices) if indices else np.array([], dtype=np.int32),
+            stock_codes=self.security_master.securities['股票代碼'].to_numpy().astype(str),
+        )
+        return len(news_ids)
+
+    def compact(self, max_chunks: int = 1) -> None:
+        """
+        chunk 數量超過 max_chunks 時合併為單一檔案，減少查詢時開啟的檔案數。
+
+        :param max_chunks: 允許保留的 chunk 數量。
+        """
+        chunk_paths = self._chunk_paths()
+        if len(chunk_paths) <= max(max_chunks, 1):
+            return
+        self._load()
+        matrix = self._matrix.tocsr()
+        compacted_path = os.path.join(self.root_path, f'chunk-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.npz')
+        np.savez_compressed(
+            compacted_path,
+            news_ids=self._news_ids,
+            published=self._published.astype(np.int64),
+            indptr=matrix.indptr.astype(np.int64),
+            indices=matrix.indices.astype(np.int32),
+            stock_codes=self.security_master.securities['股票代碼'].to_numpy().astype(str),
+        )
+        for chunk_path in chunk_paths:
+            os.remove(chunk_path)
+        self._loaded_chunks = (compacted_path,)
+
+    def article_matrix(self, start_time: Optional[str] = None,
+                       end_time: Optional[str] = None) -> Tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+        """
+        取得時間區間內的「文章 × 股票」矩陣。
+
+        :return: (CSR 矩陣, news_id 陣列, 發佈時間陣列)。
+        """
+        self._load()
+        mask = np.ones(len(self._news_ids), dtype=bool)
+        if start_time:
+            mask &= self._published >= np.datetime64(start_time)
+        if end_time:
+            mask &= self._published <= np.datetime64(end_time)
+        rows = np.flatnonzero(mask)
+        return self._matrix[rows], self._news_ids[rows], self._published[rows]
+
+    def mention_tensor(self, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                       freq: str = 'h') -> Tuple[sparse.csr_matrix, pd.DatetimeIndex]:
+        """
+        依時間區塊彙總的「時間區塊 × 股票」提及次數稀疏矩陣。
+
+        :param freq: 時間區塊大小，pandas 頻率字串，例如 h、D。
+        :return: (CSR 矩陣, 時間區塊起點)。
+        """
+        matrix, _, published = self.article_matrix(start_time, end_time)
+        if not len(published):
+            return sparse.csr_matrix((0, len(self.security_master)), dtype=np.int64), pd.DatetimeIndex([])
+
+        buckets = pd.DatetimeIndex(published).floor(freq)
+        bucket_index = pd.date_range(buckets.min(), buckets.max(), freq=freq)
+        bucket_rows = bucket_index.get_indexer(buckets)
+
+        # 以「時間區塊 × 文章」指示矩陣左乘，一次完成所有區塊的加總
+        bucket_indicator = sparse.csr_matrix(
+            (np.ones(len(bucket_rows), dtype=np.int64), (bucket_rows, np.arange(len(bucket_rows)))),
+            shape=(len(bucket_index), len(bucket_rows))
+        )
+        return (bucket_indicator @ matrix).tocsr(), bucket_index
+
+    def trading_day_counts(self, trading_dates: pd.DatetimeIndex, cutoff: str = '13:30') -> np.ndarray:
+        """
+        將提及次數歸入交易日：收盤時間之後與非交易日發佈的文章算到下一個交易日，
+        與當日收盤價對齊時不會用到收盤後才出現的新聞。
+
+        :param trading_dates: 遞增的交易日。
+        :param cutoff: 收盤時間（HH:MM），晚於此時間發佈的文章歸入下一個交易日。
+        :return: 形狀為 (交易日數, 主檔股票數) 的陣列，欄位索引即為 stock_id；最後一個交易日之後的文章不計入。
+        """
+        if not len(trading_dates):
+            return np.zeros((0, len(self.security_master)), dtype=np.int64)
+        # 第一個交易日只計入前一天收盤時間之後的文章，避免更早的文章全部堆到第一天
+        cutoff_delta = pd.Timedelta(cutoff + ':00')
+        start = trading_dates[0].normalize() - pd.Timedelta(days=1) + cutoff_delta + pd.Timedelta(seconds=1)
+        end = trading_dates[-1].normalize() + cutoff_delta
+        matrix, _, published = self.article_matrix(str(start), str(end))
+
+        # 收盤時間後發佈的文章往後推一天，再對應到當天或之後的第一個交易日
+        session_days = (pd.DatetimeIndex(published) + (pd.Timedelta(days=1) - cutoff_delta)).floor('D')
+        day_rows = trading_dates.normalize().searchsorted(session_days)
+        kept = np.flatnonzero(day_rows < len(trading_dates))
+        day_indicator = sparse.csr_matrix(
+            (np.ones(len(kept), dtype=np.int64), (day_rows[kept], kept)),
+            shape=(len(trading_dates), len(published))
+        )
+        return (day_indicator @ matrix).toarray()
+
+    def first_covered_day(self, trading_dates: pd.DatetimeIndex, cutoff: str = '13:30') -> int:
+        """
+        提及矩陣開始收錄新聞後的第一個交易日位置，之前的交易日次數為 0 代表「尚未收錄」而非「沒有被提及」。
+
+        :param trading_dates: 遞增的交易日。
+        :param cutoff: 收盤時間（HH:MM），與 trading_day_counts 相同。
+        :return: trading_dates 中的位置；尚無任何文章時回傳 len(trading_dates)。
+        """
+        self._load()
+        if not len(self._published):
+            return len(trading_dates)
+        # 與 trading_day_counts 相同的歸日方式，第一篇文章所屬的交易日起視為已收錄
+        first_session_day = (pd.Timestamp(self._published.min()) + pd.Timedelta(days=1)
+                             - pd.Timedelta(cutoff + ':00')).floor('D')
+        return int(trading_dates.normalize().searchsorted(first_session_day))
+
+    def rolling_counts(self, end_time: Optional[str] = None, window: str = '90D', freq: str = 'h',
+                       stock_codes: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        滾動視窗內每個時間區塊的提及次數，例如「最近 90 天每小時每支股票的提及次數」。
+
+        :param end_time: 視窗結束時間，預設為最新一篇文章。
+        :param window: 視窗長度，pandas Timedelta 字串。
+        :param freq: 時間區塊大小。
+        :param stock_codes: 只取指定股票，預設為視窗內曾被提及的股票。
+        :return: index 為時間區塊、欄位為股票代碼的 DataFrame。
+        """
+        self._load()
+        end = pd.Timestamp(end_time) if end_time else pd.Timestamp(self._published.max()) if len(self._published) \
+            else pd.Timestamp.now()
+        start = end - pd.Timedelta(window)
+        tensor, bucket_index = self.mention_tensor(str(start), str(end), freq)
+
+        if stock_codes is None:
+            stock_ids = np.flatnonzero(np.asarray(tensor.sum(axis=0)).ravel())
+        else:
+            stock_ids = np.array([self.security_master.code_to_id[code] for code in stock_codes], dtype=np.int64)
+        return pd.DataFrame(
+            tensor[:, stock_ids].toarray(),
+            index=bucket_index,
+            columns=self.security_master.securities['股票代碼'].to_numpy()[stock_ids],
+        )
+
+    def co_mentions(self, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                    top_n: int = 20, min_count: int = 2) -> pd.DataFrame:
+        """
+        同一篇文章中共同被提及的股票組合。
+
+        :param top_n: 回傳共同提及次數最多的前 N 組。
+        :param min_count: 最少共同提及次數。
+        :return: 欄位為 股票代碼A、股票名稱A、股票代碼B、股票名稱B、共同出現次數 的 DataFrame。
+        """
+        matrix, _, _ = self.article_matrix(start_time, end_time)
+        binary = (matrix > 0).astype(np.int64)
+        co_occurrence = sparse.triu(binary.T @ binary, k=1).tocoo()
+
+        keep = co_occurrence.data >= min_count
+        rows, cols, counts = co_occurrence.row[keep], co_occurrence.col[keep], co_occurrence.data[keep]
+        order = np.argsort(-counts, kind='stable')[:top_n]
+
+        securities = self.security_master.securities
+        return pd.DataFrame({
+            '股票代碼A': securities['股票代碼'].to_numpy()[rows[order]],
+            '股票名稱A': securities['股票名稱'].to_numpy()[rows[order]],
+            '股票代碼B': securities['股票代碼'].to_numpy()[cols[order]],
+            '股票名稱B': securities['股票名稱'].to_numpy()[cols[order]],
+            '共同出現次數': counts[order],
+        })
+
+    def industry_rollup(self, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                        freq: str = 'D') -> pd.DataFrame:
+        """
+        依產業彙總的每個時間區塊提及次數。
+
+        :return: index 為時間區塊、欄位為產業別的 DataFrame。
+        """
+        tensor, bucket_index = self.mention_tensor(start_time, end_time, freq)
+        industry = self.security_master.securities['產業別']
+        industry_indicator = sparse.csr_matrix(
+            (np.ones(len(industry), dtype=np.int64), (np.arange(len(industry)), industry.cat.codes.to_numpy())),
+            shape=(len(industry), len(industry.cat.categories))
+        )
+        return pd.DataFrame((tensor @ industry_indicator).toarray(), index=bucket_index,
+                            columns=list(industry.cat.categories))
@@ -0,0 +1,209 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from stock_prediction_system.controller.price_features import PriceFeatureBuilder
+
+# 已載入的模型：路徑 -> (檔案修改時間, 模型)；檔案未變動時直接重用
+_MODEL_CACHE: Dict[str, Tuple[int, "RidgeModel"]] = {}
+
+
+class RidgeModel:
+
+    def __init__(self, feature_names: List[str], mean: np.ndarray, scale: np.ndarray, coef: np.ndarray,
+                 intercept: float, alpha: float, trained_until: str, train_rows: int) -> None:
+        """
+        標準化特徵後的線性 ridge 迴歸，所有股票共用一組係數，一次矩陣乘法即可對整個市場評分。
+
+        :param feature_names: 特徵名稱，順序與係數相同。
+        :param mean: 訓練資料的特徵平均值。
+        :param scale: 訓練資料的特徵標準差。
+        :param coef: 標準化後特徵的係數。
+        :param intercept: 截距。
+        :param alpha: L2 正規化強度。
+        :param trained_until: 訓練資料最後一個特徵日期（YYYY-MM-DD）。
+        :param train_rows: 訓練樣本數。
+        """
+        self.feature_names = list(feature_names)
+        self.mean = mean
+        self.scale = scale
+        self.coef = coef
+        self.intercept = intercept
+        self.alpha = alpha
+        self.trained_until = trained_until
+        self.train_rows = train_rows
+
+    @classmethod
+    def fit(cls, features: np.ndarray, target: np.ndarray, feature_names: List[str], alpha: float = 10.0,
+            trained_until: str = '') -> "RidgeModel":
+        """
+        以正規方程式 (XᵀX + αI)⁻¹Xᵀy 求解，特徵數少，計算量與樣本數成線性。
+
+        :param features: 形狀為 (樣本數, 特徵數) 的陣列，不可含 NaN。
+        :param target: 形狀為 (樣本數,) 的目標值。
+        """
+        if not len(features):
+            raise ValueError("no complete training rows")
+        features = features.astype(np.float64)
+        target = target.astype(np.float64)
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1.0
+        standardized = (features - mean) / scale
+        intercept = float(target.mean())
+        gram = standardized.T @ standardized + alpha * np.eye(standardized.shape[1])
+        coef = np.linalg.solve(gram, standardized.T @ (target - intercept))
+        return cls(feature_names, mean, scale, coef, intercept, alpha, trained_until, len(target))
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """形狀為 (..., 特徵數) 的特徵 -> 預測值；含 NaN 的列預測為 NaN"""
+        return ((features - self.mean) / self.scale) @ self.coef + self.intercept
+
+    def save(self, model_path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
+        tmp_path = f"{model_path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            meta=np.array(json.dumps({'feature_names': self.feature_names, 'intercept': self.intercept,
+                                      'alpha': self.alpha, 'trained_until': self.trained_until,
+                                      'train_rows': self.train_rows}, ensure_ascii=False)),
+            mean=self.mean, scale=self.scale, coef=self.coef,
+        )
+        os.replace(tmp_path, model_path)
+
+    @classmethod
+    def load(cls, model_path: str) -> Optional["RidgeModel"]:
+        """讀取模型，檔案不存在時回傳 None；同一程序內檔案未變動時不重新讀取"""
+        if not os.path.exists(model_path):
+            return None
+        cache_key = os.path.abspath(model_path)
+        mtime_ns = os.stat(model_path).st_mtime_ns
+        cached = _MODEL_CACHE.get(cache_key)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+
+        with np.load(model_path) as saved:
+            meta = json.loads(str(saved['meta']))
+            model = cls(meta['feature_names'], saved['mean'], saved['scale'], saved['coef'], meta['intercept'],
+                        meta['alpha'], meta['trained_until'], meta['train_rows'])
+        _MODEL_CACHE[cache_key] = (mtime_ns, model)
+        return model
+
+
+class MentionPricePanel:
+
+    def __init__(self, mention_windows: Tuple[int, int] = (5, 20),
+                 price_feature_builder: Optional[PriceFeatureBuilder] = None) -> None:
+        """
+        將每日提及次數與價格特徵對齊成「日期 × 股票 × 特徵」的陣列，目標值為下一個交易日的報酬率。
+
+        :param mention_windows: (短期提及加總天數, 提及 z-score 天數)。
+        :param price_feature_builder: 價格特徵計算器。
+        """
+        self.short_window, self.z_window = mention_windows
+        self.price_feature_builder = price_feature_builder or PriceFeatureBuilder()
+
+    @property
+    def lookback(self) -> int:
+        return max(self.price_feature_builder.lookback, self.z_window)
+
+    @property
+    def feature_names(self) -> List[str]:
+        return (['mention_log', f'mention_log_{self.short_window}d', f'mention_z_{self.z_window}d']
+                + self.price_feature_builder.feature_names)
+
+    def mention_features(self, mention_counts: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """
+        由每日提及次數計算提及特徵，沒有新聞的日子為 0 而非缺值；
+        尚未收錄新聞的日子為缺值，視窗內含缺值或天數不足時特徵為缺值，不會以部分視窗的加總當成完整的值。
+        """
+        counts = mention_counts.astype(np.float64)
+        rolling = counts.rolling(self.z_window, min_periods=self.z_window)
+        # 標準差至少為 1 次，避免長期無新聞的股票因一則新聞得到極端的 z-score
+        z_score = (counts - rolling.mean()) / rolling.std().clip(lower=1.0)
+        return {
+            'mention_log': np.log1p(counts),
+            f'mention_log_{self.short_window}d': np.log1p(
+                counts.rolling(self.short_window, min_periods=self.short_window).sum()),
+            f'mention_z_{self.z_window}d': z_score,
+        }
+
+    def build(self, mention_counts: pd.DataFrame, close: pd.DataFrame,
+              volume: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param mention_counts: index 為交易日、欄位為股票代碼的提及次數，須與 close 形狀相同。
+        :param close: 收盤價。
+        :param volume: 成交股數。
+        :return: (形狀為 (日期數, 股票數, 特徵數) 的特徵, 形狀為 (日期數, 股票數) 的下一交易日報酬率)。
+        """
+        features = self.mention_features(mention_counts)
+        features.update(self.price_feature_builder.build(close, volume))
+        stacked = np.stack([features[name].to_numpy(dtype=np.float32) for name in self.feature_names], axis=-1)
+        close_values = close.to_numpy(dtype=np.float64)
+        target = np.full(close_values.shape, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            target[:-1] = close_values[1:] / close_values[:-1] - 1
+        return stacked, target
+
+
+def complete_rows(features: np.ndarray, target: Optional[np.ndarray] = None) -> np.ndarray:
+    """特徵（與目標值）皆無缺值的位置"""
+    mask = ~np.isnan(features).any(axis=-1)
+    if target is not None:
+        mask &= ~np.isnan(target)
+    return mask
+
+
+def rank_predictions(predicted: np.ndarray, stock_codes: np.ndarray, prediction_date: str) -> pd.DataFrame:
+    """
+    依預測報酬率由高到低排名。
+
+    :param predicted: 形狀為 (股票數,) 的預測值，NaN 表示無法評分。
+    :param stock_codes: 與 predicted 對應的股票代碼。
+    :param prediction_date: 特徵日期。
+    :return: 日期、股票代碼、預測報酬率、排名 的 DataFrame。
+    """
+    scored = np.flatnonzero(~np.isnan(predicted))
+    order = scored[np.argsort(-predicted[scored], kind='stable')]
+    return pd.DataFrame({
+        '日期': prediction_date,
+        '股票代碼': np.asarray(stock_codes)[order],
+        '預測報酬率': predicted[order],
+        '排名': np.arange(1, len(order) + 1),
+    })
+
+
+if __name__ == "__main__":
+    # 模擬約 1,800 檔股票、3 年交易日，提及次數對隔日報酬有微弱的正向影響
+    rng = np.random.default_rng(0)
+    trade_dates = pd.DatetimeIndex(pd.bdate_range('2021-09-01', periods=750), name='日期')
+    codes = pd.Index([str(code) for code in range(1101, 1101 + 1800)], name='股票代碼')
+    mentions = pd.DataFrame(rng.poisson(0.3, size=(len(trade_dates), len(codes))), index=trade_dates, columns=codes)
+    noise = rng.normal(0, 0.02, size=mentions.shape)
+    daily_returns = noise + 0.002 * np.vstack([np.zeros((1, len(codes))), np.log1p(mentions.to_numpy()[:-1])])
+    close_panel = pd.DataFrame(50 * np.exp(np.cumsum(daily_returns, axis=0)), index=trade_dates, columns=codes)
+    volume_panel = pd.DataFrame(rng.integers(1_000, 5_000_000, size=mentions.shape).astype(np.float64),
+                                index=trade_dates, columns=codes)
+
+    panel_builder = MentionPricePanel()
+    start = time.perf_counter()
+    panel_features, panel_target = panel_builder.build(mentions, close_panel, volume_panel)
+    panel_seconds = time.perf_counter() - start
+
+    train_mask = complete_rows(panel_features, panel_target)
+    start = time.perf_counter()
+    ridge = RidgeModel.fit(panel_features[train_mask], panel_target[train_mask], panel_builder.feature_names,
+                           trained_until=str(trade_dates[-2].date()))
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    latest = panel_features[-1]
+    ranking = rank_predictions(np.where(complete_rows(latest), ridge.predict(latest), np.nan), codes.to_numpy(),
+                               str(trade_dates[-1].date()))
+    print(f"panel {panel_features.shape}: {panel_seconds:.2f}s, fit {ridge.train_rows} rows: {fit_seconds:.2f}s, "
+          f"score {len(ranking)} stocks: {(time.perf_counter() - start) * 1000:.1f}ms")
+    print(dict(zip(ridge.feature_names, np.round(ridge.coef, 5))))
@@ -0,0 +1,267 @@
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# 字元 k-gram 滾動雜湊的基數，uint64 溢位即為對 2^64 取模
+_SHINGLE_BASE = np.uint64(1000003)
+
+
+class NearDuplicateIndex:
+
+    def __init__(self, num_perm: int = 128, bands: int = 32, threshold: float = 0.7, shingle_size: int = 5,
+                 seed: int = 1, initial_capacity: int = 1024, max_age_days: Optional[int] = 30) -> None:
+        """
+        以 MinHash 簽章與 LSH 分桶偵測近似重複的新聞（同一則通訊社稿件在不同來源轉載、或同來源改寫後重發）。
+        每篇新文章只查詢自己所在的桶，查詢成本與索引大小無關。
+
+        :param num_perm: MinHash 簽章長度。
+        :param bands: LSH 分段數，num_perm 需可被整除；每段 num_perm / bands 個值相同即成為候選。
+        :param threshold: 候選文章的簽章相似度（估計 Jaccard）達到此值才視為同一則新聞。
+        :param shingle_size: 字元 shingle 長度。
+        :param seed: 雜湊參數的亂數種子，持久化後重新載入需相同才能比較簽章。
+        :param initial_capacity: 簽章陣列預先配置的文章數，不足時自動加倍。
+        :param max_age_days: save 時移除發佈時間早於索引內最新文章 max_age_days 天的文章，None 表示不移除。
+                             轉載通常在數天內出現，過舊的文章只會讓索引持續變大。
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.max_age_days = max_age_days
+
+        # multiply-shift 雜湊族：(a * x + b) mod 2^64 取高 32 位元，a 為奇數
+        rng = np.random.default_rng(seed)
+        self._hash_a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._hash_b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+        self._signatures = np.zeros((initial_capacity, num_perm), dtype=np.uint32)
+        self._news_ids = np.zeros(initial_capacity, dtype=np.int64)
+        self._cluster_ids = np.zeros(initial_capacity, dtype=np.int64)
+        self._published = np.zeros(initial_capacity, dtype="datetime64[s]")
+        self._size = 0
+        self._row_of: Dict[int, int] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+
+    @property
+    def config(self) -> dict:
+        return {"num_perm": self.num_perm, "bands": self.bands, "threshold": self.threshold,
+                "shingle_size": self.shingle_size, "seed": self.seed, "max_age_days": self.max_age_days}
+
+    def shingles(self, text: Optional[str]) -> np.ndarray:
+        """以 NumPy 一次計算所有字元 k-gram 的滾動雜湊，回傳不重複的 uint64 陣列"""
+        if not text:
+            return np.array([], dtype=np.uint64)
+        code_points = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        if len(code_points) <= self.shingle_size:
+            window_count, width = 1, len(code_points)
+        else:
+            window_count, width = len(code_points) - self.shingle_size + 1, self.shingle_size
+        hashes = np.zeros(window_count, dtype=np.uint64)
+        for offset in range(width):
+            hashes = hashes * _SHINGLE_BASE + code_points[offset:offset + window_count]
+        return np.unique(hashes)
+
+    def signature(self, text: Optional[str]) -> Optional[np.ndarray]:
+        """
+        MinHash 簽章。
+
+        :param text: 正規化後的文字。
+        :return: 長度 num_perm 的 uint32 陣列；空白文字回傳 None。
+        """
+        shingles = self.shingles(text)
+        if not len(shingles):
+            return None
+        hashed = (self._hash_a[:, None] * shingles[None, :] + self._hash_b[:, None]) >> np.uint64(32)
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def query(self, signature: np.ndarray) -> List[Tuple[int, float]]:
+        """
+        查詢與簽章近似的已索引文章。
+
+        :return: (news_id, 估計相似度) 列表，只包含達到 threshold 的文章，依相似度由高到低排列。
+        """
+        candidates = set()
+        for band, band_key in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets[band].get(band_key, ()))
+        if not candidates:
+            return []
+        rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarities = (self._signatures[rows] == signature).mean(axis=1)
+        matched = similarities >= self.threshold
+        order = np.argsort(-similarities[matched], kind="stable")
+        return list(zip(self._news_ids[rows[matched]][order].tolist(), similarities[matched][order].tolist()))
+
+    def _append(self, news_id: int, signature: np.ndarray, cluster_id: int, published: np.datetime64) -> None:
+        if self._size >= len(self._signatures):
+            self._signatures = np.vstack([self._signatures, np.zeros_like(self._signatures)])
+            self._news_ids = np.concatenate([self._news_ids, np.zeros_like(self._news_ids)])
+            self._cluster_ids = np.concatenate([self._cluster_ids, np.zeros_like(self._cluster_ids)])
+            self._published = np.concatenate([self._published, np.zeros_like(self._published)])
+        row = self._size
+        self._signatures[row] = signature
+        self._news_ids[row] = news_id
+        self._cluster_ids[row] = cluster_id
+        self._published[row] = published
+        self._row_of[news_id] = row
+        self._size += 1
+        for band, band_key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(band_key, []).append(row)
+
+    def add(self, news_id: int, text: Optional[str], publish_at: Optional[str] = None) -> int:
+        """
+        將文章加入索引並指派 cluster_id；與已索引文章近似時沿用最相近文章的 cluster_id，否則以自己的 news_id 開新 cluster。
+        已索引過的 news_id 直接回傳原本的 cluster_id。
+
+        :param news_id: 文章 ID。
+        :param text: 正規化後的文字（clean_text）。
+        :param publish_at: 發佈時間（'YYYY-MM-DD HH:MM:SS'），決定 save 時何時移除；未提供時以加入索引的時間計算。
+        :return: cluster_id。
+        """
+        row = self._row_of.get(news_id)
+        if row is not None:
+            return int(self._cluster_ids[row])
+        signature = self.signature(text)
+        if signature is None:
+            return news_id  # 沒有文字的文章不進索引，自成一群
+
+        similar = self.query(signature)
+        cluster_id = int(self._cluster_ids[self._row_of[similar[0][0]]]) if similar else news_id
+        published = np.datetime64(publish_at, "s") if publish_at else np.datetime64(int(time.time()), "s")
+        self._append(news_id, signature, cluster_id, published)
+        return cluster_id
+
+    def cluster_of(self, news_id: int) -> Optional[int]:
+        """已索引文章的 cluster_id，未索引時回傳 None"""
+        row = self._row_of.get(news_id)
+        return None if row is None else int(self._cluster_ids[row])
+
+    def tag_articles(self, articles: Iterable[dict], text_field: str = "clean_text") -> int:
+        """
+        逐篇加入索引，並在文章上寫入 cluster_id 欄位。
+
+        :param articles: 新聞資料，需有 news_id 與 text_field。
+        :param text_field: 計算簽章的欄位。
+        :return: 被判定為既有新聞近似重複的篇數。
+        """
+        duplicate_count = 0
+        for article in articles:
+            if article.get("news_id") is None:
+                continue
+            article["cluster_id"] = self.add(article["news_id"], article.get(text_field), article.get("publish_at"))
+            duplicate_count += article["cluster_id"] != article["news_id"]
+        return duplicate_count
+
+    def prune(self, max_age_days: int) -> int:
+        """
+        移除發佈時間早於索引內最新文章 max_age_days 天的文章，並重建 LSH 桶。
+        以索引內最新的發佈時間為基準而非現在時間，回補歷史區間時不會把剛加入的文章全部移除。
+
+        :param max_age_days: 保留的天數。
+        :return: 移除的文章數。
+        """
+        if not self._size:
+            return 0
+        published = self._published[:self._size]
+        keep = published >= published.max() - np.timedelta64(max_age_days, "D")
+        removed_count = int(self._size - keep.sum())
+        if not removed_count:
+            return 0
+
+        self._signatures = self._signatures[:self._size][keep]
+        self._news_ids = self._news_ids[:self._size][keep]
+        self._cluster_ids = self._cluster_ids[:self._size][keep]
+        self._published = published[keep]
+        self._size = len(self._news_ids)
+        self._rebuild_buckets()
+        return removed_count
+
+    def _rebuild_buckets(self) -> None:
+        self._row_of = {news_id: row for row, news_id in enumerate(self._news_ids[:self._size].tolist())}
+        self._buckets = [{} for _ in range(self.bands)]
+        # 每段簽章視為定長 bytes，整段一次轉成 Python bytes 後建桶
+        band_dtype = np.dtype((np.void, self.rows * self._signatures.itemsize))
+        for band in range(self.bands):
+            band_keys = np.ascontiguousarray(self._signatures[:self._size, band * self.rows:(band + 1) * self.rows])
+            buckets = self._buckets[band]
+            for row, band_key in enumerate(band_keys.view(band_dtype).ravel().tolist()):
+                buckets.setdefault(band_key, []).append(row)
+
+    def save(self, index_path: str) -> None:
+        """寫入簽章與 cluster 指派；設定 max_age_days 時先移除過舊的文章。LSH 桶由簽章重建，不另外儲存"""
+        if self.max_age_days is not None:
+            self.prune(self.max_age_days)
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        tmp_path = f"{index_path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            config=np.array(json.dumps(self.config)),
+            signatures=self._signatures[:self._size],
+            news_ids=self._news_ids[:self._size],
+            cluster_ids=self._cluster_ids[:self._size],
+            published=self._published[:self._size].astype(np.int64),
+        )
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load(cls, index_path: str, **kwargs) -> "NearDuplicateIndex":
+        """
+        讀取索引；檔案不存在時建立新的空索引。
+
+        :param index_path: 索引檔路徑（.npz）。
+        :param kwargs: 建立新索引時的參數，讀取既有索引時以檔案內的設定為準。
+        """
+        if not os.path.exists(index_path):
+            return cls(**kwargs)
+        with np.load(index_path) as saved:
+            config = json.loads(str(saved["config"]))
+            index = cls(**config, initial_capacity=max(len(saved["news_ids"]), 1024))
+            size = len(saved["news_ids"])
+            index._signatures[:size] = saved["signatures"]
+            index._news_ids[:size] = saved["news_ids"]
+            index._cluster_ids[:size] = saved["cluster_ids"]
+            if "published" in saved:
+                index._published[:size] = saved["published"].astype("datetime64[s]")
+            else:
+                # 加入發佈時間之前寫出的索引，以讀取時間起算保留期限
+                index._published[:size] = np.datetime64(int(time.time()), "s")
+        index._size = size
+        index._rebuild_buckets()
+        return index
+
+    def __len__(self) -> int:
+        return self._size
+
+
+if __name__ == "__main__":
+    from stock_prediction_system.controller.text_normalizer import TextNormalizer
+
+    with open("../data/processed/stock_news_extraction.json", "r", encoding="utf-8") as json_file:
+        all_news_data_json = json.load(json_file)
+    TextNormalizer().normalize_articles(all_news_data_json)
+
+    # 模擬轉載：每篇新聞複製一份，換掉標題並刪去最後一段
+    reposts = []
+    for position, article in enumerate(all_news_data_json):
+        title, _, body = article["clean_text"].partition("\n")
+        paragraphs = body.split("\n")
+        reposts.append({"news_id": 10 ** 9 + position,
+                        "clean_text": "轉載：" + title + "\n" + "\n".join(paragraphs[:max(len(paragraphs) - 1, 1)])})
+
+    near_duplicate_index = NearDuplicateIndex()
+    start = time.perf_counter()
+    original_duplicates = near_duplicate_index.tag_articles(all_news_data_json)
+    repost_duplicates = near_duplicate_index.tag_articles(reposts)
+    seconds = time.perf_counter() - start
+    article_count = len(all_news_data_json) + len(reposts)
+    print(f"articles: {article_count}, {seconds / article_count * 1000:.2f} ms/article")
+    print(f"duplicates among originals: {original_duplicates}, reposts detected: {repost_duplicates}/{len(reposts)}")
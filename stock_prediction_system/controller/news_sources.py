@@ -0,0 +1,532 @@
+import asyncio
+import hashlib
+import random
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+from lxml import etree
+
+from stock_prediction_system.controller.async_news_spider import TokenBucket
+from stock_prediction_system.controller.google_real_time_news import CnyesNewsSpider
+from stock_prediction_system.controller.text_normalizer import TextNormalizer
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# 內文太短（例如付費文章只剩摘要）時不以內文指紋去重，避免不同文章被誤判為重複
+MIN_FINGERPRINT_LENGTH = 50
+
+
+def canonical_url(url: str) -> str:
+    """去除查詢字串、錨點與結尾斜線，同一篇文章的不同追蹤參數視為同一網址"""
+    parts = urlsplit(url)
+    return f"{parts.scheme.lower() or 'https'}://{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+
+def url_news_id(url: str) -> int:
+    """
+    沒有數字 ID 的來源以網址雜湊產生 news_id，落在 2^61 ~ 2^62 之間，不會與鉅亨網的 newsId 重疊。
+
+    :param url: 文章網址。
+    :return: int64 範圍內的 news_id。
+    """
+    digest = hashlib.sha1(canonical_url(url).encode("utf-8")).digest()
+    return (int.from_bytes(digest[:8], "big") >> 3) | (1 << 61)
+
+
+def parse_publish_time(text: Optional[str]) -> Optional[str]:
+    """將各來源的時間字串（ISO 8601、YYYY/MM/DD HH:MM 等）轉為 'YYYY-MM-DD HH:MM:SS'，時區直接捨去"""
+    if not text:
+        return None
+    text = re.split(r"[+Z]", text.strip().replace("T", " ").replace("/", "-"))[0]
+    for time_format in (TIME_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text[:19], time_format).strftime(TIME_FORMAT)
+        except ValueError:
+            continue
+    return None
+
+
+def make_article(source: str, url: str, title: str, content: str, publish_at: str, news_id: Optional[int] = None,
+                 summary: Optional[str] = None, keyword: Optional[List[str]] = None,
+                 category_name: Optional[str] = None, category_id: Optional[int] = None) -> dict:
+    """組成與 CnyesNewsSpider.parse_news 相同欄位的新聞資料，並加上來源名稱"""
+    return {
+        "news_id": news_id if news_id is not None else url_news_id(url),
+        "url": url,
+        "title": title,
+        "content": content,
+        "summary": summary,
+        "keyword": keyword or [],
+        "publish_at": publish_at,
+        "category_name": category_name,
+        "category_id": category_id,
+        "source": source,
+    }
+
+
+def _in_timeframe(publish_at: Optional[str], start_time: Optional[str], end_time: Optional[str]) -> bool:
+    if not publish_at:
+        return False
+    return (not start_time or publish_at >= start_time) and (not end_time or publish_at <= end_time)
+
+
+def _element_text(elements: Iterable) -> str:
+    return "\n".join("".join(element.itertext()).strip() for element in elements).strip()
+
+
+class AsyncHttpClient:
+
+    def __init__(self, max_concurrency: int = 16, limit_per_host: int = 4, max_retries: int = 4,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0, timeout: float = 30.0,
+                 default_rate_limit: float = 2.0, default_burst: int = 4) -> None:
+        """
+        所有新聞來源共用的非同步 HTTP client：共用 keep-alive 連線池，並依網域分別限流。
+
+        :param max_concurrency: 全部來源同時進行中的請求上限。
+        :param limit_per_host: 單一網域同時開啟的連線上限。
+        :param max_retries: 單一請求最多重試次數。
+        :param backoff_base: 指數退避的基準秒數。
+        :param backoff_max: 指數退避的最長等待秒數。
+        :param timeout: 單一請求逾時秒數。
+        :param default_rate_limit: 未設定限流的網域每秒最多發出的請求數。
+        :param default_burst: 未設定限流的網域令牌桶容量。
+        """
+        self.max_concurrency = max_concurrency
+        self.limit_per_host = limit_per_host
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.default_rate_limit = default_rate_limit
+        self.default_burst = default_burst
+        self.user_agents = CnyesNewsSpider().user_agents
+        self.request_count = 0
+        self._rate_limits: Dict[str, Tuple[float, int]] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def set_rate_limit(self, domain: str, rate_limit: float, burst: int) -> None:
+        """設定單一網域的限流，需在第一次請求該網域前呼叫"""
+        self._rate_limits[domain] = (rate_limit, burst)
+
+    def _bucket(self, url: str) -> TokenBucket:
+        domain = urlsplit(url).netloc
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            rate_limit, burst = self._rate_limits.get(domain, (self.default_rate_limit, self.default_burst))
+            bucket = self._buckets[domain] = TokenBucket(rate_limit, burst)
+        return bucket
+
+    async def __aenter__(self) -> "AsyncHttpClient":
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.limit_per_host,
+                                         keepalive_timeout=30)
+        self._session = aiohttp.ClientSession(connector=connector,
+                                              timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._session.close()
+        self._session = None
+
+    def get_backoff_delay(self, attempt: int) -> float:
+        """帶隨機抖動的指數退避（full jitter）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def get(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+                  as_json: bool = False, encoding: Optional[str] = None):
+        """
+        發出 GET 請求，失敗時以指數退避重試。
+
+        :param url: 網址。
+        :param params: 查詢參數。
+        :param headers: 額外的請求標頭，未指定 User-Agent 時隨機挑選。
+        :param as_json: 是否解析為 JSON。
+        :param encoding: 回應未標示編碼時使用的編碼。
+        :return: 文字或 JSON；404 或多次重試仍失敗時回傳 None。
+        """
+        request_headers = {"User-Agent": random.choice(self.user_agents), **(headers or {})}
+        bucket = self._bucket(url)
+        for attempt in range(self.max_retries):
+            await bucket.acquire()
+            try:
+                async with self._semaphore:
+                    self.request_count += 1
+                    async with self._session.get(url, params=params, headers=request_headers) as r:
+                        if r.status == 200:
+                            if as_json:
+                                return await r.json(content_type=None)
+                            return (await r.read()).decode(r.charset or encoding or "utf-8", errors="replace")
+                        if r.status == 404:
+                            return None
+                        print(f'請求失敗，網址: {url}，狀態碼: {r.status}')
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                print(f'請求失敗，網址: {url}，錯誤: {e}')
+            await asyncio.sleep(self.get_backoff_delay(attempt))
+        return None
+
+
+class NewsSource:
+
+    name: str = ""
+    domains: Tuple[str, ...] = ()
+    rate_limit: float = 2.0
+    burst: int = 4
+
+    def __init__(self, max_pages: int = 20, page_batch: int = 4) -> None:
+        """
+        新聞來源介面：子類別實作 fetch，回傳 make_article 格式的新聞資料。
+
+        :param max_pages: 最多翻幾頁列表，避免來源異常時無限翻頁。
+        :param page_batch: 列表頁每批並行抓取的頁數，該批已早於起始時間時停止翻頁。
+        """
+        self.max_pages = max_pages
+        self.page_batch = page_batch
+
+    async def fetch(self, client: AsyncHttpClient, start_time: Optional[str] = None,
+                    end_time: Optional[str] = None) -> List[dict]:
+        raise NotImplementedError
+
+    async def _fetch_listing(self, client: AsyncHttpClient, start_time: Optional[str]) -> List[dict]:
+        """
+        依批次並行抓取列表頁，直到某批中最舊的項目早於起始時間、頁面為空或達到 max_pages。
+        列表項目需有 publish_at，子類別實作 _fetch_listing_page。
+        """
+        items: List[dict] = []
+        for batch_start in range(1, self.max_pages + 1, self.page_batch):
+            pages = range(batch_start, min(batch_start + self.page_batch, self.max_pages + 1))
+            batch = await asyncio.gather(*(self._fetch_listing_page(client, page) for page in pages))
+            reached_start = False
+            for page_items in batch:
+                if not page_items:
+                    return items
+                items.extend(page_items)
+                publish_times = [item["publish_at"] for item in page_items if item.get("publish_at")]
+                if start_time and publish_times and min(publish_times) < start_time:
+                    reached_start = True
+            if reached_start:
+                break
+        return items
+
+    async def _fetch_listing_page(self, client: AsyncHttpClient, page: int) -> List[dict]:
+        raise NotImplementedError
+
+
+class CnyesSource(NewsSource):
+
+    name = "cnyes"
+    domains = ("api.cnyes.com",)
+    category = "headline"
+    page_limit = 30
+
+    def __init__(self, max_pages: int = 200, page_batch: int = 4) -> None:
+        """鉅亨網新聞列表 API，內文隨列表一併回傳，不需再抓文章頁"""
+        super().__init__(max_pages=max_pages, page_batch=page_batch)
+        self.spider = CnyesNewsSpider()
+        self.api_url = f"https://api.cnyes.com/media/api/v1/newslist/category/{self.category}"
+
+    async def _get_page(self, client, page, start_time, end_time):
+        params = self.spider.get_params(page=page, limit=self.page_limit, start_time=start_time, end_time=end_time)
+        newslist_info = await client.get(self.api_url, params=params, headers=self.spider.get_headers(), as_json=True)
+        return newslist_info["items"] if newslist_info and "items" in newslist_info else None
+
+    async def fetch(self, client, start_time=None, end_time=None):
+        # API 直接支援起訖時間篩選，第一頁得知總頁數後其餘頁面一次並行抓取
+        first_page = await self._get_page(client, 1, start_time, end_time)
+        if not first_page or not first_page.get("data"):
+            return []
+        last_page = min(first_page.get("last_page") or 1, self.max_pages)
+        pages = [first_page] + list(await asyncio.gather(*(
+            self._get_page(client, page, start_time, end_time) for page in range(2, last_page + 1)
+        )))
+
+        articles = []
+        for newslist_info in pages:
+            for news in (newslist_info or {}).get("data", []):
+                article = self.spider.parse_news(news)
+                if _in_timeframe(article["publish_at"], start_time, end_time):
+                    article["source"] = self.name
+                    articles.append(article)
+        return articles
+
+
+class AnueSource(CnyesSource):
+
+    # 鉅亨網台股新聞分類（原 anue notebook 以瀏覽器捲動 news.cnyes.com/news/cat/tw_stock_news 取得），改用同一個列表 API
+    name = "anue"
+    category = "tw_stock_news"
+
+
+class UdnSource(NewsSource):
+
+    name = "udn"
+    domains = ("udn.com",)
+    list_url = "https://udn.com/api/more"
+    base_url = "https://udn.com"
+
+    async def _fetch_listing_page(self, client, page):
+        # 原 udn 腳本使用的最新股市新聞列表 API，每頁回傳數篇文章的標題、連結與時間
+        params = {"page": page, "channelId": 2, "type": "cate_latest_news", "cate_id": 6645}
+        listing = await client.get(self.list_url, params=params, as_json=True)
+        return [
+            {
+                "url": urljoin(self.base_url, item["titleLink"]),
+                "title": item.get("title", ""),
+                "publish_at": parse_publish_time((item.get("time") or {}).get("date")),
+                "summary": item.get("paragraph"),
+            }
+            for item in (listing or {}).get("lists", []) if item.get("titleLink")
+        ]
+
+    @staticmethod
+    def parse_article(page: str) -> Tuple[str, str]:
+        """解析文章頁，回傳 (內文, 記者)；付費文章沒有內文區塊時內文為空字串"""
+        html = etree.HTML(page)
+        content = _element_text(html.xpath("//section[contains(@class, 'article-content__editor')]//p"))
+        author = _element_text(html.xpath("//span[contains(@class, 'article-content__author')]"))
+        return content, author
+
+    async def _fetch_article(self, client, item):
+        page = await client.get(item["url"])
+        if page is None:
+            return None
+        content, _ = self.parse_article(page)
+        if not content:
+            return None
+        return make_article(self.name, item["url"], item["title"], content, item["publish_at"],
+                            summary=item.get("summary"))
+
+    async def fetch(self, client, start_time=None, end_time=None):
+        items = [item for item in await self._fetch_listing(client, start_time)
+                 if _in_timeframe(item["publish_at"], start_time, end_time)]
+        articles = await asyncio.gather(*(self._fetch_article(client, item) for item in items))
+        return [article for article in articles if article]
+
+
+class CteeSource(NewsSource):
+
+    name = "ctee"
+    domains = ("ctee.com.tw", "www.ctee.com.tw")
+    list_url = "https://ctee.com.tw/category/news/stocks"
+
+    async def _fetch_listing_page(self, client, page):
+        url = self.list_url if page == 1 else f"{self.list_url}/page/{page}"
+        listing = await client.get(url)
+        if listing is None:
+            return []
+        items = []
+        for article in etree.HTML(listing).xpath("//article"):
+            links = article.xpath(".//h2/a[@href]")
+            times = article.xpath(".//time/@datetime")
+            if links:
+                items.append({
+                    "url": urljoin(url, links[0].get("href")),
+                    "title": "".join(links[0].itertext()).strip(),
+                    "publish_at": parse_publish_time(times[0]) if times else None,
+                })
+        return items
+
+    @staticmethod
+    def parse_article(page: str) -> Tuple[str, str, Optional[str]]:
+        """解析文章頁，回傳 (標題, 內文, 發佈時間)"""
+        html = etree.HTML(page)
+        title = _element_text(html.xpath("//h1")[:1])
+        content = _element_text(html.xpath("//div[contains(@class, 'entry-content')]/p"))
+        times = html.xpath("//div[contains(@class, 'post-header')]//time/@datetime") or html.xpath("//time/@datetime")
+        return title, content, parse_publish_time(times[0]) if times else None
+
+    async def _fetch_article(self, client, item):
+        page = await client.get(item["url"])
+        if page is None:
+            return None
+        title, content, publish_at = self.parse_article(page)
+        if not content:
+            return None
+        return make_article(self.name, item["url"], title or item["title"], content,
+                            publish_at or item["publish_at"])
+
+    async def fetch(self, client, start_time=None, end_time=None):
+        items = [item for item in await self._fetch_listing(client, start_time)
+                 if _in_timeframe(item["publish_at"], start_time, end_time)]
+        articles = await asyncio.gather(*(self._fetch_article(client, item) for item in items))
+        return [article for article in articles if article]
+
+
+class CmoneySource(NewsSource):
+
+    name = "cmoney"
+    domains = ("www.cmoney.tw",)
+    forum_url = "https://www.cmoney.tw/forum/official/359804"
+
+    @staticmethod
+    def parse_relative_time(text: str, now: datetime) -> Optional[str]:
+        """將「20分鐘前」「3小時前」等相對時間轉為發佈時間，絕對時間則直接解析"""
+        matched = re.match(r"^(\d+)\s*(分鐘|小時|天)前", text.strip())
+        if not matched:
+            return parse_publish_time(text)
+        amount, unit = int(matched.group(1)), matched.group(2)
+        delta = {"分鐘": timedelta(minutes=amount), "小時": timedelta(hours=amount), "天": timedelta(days=amount)}[unit]
+        return (now - delta).strftime(TIME_FORMAT)
+
+    @classmethod
+    def parse_forum(cls, page: str, base_url: str, now: Optional[datetime] = None) -> List[dict]:
+        """
+        解析伺服器端渲染的討論區頁面，只保留有標註個股的貼文，標註的個股放在 keyword。
+
+        :param page: 討論區頁面 HTML。
+        :param base_url: 頁面網址，用於轉換相對連結。
+        :param now: 換算相對時間的基準時間，預設為現在。
+        :return: 新聞資料列表。
+        """
+        now = now or datetime.now()
+        articles = []
+        for element in etree.HTML(page).xpath("//article[contains(@class, 'articleContent')]"):
+            stocks = [text.strip() for text in element.xpath(".//ul[contains(@class, 'articleTags__list')]//li//text()")
+                      if text.strip()]
+            links = element.xpath(".//h3[contains(@class, 'articleContent__title')]//a[@href]")
+            remarks = element.xpath(".//div[contains(@class, 'member__remark')]//a//text()")
+            if not stocks or not links:
+                continue
+            title = "".join(links[0].itertext()).strip()
+            content = _element_text(element.xpath(".//div[contains(@class, 'articleContent__main')]")) or title
+            articles.append(make_article(
+                cls.name, urljoin(base_url, links[0].get("href")), title, content,
+                cls.parse_relative_time(remarks[0], now) if remarks else None, keyword=stocks,
+                category_name=title[1:3] if title.startswith("[") else None,
+            ))
+        return articles
+
+    async def fetch(self, client, start_time=None, end_time=None):
+        # 討論區首頁由伺服器端渲染，貼文已在 HTML 中，不需以瀏覽器捲動；只抓取首頁的最新貼文
+        page = await client.get(self.forum_url)
+        if page is None:
+            return []
+        return [article for article in self.parse_forum(page, self.forum_url)
+                if _in_timeframe(article["publish_at"], start_time, end_time)]
+
+
+NEWS_SOURCES: Dict[str, Type[NewsSource]] = {
+    source.name: source for source in (CnyesSource, AnueSource, UdnSource, CteeSource, CmoneySource)
+}
+
+
+class NewsSourceCollector:
+
+    def __init__(self, sources: Iterable[NewsSource], max_concurrency: int = 16,
+                 text_normalizer: Optional[TextNormalizer] = None) -> None:
+        """
+        並行抓取多個新聞來源，共用同一個 AsyncHttpClient，並以網址與內文指紋跨來源去重。
+
+        :param sources: NewsSource 列表，排在前面的來源在重複時優先保留。
+        :param max_concurrency: 全部來源同時進行中的請求上限。
+        :param text_normalizer: 用於產生 clean_text 與內文指紋的正規化器。
+        """
+        self.sources = list(sources)
+        self.max_concurrency = max_concurrency
+        self.text_normalizer = text_normalizer or TextNormalizer()
+        self.stats: Dict[str, dict] = {}
+        # 最近一次 collect 各來源去重前抓到的文章，供呼叫端更新各來源的 high-water mark
+        self.source_articles: Dict[str, List[dict]] = {}
+
+    @classmethod
+    def from_names(cls, source_names: Iterable[str], **kwargs) -> "NewsSourceCollector":
+        """依來源名稱（cnyes、anue、udn、ctee、cmoney）建立 collector"""
+        return cls([NEWS_SOURCES[source_name]() for source_name in source_names], **kwargs)
+
+    def content_fingerprint(self, article: dict) -> Optional[str]:
+        """正規化後內文的 sha256；內文過短時回傳 None"""
+        content = self.text_normalizer.normalize(article.get("content"))
+        if len(content) < MIN_FINGERPRINT_LENGTH:
+            return None
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def deduplicate(self, articles: Iterable[dict]) -> List[dict]:
+        """依來源順序保留第一次出現的文章，網址、news_id 或內文指紋任一相同即視為重複"""
+        seen_urls, seen_news_ids, seen_fingerprints = set(), set(), set()
+        unique_articles = []
+        for article in articles:
+            url = canonical_url(article["url"])
+            fingerprint = self.content_fingerprint(article)
+            if url in seen_urls or article["news_id"] in seen_news_ids or (fingerprint and fingerprint in seen_fingerprints):
+                self.stats[article["source"]]["duplicates"] += 1
+                continue
+            seen_urls.add(url)
+            seen_news_ids.add(article["news_id"])
+            if fingerprint:
+                seen_fingerprints.add(fingerprint)
+            unique_articles.append(article)
+        return unique_articles
+
+    @staticmethod
+    def _after_high_water_mark(articles: List[dict], high_water_mark: Optional[dict]) -> List[dict]:
+        # 與 CnyesNewsSpider.fetch_news_since 相同：同一秒發佈的新聞以 news_id 判斷是否已匯入
+        if not high_water_mark:
+            return articles
+        seen_news_ids = set(high_water_mark["news_ids"])
+        return [article for article in articles
+                if article["publish_at"] > high_water_mark["publish_at"]
+                or (article["publish_at"] == high_water_mark["publish_at"] and article["news_id"] not in seen_news_ids)]
+
+    async def collect_async(self, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                            high_water_marks: Optional[Dict[str, dict]] = None) -> List[dict]:
+        """
+        同時抓取所有來源，單一來源失敗不影響其他來源。
+
+        :param high_water_marks: 來源名稱 -> IngestionStateStore 的 high-water mark，
+                                 有 mark 的來源只抓取 mark 之後的新聞（不早於 start_time）。
+        :return: 去重並加上 clean_text 的新聞資料，由新到舊排列。
+        """
+        high_water_marks = high_water_marks or {}
+        async with AsyncHttpClient(max_concurrency=self.max_concurrency) as client:
+            for source in self.sources:
+                for domain in source.domains:
+                    client.set_rate_limit(domain, source.rate_limit, source.burst)
+
+            async def timed_fetch(source):
+                start = time.perf_counter()
+                high_water_mark = high_water_marks.get(source.name)
+                source_start_time = start_time
+                if high_water_mark and (not start_time or high_water_mark["publish_at"] > start_time):
+                    source_start_time = high_water_mark["publish_at"]
+                articles = await source.fetch(client, source_start_time, end_time)
+                return self._after_high_water_mark(articles, high_water_mark), time.perf_counter() - start
+
+            results = await asyncio.gather(*(timed_fetch(source) for source in self.sources),
+                                           return_exceptions=True)
+            request_count = client.request_count
+
+        all_articles = []
+        self.stats = {}
+        self.source_articles = {}
+        for source, result in zip(self.sources, results):
+            if isinstance(result, Exception):
+                print(f'來源 {source.name} 抓取失敗，錯誤: {result!r}')
+                self.stats[source.name] = {"fetched": 0, "duplicates": 0, "seconds": None}
+                continue
+            articles, seconds = result
+            self.stats[source.name] = {"fetched": len(articles), "duplicates": 0, "seconds": round(seconds, 2)}
+            self.source_articles[source.name] = articles
+            all_articles.extend(articles)
+
+        unique_articles = self.deduplicate(all_articles)
+        self.text_normalizer.normalize_articles(unique_articles)
+        unique_articles.sort(key=lambda article: article["publish_at"], reverse=True)
+        print(f"collected {len(unique_articles)} news from {len(self.sources)} sources with {request_count} requests")
+        return unique_articles
+
+    def collect(self, start_time: Optional[str] = None, end_time: Optional[str] = None,
+                high_water_marks: Optional[Dict[str, dict]] = None) -> List[dict]:
+        """collect_async 的同步介面"""
+        return asyncio.run(self.collect_async(start_time=start_time, end_time=end_time,
+                                              high_water_marks=high_water_marks))
+
+
+if __name__ == "__main__":
+    collector = NewsSourceCollector.from_names(NEWS_SOURCES)
+    all_news_data_json = collector.collect(start_time="2024-09-08 00:00:00", end_time="2024-09-08 23:59:59")
+    for source_name, source_stats in collector.stats.items():
+        print(source_name, source_stats)
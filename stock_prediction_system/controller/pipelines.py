@@ -1,17 +1,33 @@
 import json
 import os
+import time
 import pandas as pd
 import numpy as np
 import plotly.express as px
-from matplotlib import pyplot as plt
-from matplotlib import rcParams
-# 設置中文字體，這裡假設使用 SimHei 字體
-rcParams['font.sans-serif'] = ['SimHei']  # 使用黑體字體顯示中文
-rcParams['axes.unicode_minus'] = False    # 確保負號可以正常顯示
+import requests
 
 from stock_prediction_system.controller.google_real_time_news import CnyesNewsSpider
+from stock_prediction_system.controller.async_news_spider import AsyncCnyesNewsSpider
+from stock_prediction_system.controller.news_sources import NewsSourceCollector
+from stock_prediction_system.controller.near_duplicate import NearDuplicateIndex
 from stock_prediction_system.utils.extract_path import PathSetting
+from stock_prediction_system.model.ingestion_state_store import IngestionStateStore
+from stock_prediction_system.model.news_store import NewsParquetStore
+from stock_prediction_system.model.match_cache import MatchCacheStore
+from stock_prediction_system.utils.hashing import MATCH_CONTENT_FIELDS, content_fingerprint
 from stock_prediction_system.controller.stock_list import GetStockList
+from stock_prediction_system.controller.stock_matcher import DisambiguationRules, ParallelStockMatcher, StockMatcher
+from stock_prediction_system.controller.text_normalizer import TextNormalizer
+from stock_prediction_system.controller.security_master import SecurityMaster
+from stock_prediction_system.controller.mention_aggregator import MentionAggregator
+from stock_prediction_system.controller.mention_matrix import MentionMatrixStore
+from stock_prediction_system.controller.report_renderer import ReportBuilder
+from stock_prediction_system.controller.sub_industry import SubIndustrySpider, SubIndustryTaxonomy
+from stock_prediction_system.controller.price_store import DailyPriceSpider, PriceStore
+from stock_prediction_system.controller.mention_predictor import MentionPricePanel, RidgeModel, complete_rows, rank_predictions
+from stock_prediction_system.controller.backtester import MentionBacktester, expand_grid, run_sweep, walk_forward
+from stock_prediction_system.controller.spike_detector import MentionSpikeDetector
+from stock_prediction_system.controller.sentiment import SentimentScorer
 
 # 初始化
 class Preflight:
@@ -44,17 +60,86 @@ class stock_lists_download:
 
     def _stock_lists_download(self):
         path_setting = PathSetting()
-        stock_list = GetStockList()
+        stock_list = GetStockList(cache_dir=path_setting.get_files_path('isin_cache_path'))
         stock_list.download_stock_list_to_csv(path_setting.get_files_path('stocks_list_path'))
+        # 同步更新股票主檔快取，下游直接讀取已篩選的主檔
+        SecurityMaster.refresh(path_setting.get_files_path('security_master_path'), stock_list)
+        return None
+
+# 抓取細產業族群，建立 個股 -> 細產業 與 細產業 -> 個股 的索引
+class sub_industry_download:
+    def __init__(self, name, max_concurrency=8):
+        self.name = name
+        self.max_concurrency = max_concurrency
+
+    def execute(self):
+        print(self.name, "run...")
+
+        # process procedure
+        return self._sub_industry_download()
+
+    def _sub_industry_download(self):
+        path_setting = PathSetting()
+        sub_industry_path = path_setting.get_files_path('sub_industry_path')
+        try:
+            taxonomy = SubIndustryTaxonomy.refresh(sub_industry_path,
+                                                   SubIndustrySpider(max_concurrency=self.max_concurrency))
+        except ConnectionError as e:
+            # 細產業只是統計的附加維度，網站無法連線時沿用上次的快取，不中斷後續的新聞統計
+            kept = "keep previous file" if os.path.exists(sub_industry_path) else "no previous file, skip sub-industry"
+            print(f"{self.name} failed: {e}, {kept}")
+            return None
+        print(f"{self.name} {len(taxonomy)} categories, {len(taxonomy.stock_codes)} stocks")
+        return None
+
+# 匯入上市櫃日成交資料到本地價格庫
+class daily_price_download:
+    def __init__(self, name, file_path=None, trade_date=None):
+        self.name = name
+        self.file_path = file_path
+        self.trade_date = trade_date
+
+    def execute(self):
+        print(self.name, "run...")
+
+        # process procedure
+        return self._daily_price_download()
+
+    def _daily_price_download(self):
+        path_setting = PathSetting()
+        file_path = self.file_path or path_setting.get_files_path('daily_price_file_path')
+        price_store = PriceStore(path_setting.get_files_path('price_store_path'))
+        # 整理好的歷史檔只在第一次（或檔案更新後）匯入作為回補，之後每天由 OpenAPI 抓取最近一個交易日
+        if file_path and os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            backfill_count = price_store.import_file(file_path)
+            if backfill_count is not None:
+                print(f"{self.name} imported {backfill_count} rows from {file_path}")
+
+        try:
+            prices = DailyPriceSpider().fetch_latest(self.trade_date)
+        except requests.RequestException as e:
+            # 收盤資料抓不到時保留既有價格庫，不中斷新聞統計；下次執行會補上最近一個交易日
+            print(f"{self.name} failed: {e}, keep existing price store")
+            return None
+        row_count = price_store.ingest(prices)
+        print(f"{self.name} {row_count} rows, store {len(price_store)} days x {len(price_store.stock_codes)} stocks")
         return None
 
 # 每日財經新聞抓取
 class stock_news_extraction:
-    def __init__(self, name, start_time, end_time):
+    def __init__(self, name, start_time, end_time, use_async=False, rate_limit=2.0, max_concurrency=4,
+                 incremental=False, sources=None, tag_near_duplicates=True, backfill=False):
         '''
         :param name:
         :param start_time:
         :param end_time:
+        :param use_async: 是否以 asyncio 並行抓取新聞列表
+        :param rate_limit: 並行抓取時每秒最多發出的請求數
+        :param max_concurrency: 並行抓取時同時進行中的請求上限
+        :param incremental: 是否只抓取上次匯入之後的新聞並合併至既有新聞資料；與 sources 併用時每個來源各自記錄 high-water mark
+        :param sources: 新聞來源名稱列表（cnyes、anue、udn、ctee、cmoney），指定時同時抓取所有來源並跨來源去重
+        :param tag_near_duplicates: 是否以 MinHash/LSH 索引為每篇新聞標記 cluster_id，轉載或改寫的同一則新聞會得到相同的 cluster_id
+        :param backfill: 增量模式下 start_time 早於 high-water mark 時，是否一併回補 start_time ~ high-water mark 的新聞
 
         example
         start_time="2024-09-02 00:00:00",
@@ -65,6 +150,15 @@ class stock_news_extraction:
         self.name = name
         self.start_time = start_time
         self.end_time = end_time
+        self.use_async = use_async
+        self.rate_limit = rate_limit
+        self.max_concurrency = max_concurrency
+        self.incremental = incremental
+        self.sources = sources
+        self.source_stats = None  # 多來源模式執行後保留各來源的抓取篇數、重複篇數與耗時
+        self.tag_near_duplicates = tag_near_duplicates
+        self.near_duplicate_index = None
+        self.backfill = backfill
 
     def execute(self):
         print(self.name, "run...")
@@ -73,71 +167,470 @@ class stock_news_extraction:
 
         return self._stock_news_extraction()
 
+    def stream(self, flush_size=1000):
+        '''
+        串流模式：每抓完一頁就產出該頁新聞，下游可邊抓邊計算，記憶體只保留尚未寫入儲存庫的新聞。
+
+        :param flush_size: 累積多少篇新聞後寫入一次儲存庫，避免產生過多小檔案
+        :return: 每頁新聞資料列表的 generator
+        '''
+        print(self.name, "stream...")
+
+        path_setting = PathSetting()
+        news_store = NewsParquetStore(path_setting.get_files_path("news_store_path"))
+        cnyes_news_spider = self._get_spider()
+
+        text_normalizer = TextNormalizer()
+        pending_news_data = []
+        touched_dates = set()
+        try:
+            for news_page in cnyes_news_spider.iter_news_pages(start_time=self.start_time, end_time=self.end_time):
+                text_normalizer.normalize_articles(news_page)
+                self._tag_near_duplicates(news_page)
+                # 先放入待寫入列表再產出，下游在這一頁中斷時該頁仍會寫入
+                pending_news_data.extend(news_page)
+                yield news_page
+
+                if len(pending_news_data) >= flush_size:
+                    news_store.append(pending_news_data)
+                    touched_dates.update(news_data["publish_at"][:10] for news_data in pending_news_data)
+                    pending_news_data = []
+        finally:
+            # 抓取或下游計算拋出例外、或 generator 提前關閉時，已抓取的新聞與近似重複索引仍需保存
+            news_store.append(pending_news_data)
+            touched_dates.update(news_data["publish_at"][:10] for news_data in pending_news_data)
+            # 分批寫入會在同一分區留下多個檔案，結束時合併
+            for publish_date in touched_dates:
+                news_store.compact(publish_date)
+            self._save_near_duplicate_index()
+
+    def _tag_near_duplicates(self, news_data_list):
+        # 索引常駐記憶體，每篇新聞只查詢自己的 LSH 桶，成本不隨累積文章數成長
+        if not self.tag_near_duplicates:
+            return
+        if self.near_duplicate_index is None:
+            self.near_duplicate_index = NearDuplicateIndex.load(
+                PathSetting().get_files_path("near_duplicate_index_path"))
+        duplicate_count = self.near_duplicate_index.tag_articles(news_data_list)
+        if duplicate_count:
+            print(f"{self.name} tagged {duplicate_count} near-duplicate news")
+
+    def _save_near_duplicate_index(self):
+        if self.near_duplicate_index is not None:
+            self.near_duplicate_index.save(PathSetting().get_files_path("near_duplicate_index_path"))
+
+    def _get_spider(self):
+        if self.use_async:
+            return AsyncCnyesNewsSpider(rate_limit=self.rate_limit, max_concurrency=self.max_concurrency)
+        return CnyesNewsSpider()
+
     def _stock_news_extraction(self):
+        path_setting = PathSetting()
+        news_store = NewsParquetStore(path_setting.get_files_path("news_store_path"))
+        if self.sources:
+            ingestion_state_path = path_setting.get_files_path("ingestion_state_path") if self.incremental else None
+            return self._multi_source_news_extraction(news_store, ingestion_state_path)
+
+        cnyes_news_spider = self._get_spider()
+
+        if self.incremental:
+            return self._incremental_news_extraction(cnyes_news_spider, news_store,
+                                                     path_setting.get_files_path("ingestion_state_path"))
 
-        cnyes_news_spider = CnyesNewsSpider()
         all_news_data_json = cnyes_news_spider.fetch_all_news_within_timeframe(
             start_time=self.start_time,
             end_time=self.end_time
         )
+        # 每篇新聞只在匯入時正規化一次，clean_text 與原文一起寫入儲存庫
+        TextNormalizer().normalize_articles(all_news_data_json)
+        self._tag_near_duplicates(all_news_data_json)
+        self._save_near_duplicate_index()
 
-        # 儲存成 JSON 文件，並指定編碼為 UTF-8
-        with open("../data/processed/news_data.json", "w", encoding="utf-8") as json_file:
-            json.dump(all_news_data_json, json_file, ensure_ascii=False, indent=4)
+        # 依發佈日期寫入 Parquet 分區，已存在的 news_id 內容相同時略過，編輯過的以新內容取代
+        news_store.append(all_news_data_json)
 
         return all_news_data_json
 
+    def _multi_source_news_extraction(self, news_store, ingestion_state_path=None):
+        # 所有來源共用連線池並依網域限流，結果已去重並帶有 clean_text
+        collector = NewsSourceCollector.from_names(self.sources, max_concurrency=self.max_concurrency * len(self.sources))
+        state_store = IngestionStateStore(ingestion_state_path) if ingestion_state_path else None
+        high_water_marks = None
+        if state_store and news_store.list_partitions() and not self.backfill:
+            # 每個來源各自記錄 high-water mark，只抓取該來源上次匯入之後的新聞；backfill 時抓取完整區間
+            high_water_marks = {source_name: state_store.get_high_water_mark(source_name)
+                                for source_name in self.sources}
+        all_news_data_json = collector.collect(start_time=self.start_time, end_time=self.end_time,
+                                               high_water_marks=high_water_marks)
+        self.source_stats = collector.stats
+        for source_name, source_stats in self.source_stats.items():
+            print(f"{self.name} {source_name}: {source_stats}")
+
+        # 網址或內文完全相同的已在 collector 去除，改寫或轉載的近似重複以 cluster_id 標記
+        self._tag_near_duplicates(all_news_data_json)
+        self._save_near_duplicate_index()
+        news_store.append(all_news_data_json)
+        if state_store is None:
+            return all_news_data_json
+
+        # 以去重前各來源抓到的文章更新 mark，被其他來源去重的轉載下次也不會再抓；抓取失敗的來源 mark 不變
+        for source_name, source_articles in collector.source_articles.items():
+            state_store.update_high_water_mark(source_name, source_articles)
+        return news_store.read_news(start_time=self.start_time, end_time=self.end_time)
+
+    def _incremental_news_extraction(self, cnyes_news_spider, news_store, ingestion_state_path):
+        state_store = IngestionStateStore(ingestion_state_path)
+        high_water_mark = state_store.get_high_water_mark(cnyes_news_spider.source)
+
+        if high_water_mark and news_store.list_partitions():
+            # 只抓取上次匯入之後的新聞，成本與新增文章數量成正比，而非時間區間長度
+            new_news_data = cnyes_news_spider.fetch_news_since(high_water_mark, end_time=self.end_time)
+            if self.backfill and self.start_time and self.start_time < high_water_mark["publish_at"]:
+                # 回補 high-water mark 之前的區間；已存在且未編輯的 news_id 寫入時略過，high-water mark 也不會倒退
+                backfill_end_time = min(self.end_time or high_water_mark["publish_at"], high_water_mark["publish_at"])
+                backfill_news_data = cnyes_news_spider.fetch_all_news_within_timeframe(start_time=self.start_time,
+                                                                                      end_time=backfill_end_time)
+                fetched_news_ids = {news_data["news_id"] for news_data in new_news_data}
+                new_news_data += [news_data for news_data in backfill_news_data
+                                  if news_data["news_id"] not in fetched_news_ids]
+        else:
+            new_news_data = cnyes_news_spider.fetch_all_news_within_timeframe(
+                start_time=self.start_time,
+                end_time=self.end_time
+            )
+        print(f"{self.name} fetched {len(new_news_data)} new news")
+
+        TextNormalizer().normalize_articles(new_news_data)
+        self._tag_near_duplicates(new_news_data)
+        self._save_near_duplicate_index()
+        news_store.append(new_news_data)
+        state_store.update_high_water_mark(cnyes_news_spider.source, new_news_data)
+
+        # 下游步驟仍以 start_time ~ end_time 區間內的新聞為準，只讀取需要的日期分區
+        return news_store.read_news(start_time=self.start_time, end_time=self.end_time)
+
 # 統計財經新聞中被提及股票和產業次數
 class count_stock_times_in_news:
-    def __init__(self, name, all_news_data_json):
+    markets = ["上市"]
+
+    def __init__(self, name, all_news_data_json=None, start_time=None, end_time=None, news_pages=None,
+                 report_every=10, use_match_cache=True, workers=1, disambiguate=True, count_story_once=False,
+                 detect_spikes=False, score_sentiment=False, keep_article_matches=False):
+        '''
+        :param name:
+        :param all_news_data_json: 新聞資料列表，為 None 時改從新聞儲存庫讀取 start_time ~ end_time 的新聞
+        :param start_time:
+        :param end_time:
+        :param news_pages: 串流模式的輸入，例如 stock_news_extraction.stream() 產出的逐頁新聞
+        :param report_every: 串流模式下每處理幾頁印出一次目前的統計結果
+        :param use_match_cache: 是否使用比對結果快取，重疊的時間區間只掃描新文章或內容變動的文章
+        :param workers: 比對使用的程序數，大於 1 時以多程序平行比對，適合回補長時間區間
+        :param disambiguate: 是否套用消歧規則（代碼 token 邊界、停用詞、模稜兩可名稱需上下文、標題加權）
+        :param count_story_once: 是否同一則新聞（相同 cluster_id 的轉載或改寫）只統計第一篇，其餘不比對也不計數
+        :param detect_spikes: 是否將每篇比對結果送入提及異常偵測器，偵測狀態跨次執行保存；
+                              新聞與串流的頁面皆由新到舊到達，每篇的比對結果先暫存，結束時依發佈時間一次送入偵測器
+        :param score_sentiment: 是否以情緒詞典為每篇文章與每個個股提及評分，結果多出情緒加權次數與情緒分數
+        :param keep_article_matches: 是否在 article_matches 保留每篇文章的比對結果供 build_mention_matrix 使用；
+                                     串流模式長時間執行時會隨文章數成長，只在需要時開啟
+        '''
         self.name = name
         self.all_news_data_json = all_news_data_json
+        self.start_time = start_time
+        self.end_time = end_time
+        self.news_pages = news_pages
+        self.report_every = report_every
+        self.use_match_cache = use_match_cache
+        self.workers = workers
+        self.disambiguate = disambiguate
+        self.count_story_once = count_story_once
+        self.detect_spikes = detect_spikes
+        self.spike_detector = None
+        self.spike_events = []  # 執行後保留本次觸發的提及異常事件
+        self._spike_matches = []  # 等待送入偵測器的 (news_id, publish_at, stock_ids)
+        self.score_sentiment = score_sentiment
+        self.sentiment_scorer = None
+        self.skipped_duplicates = 0  # count_story_once 模式下略過的近似重複篇數
+        self.near_duplicate_index = None
+        self._seen_clusters = set()
+        self.aggregator = None  # 執行後保留 MentionAggregator，可取得產業、前 N 名與每日統計
+        self.keep_article_matches = keep_article_matches
+        self.article_matches = []  # keep_article_matches 時保留每篇文章的 (news_id, publish_at, stock_ids)，供 build_mention_matrix 使用
+        self.match_cache_stats = None  # 執行後保留比對快取的命中統計
+        self.text_normalizer = None
+        self.stock_matcher = None
+        self.parallel_matcher = None
+        self.match_cache = None
 
     def execute(self):
         print(self.name, "run...")
 
         # process procedure
+        if self.news_pages is not None:
+            return self._count_stock_times_in_news_stream()
         return self._count_stock_times_in_news()
 
+    def _load_security_master(self):
+        path_setting = PathSetting()
+        return SecurityMaster.load(path_setting.get_files_path("security_master_path"),
+                                   path_setting.get_files_path("stocks_list_path"))
+
+    def _prepare_matching(self):
+        security_master = self._load_security_master()
+
+        # 所有股票名稱與代碼只編譯一次，每篇文章線性掃描一次；關鍵字與 clean_text 使用相同的正規化規則
+        path_setting = PathSetting()
+        self.text_normalizer = TextNormalizer()
+        rules = None
+        if self.disambiguate:
+            rules = DisambiguationRules.from_yaml(path_setting.get_files_path("disambiguation_config_path"))
+        self.stock_matcher = StockMatcher(security_master.universe(self.markets), self.text_normalizer, rules)
+        if self.workers > 1:
+            self.parallel_matcher = ParallelStockMatcher(self.stock_matcher, workers=self.workers)
+        if self.use_match_cache:
+            # 主檔、比對市場、正規化或消歧規則改變時版本不同，快取自動失效
+            matcher_version = (f"{security_master.version}:{','.join(self.markets)}:{self.text_normalizer.fingerprint}"
+                               f":{rules.fingerprint if rules else 'substring'}")
+            self.match_cache = MatchCacheStore(path_setting.get_files_path("match_cache_path"),
+                                               matcher_version=matcher_version)
+
+        self._seen_clusters = set()
+        self.skipped_duplicates = 0
+
+        # 提及次數直接累加在以 stock_id 為索引的計數陣列，不逐筆建立命中紀錄；有細產業分類時可一併依細產業加總
+        sub_industry_path = path_setting.get_files_path("sub_industry_path")
+        sub_industry = SubIndustryTaxonomy.load(sub_industry_path) if os.path.exists(sub_industry_path) else None
+        self.aggregator = MentionAggregator(security_master, sub_industry=sub_industry)
+        self.article_matches = []
+
+        self.spike_events = []
+        self._spike_matches = []
+        if self.detect_spikes:
+            self.spike_detector = MentionSpikeDetector.load(path_setting.get_files_path("spike_detector_state_path"),
+                                                            security_master)
+        if self.score_sentiment:
+            self.sentiment_scorer = SentimentScorer.from_yaml(path_setting.get_files_path("sentiment_lexicon_path"),
+                                                              security_master, self.text_normalizer)
+
+    def _first_of_story(self, articles):
+        '''
+        count_story_once 模式下只保留每個 cluster_id 第一次出現的文章；沒有 cluster_id 的舊資料在此補標。
+        '''
+        if not self.count_story_once:
+            return articles
+        untagged = [article for article in articles if article.get("cluster_id") is None]
+        if untagged:
+            if self.near_duplicate_index is None:
+                self.near_duplicate_index = NearDuplicateIndex.load(
+                    PathSetting().get_files_path("near_duplicate_index_path"))
+            self.text_normalizer.normalize_articles(untagged)
+            self.near_duplicate_index.tag_articles(untagged)
+
+        # 由舊到新檢查，同一則新聞保留最早發佈的一篇
+        first_articles = []
+        for article in sorted(articles, key=lambda article: article.get("publish_at") or ""):
+            cluster_id = article.get("cluster_id", article.get("news_id"))
+            if cluster_id is not None and cluster_id in self._seen_clusters:
+                self.skipped_duplicates += 1
+                continue
+            if cluster_id is not None:
+                self._seen_clusters.add(cluster_id)
+            first_articles.append(article)
+        return first_articles
+
+    def _finish_matching(self):
+        if self.spike_detector is not None:
+            self._detect_spikes()
+            self._save_spike_detector()
+        if self.near_duplicate_index is not None:
+            self.near_duplicate_index.save(PathSetting().get_files_path("near_duplicate_index_path"))
+            self.near_duplicate_index = None
+        if self.skipped_duplicates:
+            print(f"{self.name} skipped {self.skipped_duplicates} near-duplicate news")
+        if self.parallel_matcher is not None:
+            self.parallel_matcher.close()
+            self.parallel_matcher = None
+        if self.match_cache is None:
+            return
+        self.match_cache_stats = self.match_cache.stats()
+        self.match_cache.close()
+        self.match_cache = None
+        print(f"{self.name} match cache hits: {self.match_cache_stats['hits']}, "
+              f"misses: {self.match_cache_stats['misses']}, hit rate: {self.match_cache_stats['hit_rate']:.1%}")
+
+    def _match_articles(self, articles):
+        '''
+        批次比對文章，有 news_id 的文章先查詢快取，只掃描新文章或內容變動的文章。
+
+        :return: 每篇文章的 (stock_id 陣列, 權重陣列)，順序與輸入相同
+        '''
+        # 舊資料（例如 JSON 或未含 clean_text 的分區）在此補上 clean_text
+        self.text_normalizer.normalize_articles(articles)
+        if self.match_cache is None:
+            return self._scan_articles(articles)
+
+        cache_keys = [(article["news_id"], content_fingerprint(article, MATCH_CONTENT_FIELDS))
+                      if article.get("news_id") is not None else None for article in articles]
+        cached = self.match_cache.get_many(cache_key for cache_key in cache_keys if cache_key)
+
+        # 快取未命中的文章集中一次掃描，平行模式下才能整批分配給子程序
+        missed_positions = [position for position, cache_key in enumerate(cache_keys)
+                            if not cache_key or cache_key[0] not in cached]
+        scanned = self._scan_articles([articles[position] for position in missed_positions])
+
+        matched = [cached[cache_key[0]] if cache_key and cache_key[0] in cached else None
+                   for cache_key in cache_keys]
+        new_matches = []
+        for position, (stock_ids, weights) in zip(missed_positions, scanned):
+            matched[position] = (stock_ids, weights)
+            if cache_keys[position]:
+                new_matches.append((*cache_keys[position], stock_ids, weights))
+
+        self.match_cache.put_many(new_matches)
+        return matched
+
+    def _score_articles(self, articles, matched):
+        '''
+        比對後整批評分情緒，文章分數寫入 sentiment 欄位。
+
+        :return: 每篇文章與比對結果對應的個股情緒分數；未啟用情緒評分時皆為 None
+        '''
+        if self.sentiment_scorer is None:
+            return [None] * len(articles)
+        return self.sentiment_scorer.score_articles(articles, [stock_ids for stock_ids, _ in matched])
+
+    def _scan_articles(self, articles):
+        if self.parallel_matcher is not None and len(articles) > self.parallel_matcher.shard_size:
+            return self.parallel_matcher.match_weighted(articles)
+        return [self.stock_matcher.match_weighted(article) for article in articles]
+
+    def iter_running_counts(self):
+        '''
+        逐頁消化串流輸入，每處理完一頁就產出目前累計的 MentionAggregator。
+        不保留文章本身，未開啟 keep_article_matches 與 detect_spikes 時記憶體只與股票數量和天數有關。
+        '''
+        self._prepare_matching()
+        try:
+            for news_page in self.news_pages:
+                news_page = self._first_of_story(news_page)
+                self._add_articles(news_page, self._match_articles(news_page))
+                yield self.aggregator
+        finally:
+            self._finish_matching()
+
+    def _add_articles(self, articles, matched):
+        for article, (stock_ids, weights), sentiments in zip(articles, matched,
+                                                             self._score_articles(articles, matched)):
+            self.aggregator.add(stock_ids, article.get("publish_at"), weights, sentiments)
+            if article.get("news_id") is None or not article.get("publish_at"):
+                continue
+            if self.keep_article_matches:
+                self.article_matches.append((article["news_id"], article["publish_at"], stock_ids))
+            if self.spike_detector is not None:
+                self._spike_matches.append((article["news_id"], article["publish_at"], stock_ids))
+
+    def _detect_spikes(self):
+        # 串流的頁面由新到舊到達，第一頁就會把偵測器推進到最新的時間區塊，較舊的頁面只能併入或被視為遲到；
+        # 因此整段串流結束後才由 update_many 依發佈時間由舊到新送入
+        for event in self.spike_detector.update_many(self._spike_matches):
+            print(f"{self.name} spike: {event['name']} {event['bucket_start']} "
+                  f"count {event['count']} z {event['z_score']:.1f}")
+            self.spike_events.append(event)
+        self._spike_matches = []
+
+    def _save_spike_detector(self):
+        path_setting = PathSetting()
+        self.spike_detector.save(path_setting.get_files_path("spike_detector_state_path"))
+        self.spike_detector = None
+        if not self.spike_events:
+            return
+        # 事件逐行附加，供告警或儀表板讀取
+        spike_events_path = path_setting.get_files_path("spike_events_path")
+        os.makedirs(os.path.dirname(os.path.abspath(spike_events_path)), exist_ok=True)
+        with open(spike_events_path, 'a', encoding='utf-8') as events_file:
+            for event in self.spike_events:
+                events_file.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def _count_stock_times_in_news_stream(self):
+        for page_count, aggregator in enumerate(self.iter_running_counts(), start=1):
+            if page_count % self.report_every == 0:
+                top_stocks = ", ".join(f"{row.股票名稱}:{row.出現次數}"
+                                       for row in aggregator.top_stocks(3).itertuples())
+                print(f"{self.name} processed {page_count} pages, top: {top_stocks}")
+
+        # 每支股票一列，出現次數為累計值，下游以 groupby 加總的結果與逐篇列表相同
+        return self.aggregator.stock_frame()
+
     def _count_stock_times_in_news(self):
         path_setting = PathSetting()
-        stock_list_all = pd.read_csv(path_setting.get_files_path("stocks_list_path"), encoding="utf-8-sig")
-        stock_lists = stock_list_all[(stock_list_all["市場別"] == "上市") & (pd.notna(stock_list_all["產業別"]))]
-
-        # 儲存符合條件的股票和產業名稱出現次數
-        stock_occurrences = []
-        for article in self.all_news_data_json:
-            article_title = article.get("title", "")
-            article_content = article.get("content", "")
-            matched_stocks = set()  # 每篇文章中可能有多支股票匹配，用集合來避免重複
-
-            for _, row in stock_lists.iterrows():
-                stock_name = row["股票名稱"]
-                stock_code = row["股票代碼"]
-
-                # 將 title 和 content 的檢查合併，減少重複邏輯
-                if any(term in article_title or term in article_content for term in [stock_name, stock_code]):
-                    matched_stocks.add((stock_name, stock_code, row["產業別"]))
-
-            # 將每篇文章中提到的股票累加至結果列表
-            for stock_name, stock_code, industry in matched_stocks:
-                stock_occurrences.append({
-                    "股票名稱": stock_name,
-                    "股票代碼": stock_code,
-                    "產業別": industry,
-                    "出現次數": 1  # 每次匹配就增加一次
-                })
-
-            # 將出現次數的資料轉為 DataFrame
-            df = pd.DataFrame(stock_occurrences)
-
-        return df
+
+        if self.all_news_data_json is None:
+            # 比對只需要 news_id、clean_text 與發佈時間，僅讀取這些欄位與所需的日期分區
+            news_store = NewsParquetStore(path_setting.get_files_path("news_store_path"))
+            self.all_news_data_json = news_store.read_news(start_time=self.start_time, end_time=self.end_time,
+                                                           columns=["news_id", "clean_text", "publish_at", "cluster_id"])
+            if any(news_data["clean_text"] is None for news_data in self.all_news_data_json):
+                # 新增 clean_text 欄位之前匯入的分區沒有正規化文字，改讀標題與內文由比對前補上
+                self.all_news_data_json = news_store.read_news(
+                    start_time=self.start_time, end_time=self.end_time,
+                    columns=["news_id", "title", "content", "clean_text", "publish_at", "cluster_id"]
+                )
+
+        self._prepare_matching()
+        try:
+            articles = self._first_of_story(self.all_news_data_json)
+            self._add_articles(articles, self._match_articles(articles))
+        finally:
+            self._finish_matching()
+
+        return self.aggregator.stock_frame()
+
+# 將比對結果寫入「文章 × 股票」稀疏矩陣，之後的時間區間、共同提及與產業分析不需再掃描新聞原文
+class build_mention_matrix:
+    def __init__(self, name, article_matches):
+        '''
+        :param name:
+        :param article_matches: count_stock_times_in_news 執行後的 article_matches
+        '''
+        self.name = name
+        self.article_matches = article_matches
+
+    def execute(self):
+        print(self.name, "run...")
+
+        # process procedure
+        return self._build_mention_matrix()
+
+    def _build_mention_matrix(self):
+        path_setting = PathSetting()
+        security_master = SecurityMaster.load(path_setting.get_files_path("security_master_path"),
+                                              path_setting.get_files_path("stocks_list_path"))
+        mention_matrix_store = MentionMatrixStore(path_setting.get_files_path("mention_matrix_path"), security_master)
+
+        added_count = mention_matrix_store.add_articles(self.article_matches)
+        # 每次執行追加一個 chunk，累積過多時才合併，避免每次都重寫整個矩陣
+        mention_matrix_store.compact(max_chunks=16)
+        print(f"{self.name} added {added_count} articles")
+
+        return None
 
 # 統計財經新聞中被提及股票和產業次數
 class plot_statistic_result:
-    def __init__(self, name, compare_result_in_news):
+    def __init__(self, name, compare_result_in_news, daily_counts=None, sub_industry_counts=None, report_date=None,
+                 workers=4):
+        '''
+        :param name:
+        :param compare_result_in_news: count_stock_times_in_news 的個股統計結果
+        :param daily_counts: MentionAggregator.daily_frame()，提供時加入每日趨勢圖
+        :param sub_industry_counts: MentionAggregator.sub_industry_frame()，提供時加入細產業長條圖
+        :param report_date: 報表日期（YYYY-MM-DD），決定輸出資料夾，預設為今天
+        :param workers: 繪圖子程序數
+        '''
         self.name = name
         self.compare_result_in_news = compare_result_in_news
+        self.daily_counts = daily_counts
+        self.sub_industry_counts = sub_industry_counts
+        self.report_date = report_date
+        self.workers = workers
 
     def execute(self):
         print(self.name, "run...")
@@ -171,37 +664,165 @@ class plot_statistic_result:
     #                     encoding='utf-8')
 
     def _plot_statistic_result(self):
-        # 聚合相同股票名稱+股票代碼的出現次數
-        df = self.compare_result_in_news
-        df_stock_count = df.groupby(['股票名稱', '股票代碼', '產業別'])['出現次數'].sum().reset_index()
-
-        # 1. 統計於新聞標題出現最多次的前10大 "股票代碼+股票名稱" 並繪製成長條圖
-        top_10_stocks = df_stock_count.nlargest(10, '出現次數')
-
-        # 繪製前10大股票的長條圖
-        plt.figure(figsize=(10, 6))
-        plt.bar(top_10_stocks['股票名稱'], top_10_stocks['出現次數'], color='skyblue')
-        plt.title('新聞標題出現最多次的前10大股票名稱', fontsize=14)
-        plt.xlabel('股票名稱', fontsize=12)
-        plt.ylabel('出現次數', fontsize=12)
-        plt.xticks(rotation=45, ha='right')  # 避免文字重疊
-        plt.tight_layout()
-        plt.savefig('新聞標題出現最多次的前10大股票名稱.png')  # 保存圖表為 PNG
-        plt.show()
-
-        # 2. 統計於新聞標題出現最多次的前3大產業名稱 並繪製成長條圖
-        df_industry_count = df.groupby('產業別')['出現次數'].sum().reset_index()
-        top_industries = df_industry_count.nlargest(3, '出現次數')
-
-        # 繪製前3大產業的長條圖
-        plt.figure(figsize=(8, 5))
-        plt.bar(top_industries['產業別'], top_industries['出現次數'], color='lightcoral')
-        plt.title('新聞標題出現最多次的前3大產業名稱', fontsize=14)
-        plt.xlabel('產業別', fontsize=12)
-        plt.ylabel('出現次數', fontsize=12)
-        plt.tight_layout()
-        plt.savefig('新聞標題出現最多次的前3大產業名稱.png')  # 保存圖表為 PNG
-        plt.show()
+        # 以 Agg 後端在子程序平行繪圖，不需顯示器；PNG 與內嵌圖表的 HTML 輸出到以日期命名的資料夾
+        path_setting = PathSetting()
+        report_builder = ReportBuilder(path_setting.get_files_path("report_path"), workers=self.workers)
+        report = report_builder.build(self.compare_result_in_news, daily_counts=self.daily_counts,
+                                      sub_industry_counts=self.sub_industry_counts, report_date=self.report_date)
+        print(f"{self.name} report: {report['html']}")
+
+        return report
+
+# 結合新聞提及次數與價格特徵，預測下一個交易日報酬率並排名
+class stock_prediction:
+    def __init__(self, name, train_days=750, retrain_days=5, ridge_alpha=10.0):
+        '''
+        :param name:
+        :param train_days: 訓練使用的最近交易日數
+        :param retrain_days: 模型訓練資料落後超過此交易日數才重新訓練，否則沿用已儲存的模型
+        :param ridge_alpha: ridge 迴歸的 L2 正規化強度
+        '''
+        self.name = name
+        self.train_days = train_days
+        self.retrain_days = retrain_days
+        self.ridge_alpha = ridge_alpha
+
+    def execute(self):
+        print(self.name, "run...")
+
+        # process procedure
+        return self._stock_prediction()
+
+    def _stock_prediction(self):
+        path_setting = PathSetting()
+        security_master = SecurityMaster.load(path_setting.get_files_path("security_master_path"),
+                                              path_setting.get_files_path("stocks_list_path"))
+        price_store = PriceStore(path_setting.get_files_path("price_store_path"), security_master)
+        panel_builder = MentionPricePanel()
+        trading_dates = price_store.dates[-(self.train_days + panel_builder.lookback):]
+        if len(trading_dates) < 2:
+            print(f"{self.name} not enough price history, skipped")
+            return None
+
+        # 價格與提及次數都以主檔 stock_id 為欄位順序對齊
+        securities = security_master.securities
+        stock_codes = securities['股票代碼'].astype(str).tolist()
+        start_date = trading_dates[0].strftime('%Y-%m-%d')
+        close = price_store.panel('收盤價', start_date, stock_codes=stock_codes)
+        volume = price_store.panel('成交股數', start_date, stock_codes=stock_codes)
+        mention_matrix_store = MentionMatrixStore(path_setting.get_files_path("mention_matrix_path"), security_master)
+        day_counts = mention_matrix_store.trading_day_counts(trading_dates)
+        mention_counts = pd.DataFrame(day_counts.astype(np.float64), index=close.index, columns=close.columns)
+        # 提及矩陣開始收錄之前的交易日沒有新聞資料，設為缺值，提及特徵視窗完整落在收錄期間後才納入訓練
+        mention_counts.iloc[:mention_matrix_store.first_covered_day(trading_dates)] = np.nan
+        features, target = panel_builder.build(mention_counts, close, volume)
+
+        model = self._load_or_train(path_setting.get_files_path("prediction_model_path"), panel_builder,
+                                    trading_dates, features, target)
+        if model is None:
+            print(f"{self.name} no complete training rows, skipped")
+            return None
+
+        start = time.perf_counter()
+        latest = features[-1]
+        predicted = np.where(complete_rows(latest), model.predict(latest), np.nan)
+        prediction_date = trading_dates[-1].strftime('%Y-%m-%d')
+        ranking = rank_predictions(predicted, np.asarray(stock_codes), prediction_date)
+        score_seconds = time.perf_counter() - start
+
+        stock_ids = ranking['股票代碼'].map(security_master.code_to_id).to_numpy()
+        ranking.insert(2, '股票名稱', securities['股票名稱'].to_numpy()[stock_ids])
+        ranking.insert(3, '產業別', securities['產業別'].astype(str).to_numpy()[stock_ids])
+        ranking.insert(4, '新聞提及次數', day_counts[-1][stock_ids])
+        ranking.to_csv(path_setting.get_files_path("model_predict_path"), index=False, encoding='utf-8-sig')
+        print(f"{self.name} {prediction_date} scored {len(ranking)} stocks in {score_seconds * 1000:.1f}ms")
+
+        return ranking
+
+    def _load_or_train(self, model_path, panel_builder, trading_dates, features, target):
+        # 最後一天沒有隔日報酬，可訓練的最後一個特徵日期為倒數第二個交易日
+        train_until = trading_dates[-2]
+        model = RidgeModel.load(model_path)
+        if model is not None and model.feature_names == panel_builder.feature_names:
+            days_behind = len(trading_dates) - 1 - trading_dates.searchsorted(pd.Timestamp(model.trained_until),
+                                                                              side='right')
+            if days_behind < self.retrain_days:
+                return model
+
+        train_mask = complete_rows(features, target)
+        if not train_mask.any():
+            return None
+        model = RidgeModel.fit(features[train_mask], target[train_mask], panel_builder.feature_names,
+                               alpha=self.ridge_alpha, trained_until=train_until.strftime('%Y-%m-%d'))
+        model.save(model_path)
+        print(f"{self.name} trained on {model.train_rows} rows until {model.trained_until}")
+        return model
+
+# 回測新聞提及訊號，平行掃描參數組合；不在每日排程中，需要時另外執行
+class mention_backtest:
+    default_param_grids = [
+        {'rule': ['top_n'], 'lookback': [1, 3, 5, 10, 20], 'top_n': [5, 10, 20, 50], 'holding_days': [1, 3, 5, 10]},
+        {'rule': ['spike'], 'lookback': [5, 10, 20, 60], 'z_threshold': [2, 3, 4, 5], 'holding_days': [1, 3, 5, 10]},
+    ]
+
+    def __init__(self, name, param_grids=None, history_days=1250, workers=4, train_days=252, test_days=63):
+        '''
+        :param name:
+        :param param_grids: expand_grid 的參數網格列表，預設為 default_param_grids
+        :param history_days: 回測使用的最近交易日數
+        :param workers: 平行回測的子程序數
+        :param train_days: walk-forward 每段選擇設定使用的交易日數
+        :param test_days: walk-forward 每段樣本外測試的交易日數
+        '''
+        self.name = name
+        self.param_grids = param_grids or self.default_param_grids
+        self.history_days = history_days
+        self.workers = workers
+        self.train_days = train_days
+        self.test_days = test_days
+
+    def execute(self):
+        print(self.name, "run...")
+
+        # process procedure
+        return self._mention_backtest()
+
+    def _mention_backtest(self):
+        path_setting = PathSetting()
+        security_master = SecurityMaster.load(path_setting.get_files_path("security_master_path"),
+                                              path_setting.get_files_path("stocks_list_path"))
+        price_store = PriceStore(path_setting.get_files_path("price_store_path"), security_master)
+        trading_dates = price_store.dates[-self.history_days:]
+        if len(trading_dates) < 2:
+            print(f"{self.name} not enough price history, skipped")
+            return None
+
+        mention_matrix_store = MentionMatrixStore(path_setting.get_files_path("mention_matrix_path"), security_master)
+        # 提及矩陣開始收錄之前的交易日提及次數皆為 0，回測只涵蓋收錄之後的期間
+        trading_dates = trading_dates[mention_matrix_store.first_covered_day(trading_dates):]
+        if len(trading_dates) < 2:
+            print(f"{self.name} not enough mention history, skipped")
+            return None
+
+        stock_codes = security_master.securities['股票代碼'].astype(str).tolist()
+        close = price_store.panel('收盤價', trading_dates[0].strftime('%Y-%m-%d'), stock_codes=stock_codes)
+        mention_counts = pd.DataFrame(mention_matrix_store.trading_day_counts(trading_dates),
+                                      index=close.index, columns=close.columns)
+
+        configs = [config for param_grid in self.param_grids for config in expand_grid(param_grid)]
+        start = time.perf_counter()
+        metrics, daily_returns = run_sweep(MentionBacktester(mention_counts, close), configs, workers=self.workers)
+        print(f"{self.name} {len(configs)} configs over {len(trading_dates)} days in "
+              f"{time.perf_counter() - start:.1f}s")
+
+        output_dir = os.path.join(path_setting.get_files_path("backtest_report_path"),
+                                  trading_dates[-1].strftime('%Y-%m-%d'))
+        os.makedirs(output_dir, exist_ok=True)
+        metrics.to_csv(os.path.join(output_dir, 'sweep_metrics.csv'), index=False, encoding='utf-8-sig')
+        folds = walk_forward(daily_returns, self.train_days, self.test_days)
+        folds.to_csv(os.path.join(output_dir, 'walk_forward.csv'), index=False, encoding='utf-8-sig')
+
+        return metrics
 
 if __name__ == '__main__':
     path_setting = PathSetting()
@@ -0,0 +1,139 @@
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from stock_prediction_system.controller.price_store import PriceStore
+
+# 年化波動度使用的年交易日數
+TRADING_DAYS_PER_YEAR = 252
+
+
+class PriceFeatureBuilder:
+
+    def __init__(self, return_windows: Sequence[int] = (1, 5, 20), ma_windows: Sequence[int] = (5, 20, 60),
+                 rsi_window: int = 14, volatility_window: int = 20, volume_window: int = 20) -> None:
+        """
+        由「日期 × 股票」的收盤價與成交量一次計算所有股票的技術指標。
+        所有運算都是整張表的 pandas rolling / ewm 或 NumPy 運算，沒有逐檔股票的迴圈。
+
+        :param return_windows: 報酬率的天數。
+        :param ma_windows: 移動平均天數，特徵為收盤價相對移動平均的乖離率。
+        :param rsi_window: RSI 天數（Wilder 平滑）。
+        :param volatility_window: 年化波動度的天數。
+        :param volume_window: 成交量 z-score 的天數。
+        """
+        self.return_windows = tuple(return_windows)
+        self.ma_windows = tuple(ma_windows)
+        self.rsi_window = rsi_window
+        self.volatility_window = volatility_window
+        self.volume_window = volume_window
+
+    @property
+    def lookback(self) -> int:
+        """計算最後一天的特徵所需的歷史交易日數"""
+        # RSI 為指數平滑，取 3 倍天數讓初始值的影響可忽略
+        return max(max(self.return_windows), max(self.ma_windows), 3 * self.rsi_window,
+                   self.volatility_window + 1, self.volume_window)
+
+    @property
+    def feature_names(self):
+        return ([f'ret_{window}d' for window in self.return_windows]
+                + [f'ma_gap_{window}d' for window in self.ma_windows]
+                + [f'rsi_{self.rsi_window}d', f'volatility_{self.volatility_window}d',
+                   f'volume_z_{self.volume_window}d'])
+
+    def build(self, close: pd.DataFrame, volume: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """
+        計算技術指標。
+
+        :param close: index 為日期、欄位為股票代碼的收盤價；停牌日為 NaN。
+        :param volume: 與 close 相同形狀的成交股數。
+        :return: 特徵名稱 -> 與 close 相同形狀的 DataFrame，歷史不足的位置為 NaN。
+        """
+        close = close.astype(np.float64)
+        volume = volume.reindex_like(close).astype(np.float64)
+        features: Dict[str, pd.DataFrame] = {}
+
+        for window in self.return_windows:
+            features[f'ret_{window}d'] = close.pct_change(window, fill_method=None)
+        for window in self.ma_windows:
+            features[f'ma_gap_{window}d'] = close / close.rolling(window, min_periods=window).mean() - 1
+
+        # Wilder RSI：漲跌幅分別以 alpha = 1 / n 的指數平均平滑
+        delta = close.diff()
+        alpha = 1 / self.rsi_window
+        average_gain = delta.clip(lower=0).ewm(alpha=alpha, adjust=False, min_periods=self.rsi_window).mean()
+        average_loss = (-delta).clip(lower=0).ewm(alpha=alpha, adjust=False, min_periods=self.rsi_window).mean()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 - 100 / (1 + average_gain / average_loss)
+        # 區間內完全沒有下跌時 RSI 為 100
+        features[f'rsi_{self.rsi_window}d'] = rsi.mask((average_loss == 0) & average_gain.notna(), 100.0)
+
+        daily_return = features['ret_1d'] if 1 in self.return_windows else close.pct_change(fill_method=None)
+        features[f'volatility_{self.volatility_window}d'] = (
+            daily_return.rolling(self.volatility_window, min_periods=self.volatility_window).std()
+            * np.sqrt(TRADING_DAYS_PER_YEAR)
+        )
+
+        volume_rolling = volume.rolling(self.volume_window, min_periods=self.volume_window)
+        volume_std = volume_rolling.std()
+        features[f'volume_z_{self.volume_window}d'] = (volume - volume_rolling.mean()) / volume_std.where(volume_std > 0)
+        return features
+
+    def build_from_store(self, price_store: PriceStore, start_date: Optional[str] = None,
+                         end_date: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+        """
+        由 PriceStore 讀取價格並計算特徵；會多讀 lookback 天的歷史，輸出只保留 start_date 之後的日期。
+        """
+        dates = price_store.dates
+        read_start = None
+        if start_date is not None and len(dates):
+            start_position = max(dates.searchsorted(pd.Timestamp(start_date)) - self.lookback, 0)
+            read_start = dates[min(start_position, len(dates) - 1)].strftime('%Y-%m-%d')
+        close = price_store.panel('收盤價', read_start, end_date)
+        volume = price_store.panel('成交股數', read_start, end_date)
+        features = self.build(close, volume)
+        if start_date is not None:
+            features = {name: frame.loc[pd.Timestamp(start_date):] for name, frame in features.items()}
+        return features
+
+    @staticmethod
+    def to_long(features: Dict[str, pd.DataFrame], dropna: bool = True) -> pd.DataFrame:
+        """
+        將特徵轉為 日期、股票代碼 與各特徵欄位的長表。
+
+        :param features: build 的輸出。
+        :param dropna: 是否移除所有特徵皆為 NaN 的列（例如停牌日）。
+        """
+        first = next(iter(features.values()))
+        stacked = np.stack([frame.to_numpy(dtype=np.float32) for frame in features.values()], axis=-1)
+        long_frame = pd.DataFrame(
+            stacked.reshape(-1, len(features)),
+            columns=list(features),
+            index=pd.MultiIndex.from_product([first.index, first.columns.astype(str)], names=['日期', '股票代碼']),
+        )
+        if dropna:
+            long_frame = long_frame[long_frame.notna().any(axis=1)]
+        return long_frame.reset_index()
+
+
+if __name__ == "__main__":
+    # 模擬約 1,800 檔股票、5 年交易日的資料，量測完整重算時間
+    rng = np.random.default_rng(0)
+    trade_dates = pd.DatetimeIndex(pd.bdate_range('2019-09-02', periods=1250), name='日期')
+    codes = pd.Index([str(code) for code in range(1101, 1101 + 1800)], name='股票代碼')
+    close_panel = pd.DataFrame(50 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(len(trade_dates), len(codes))), axis=0)),
+                               index=trade_dates, columns=codes)
+    volume_panel = pd.DataFrame(rng.integers(1_000, 5_000_000, size=close_panel.shape).astype(np.float64),
+                                index=trade_dates, columns=codes)
+
+    builder = PriceFeatureBuilder()
+    start = time.perf_counter()
+    feature_panels = builder.build(close_panel, volume_panel)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    feature_frame = builder.to_long(feature_panels)
+    print(f"features {builder.feature_names} for {close_panel.shape}: build {build_seconds:.2f}s, "
+          f"to_long {time.perf_counter() - start:.2f}s, {len(feature_frame)} rows")
@@ -0,0 +1,345 @@
+import glob
+import json
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import requests
+
+from stock_prediction_system.controller.security_master import SecurityMaster
+
+# 欄位名稱 -> 檔名；每個欄位一個「日期 × 股票」的 .npy 檔
+PRICE_FIELDS: Dict[str, str] = {
+    '開盤價': 'open', '最高價': 'high', '最低價': 'low', '收盤價': 'close', '成交股數': 'volume',
+}
+
+# 常見的來源欄位名稱 -> 內部欄位名稱
+_COLUMN_ALIASES: Dict[str, str] = {
+    'date': '日期', 'Date': '日期', '交易日期': '日期',
+    'stock_id': '股票代碼', 'code': '股票代碼', 'Code': '股票代碼', '證券代號': '股票代碼', '代號': '股票代碼',
+    'SecuritiesCompanyCode': '股票代碼',
+    'open': '開盤價', 'OpeningPrice': '開盤價', 'Open': '開盤價', '開盤': '開盤價',
+    'high': '最高價', 'HighestPrice': '最高價', 'High': '最高價', '最高': '最高價',
+    'low': '最低價', 'LowestPrice': '最低價', 'Low': '最低價', '最低': '最低價',
+    'close': '收盤價', 'ClosingPrice': '收盤價', 'Close': '收盤價', '收盤': '收盤價',
+    'volume': '成交股數', 'TradeVolume': '成交股數', 'TradingShares': '成交股數',
+}
+
+
+def _parse_roc_date(value: str) -> Optional[pd.Timestamp]:
+    """民國日期（1130906 或 113/09/06）轉為 Timestamp"""
+    digits = str(value).replace('/', '').strip()
+    if len(digits) < 7 or not digits.isdigit():
+        return None
+    return pd.Timestamp(year=int(digits[:-4]) + 1911, month=int(digits[-4:-2]), day=int(digits[-2:]))
+
+
+def normalize_price_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    將各來源的日成交資料整理為 日期、股票代碼、開盤價、最高價、最低價、收盤價、成交股數 欄位。
+    數值欄位去除千分位，無成交（例如 '--'）轉為 NaN。
+
+    :param frame: 日成交資料，欄位名稱可為中文、英文或 TWSE/TPEx OpenAPI 的欄位名稱。
+    :return: 整理後的資料，同一股票同一天重複時保留最後一筆。
+    """
+    frame = frame.rename(columns={column: _COLUMN_ALIASES.get(column, column) for column in frame.columns})
+    missing = {'日期', '股票代碼', '收盤價'} - set(frame.columns)
+    if missing:
+        raise ValueError(f"price data missing columns: {sorted(missing)}")
+
+    normalized = pd.DataFrame({'股票代碼': frame['股票代碼'].astype(str).str.strip()})
+    dates = frame['日期'].astype(str)
+    roc_mask = dates.str.fullmatch(r'\d{3}/?\d{2}/?\d{2}')
+    normalized['日期'] = pd.to_datetime(dates.where(~roc_mask), errors='coerce')
+    if roc_mask.any():
+        normalized.loc[roc_mask, '日期'] = dates[roc_mask].map(_parse_roc_date)
+    normalized['日期'] = normalized['日期'].dt.normalize()
+
+    for column in PRICE_FIELDS:
+        values = frame[column] if column in frame.columns else pd.Series(np.nan, index=frame.index)
+        if not pd.api.types.is_numeric_dtype(values):
+            values = values.astype(str).str.replace(',', '', regex=False)
+        normalized[column] = pd.to_numeric(values, errors='coerce')
+
+    normalized = normalized.dropna(subset=['日期'])
+    return normalized.drop_duplicates(['日期', '股票代碼'], keep='last').reset_index(drop=True)
+
+
+def read_price_file(file_path: str) -> pd.DataFrame:
+    """讀取 CSV 或 Parquet 格式的日成交資料並整理欄位"""
+    if file_path.endswith('.parquet'):
+        frame = pd.read_parquet(file_path)
+    else:
+        frame = pd.read_csv(file_path, dtype={'股票代碼': str, 'stock_id': str, 'code': str, '證券代號': str})
+    return normalize_price_frame(frame)
+
+
+class DailyPriceSpider:
+
+    twse_url: str = "https://openapi.twse.com.tw/v1/exchangeReport/STOCK_DAY_ALL"
+    tpex_url: str = "https://www.tpex.org.tw/openapi/v1/tpex_mainboard_daily_close_quotes"
+
+    def __init__(self, twse_url: Optional[str] = None, tpex_url: Optional[str] = None, timeout: float = 30) -> None:
+        """
+        由 TWSE 與 TPEx OpenAPI 抓取最近一個交易日的全市場日成交資料。
+        網址可替換為相容格式的內部或測試端點。
+
+        :param twse_url: 上市日成交資料網址。
+        :param tpex_url: 上櫃日成交資料網址。
+        :param timeout: 請求逾時秒數。
+        """
+        self.twse_url = twse_url or self.twse_url
+        self.tpex_url = tpex_url or self.tpex_url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _fetch(self, url: str) -> pd.DataFrame:
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return pd.DataFrame(response.json())
+
+    def fetch_latest(self, trade_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        同時抓取上市與上櫃資料。
+
+        :param trade_date: 資料未附日期欄位時使用的交易日（YYYY-MM-DD）；未指定時略過該市場的資料，
+                           避免假日或盤前執行時把前一個交易日的收盤資料記在今天。
+        :return: 整理後的日成交資料。
+        :raises requests.RequestException: 連線失敗或回應狀態碼錯誤。
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            frames = list(executor.map(self._fetch, [self.twse_url, self.tpex_url]))
+
+        normalized = []
+        for url, frame in zip([self.twse_url, self.tpex_url], frames):
+            if frame.empty:
+                continue
+            if not {'Date', '日期', 'date', '交易日期'} & set(frame.columns):
+                if not trade_date:
+                    print(f"日成交資料沒有日期欄位，未指定 trade_date，略過: {url}")
+                    continue
+                frame = frame.assign(Date=trade_date)
+            normalized.append(normalize_price_frame(frame))
+        if not normalized:
+            return normalize_price_frame(pd.DataFrame(columns=['日期', '股票代碼', '收盤價']))
+        return pd.concat(normalized, ignore_index=True)
+
+
+class PriceStore:
+
+    def __init__(self, root_path: str, security_master: Optional[SecurityMaster] = None) -> None:
+        """
+        以「日期 × 股票」的稠密陣列儲存日成交資料，每個欄位一個 .npy 檔，讀取時以記憶體映射開啟，
+        不需將整個歷史載入記憶體；缺值（停牌、尚未上市）為 NaN。
+        每次寫入產生新的版本資料夾，最後才切換 CURRENT 指標，讀取端不會看到寫到一半的資料。
+
+        :param root_path: 儲存資料夾。
+        :param security_master: 股票主檔，提供以 stock_id 對齊欄位的查詢。
+        """
+        self.root_path = root_path
+        self.security_master = security_master
+        self._loaded_version: Optional[str] = None
+        self._dates = np.array([], dtype='datetime64[D]')
+        self._stock_codes = np.array([], dtype=str)
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def _current_version(self) -> Optional[str]:
+        pointer_path = os.path.join(self.root_path, 'CURRENT')
+        if not os.path.exists(pointer_path):
+            return None
+        with open(pointer_path, 'r', encoding='utf-8') as pointer_file:
+            return pointer_file.read().strip() or None
+
+    def _load(self) -> None:
+        version = self._current_version()
+        if version == self._loaded_version:
+            return
+        if version is None:
+            self._dates = np.array([], dtype='datetime64[D]')
+            self._stock_codes = np.array([], dtype=str)
+            self._arrays = {}
+        else:
+            version_path = os.path.join(self.root_path, version)
+            self._dates = np.load(os.path.join(version_path, 'dates.npy'))
+            self._stock_codes = np.load(os.path.join(version_path, 'stock_codes.npy'))
+            self._arrays = {field: np.load(os.path.join(version_path, f'{file_name}.npy'), mmap_mode='r')
+                            for field, file_name in PRICE_FIELDS.items()}
+        self._loaded_version = version
+
+    def _imported_files_path(self) -> str:
+        return os.path.join(self.root_path, 'imported_files.json')
+
+    def _imported_files(self) -> Dict[str, dict]:
+        if not os.path.exists(self._imported_files_path()):
+            return {}
+        with open(self._imported_files_path(), 'r', encoding='utf-8') as imported_file:
+            return json.load(imported_file)
+
+    def import_file(self, file_path: str) -> Optional[int]:
+        """
+        匯入整理好的歷史日成交檔，同一個檔案（路徑、大小與修改時間相同）只匯入一次，檔案更新後才會重新匯入。
+
+        :param file_path: CSV 或 Parquet 檔路徑。
+        :return: 寫入的筆數；已匯入過時回傳 None。
+        """
+        stat = os.stat(file_path)
+        file_state = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        imported_files = self._imported_files()
+        file_key = os.path.abspath(file_path)
+        if imported_files.get(file_key) == file_state:
+            return None
+
+        row_count = self.ingest(read_price_file(file_path))
+        imported_files[file_key] = file_state
+        os.makedirs(self.root_path, exist_ok=True)
+        tmp_path = f'{self._imported_files_path()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as imported_file:
+            json.dump(imported_files, imported_file, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self._imported_files_path())
+        return row_count
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        self._load()
+        return pd.DatetimeIndex(self._dates, name='日期')
+
+    @property
+    def stock_codes(self) -> np.ndarray:
+        self._load()
+        return self._stock_codes
+
+    def ingest(self, prices: pd.DataFrame) -> int:
+        """
+        寫入日成交資料，與既有資料合併；同一股票同一天已有資料時以新資料覆蓋。
+
+        :param prices: normalize_price_frame 格式的資料。
+        :return: 寫入的筆數。
+        """
+        prices = prices.dropna(subset=['收盤價'])
+        if prices.empty:
+            return 0
+        self._load()
+
+        new_dates = prices['日期'].to_numpy().astype('datetime64[D]')
+        dates = np.union1d(self._dates, new_dates)
+        # 既有股票的欄位順序不變，新股票依代碼排序接在後面
+        incoming_codes = np.unique(prices['股票代碼'].to_numpy().astype(str))
+        added_codes = np.setdiff1d(incoming_codes, self._stock_codes)
+        stock_codes = np.concatenate([self._stock_codes, added_codes])
+
+        code_position = pd.Index(stock_codes)
+        old_rows = np.searchsorted(dates, self._dates)
+        new_rows = np.searchsorted(dates, new_dates)
+        new_columns = code_position.get_indexer(prices['股票代碼'].astype(str))
+
+        os.makedirs(self.root_path, exist_ok=True)
+        version = f'v-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}'
+        version_path = os.path.join(self.root_path, version)
+        os.makedirs(version_path)
+        np.save(os.path.join(version_path, 'dates.npy'), dates)
+        np.save(os.path.join(version_path, 'stock_codes.npy'), stock_codes)
+        for field, file_name in PRICE_FIELDS.items():
+            # 成交股數可達數億股，超過 float32 的精確整數範圍，改用 float64
+            dtype = np.float64 if field == '成交股數' else np.float32
+            array = np.lib.format.open_memmap(os.path.join(version_path, f'{file_name}.npy'), mode='w+',
+                                              dtype=dtype, shape=(len(dates), len(stock_codes)))
+            array[:] = np.nan
+            if field in self._arrays and len(self._dates):
+                array[old_rows, :self._arrays[field].shape[1]] = self._arrays[field]
+            if field in prices.columns:
+                array[new_rows, new_columns] = prices[field].to_numpy(dtype=dtype)
+            array.flush()
+            del array
+
+        self._switch_version(version)
+        return len(prices)
+
+    def _switch_version(self, version: str) -> None:
+        pointer_path = os.path.join(self.root_path, 'CURRENT')
+        tmp_path = f'{pointer_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as pointer_file:
+            pointer_file.write(version)
+        os.replace(tmp_path, pointer_path)
+        # 舊版本已由 CURRENT 切換掉；已開啟的記憶體映射在 POSIX 上刪檔後仍可讀
+        for old_path in glob.glob(os.path.join(self.root_path, 'v-*')):
+            if os.path.basename(old_path) != version:
+                shutil.rmtree(old_path, ignore_errors=True)
+        self._load()
+
+    def _date_slice(self, start_date: Optional[str], end_date: Optional[str]) -> slice:
+        start = np.searchsorted(self._dates, np.datetime64(start_date, 'D')) if start_date else 0
+        end = np.searchsorted(self._dates, np.datetime64(end_date, 'D'), side='right') if end_date else len(self._dates)
+        return slice(start, end)
+
+    def panel(self, field: str = '收盤價', start_date: Optional[str] = None, end_date: Optional[str] = None,
+              stock_codes: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        取得單一欄位的「日期 × 股票代碼」資料表。
+
+        :param field: PRICE_FIELDS 中的欄位名稱。
+        :param start_date: 起始日期（含），格式 YYYY-MM-DD。
+        :param end_date: 結束日期（含）。
+        :param stock_codes: 只取這些股票，不在資料中的代碼為 NaN 欄位。
+        :return: index 為日期、欄位為股票代碼的 DataFrame。
+        """
+        self._load()
+        date_slice = self._date_slice(start_date, end_date)
+        index = pd.DatetimeIndex(self._dates[date_slice], name='日期')
+        if field not in self._arrays:
+            return pd.DataFrame(index=index, columns=pd.Index(stock_codes or [], name='股票代碼'), dtype=np.float32)
+
+        values = np.asarray(self._arrays[field][date_slice])
+        columns = pd.Index(self._stock_codes, name='股票代碼')
+        frame = pd.DataFrame(values, index=index, columns=columns)
+        return frame if stock_codes is None else frame.reindex(columns=pd.Index(stock_codes, name='股票代碼'))
+
+    def aligned(self, field: str = '收盤價', start_date: Optional[str] = None,
+                end_date: Optional[str] = None) -> np.ndarray:
+        """
+        取得以股票主檔 stock_id 為欄位索引的陣列，形狀為 (日期數, 主檔股票數)，主檔有但價格資料沒有的股票為 NaN。
+        與 MentionMatrixStore.mention_tensor 的欄位順序相同，可直接相互運算。
+        """
+        if self.security_master is None:
+            raise ValueError("aligned() requires a security_master")
+        codes = self.security_master.securities['股票代碼'].astype(str).tolist()
+        return self.panel(field, start_date, end_date, stock_codes=codes).to_numpy(dtype=np.float32)
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self._dates)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    # 模擬約 1,800 檔股票、5 年交易日的資料，量測寫入與讀取時間
+    rng = np.random.default_rng(0)
+    trade_dates = pd.bdate_range('2019-09-02', periods=1250)
+    codes = [str(code) for code in range(1101, 1101 + 1800)]
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(len(trade_dates), len(codes))), axis=0))
+    simulated = pd.DataFrame({
+        '日期': np.repeat(trade_dates, len(codes)),
+        '股票代碼': np.tile(codes, len(trade_dates)),
+        '收盤價': close.ravel(),
+    })
+    simulated['開盤價'] = simulated['收盤價'] * 0.995
+    simulated['最高價'] = simulated['收盤價'] * 1.01
+    simulated['最低價'] = simulated['收盤價'] * 0.99
+    simulated['成交股數'] = rng.integers(1_000, 5_000_000, size=len(simulated))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        price_store = PriceStore(tmp_dir)
+        start = time.perf_counter()
+        price_store.ingest(simulated)
+        ingest_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        close_panel = price_store.panel('收盤價', start_date='2023-01-01')
+        print(f"ingest {len(simulated)} rows: {ingest_seconds:.2f}s, "
+              f"read {close_panel.shape}: {time.perf_counter() - start:.3f}s")
+        print(json.dumps({'dates': len(price_store), 'stocks': len(price_store.stock_codes)}))
@@ -0,0 +1,211 @@
+import base64
+import html
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import matplotlib
+
+# 排程環境沒有顯示器，固定使用 Agg 後端；需在任何 pyplot 匯入之前設定
+matplotlib.use("Agg")
+from matplotlib import font_manager, rcParams
+from matplotlib.figure import Figure
+import pandas as pd
+
+# 依序嘗試的中文字體，找不到時退回預設字體
+CJK_FONTS = ['SimHei', 'Microsoft JhengHei', 'Noto Sans CJK TC', 'PingFang TC', 'DejaVu Sans']
+
+
+def _set_fonts() -> None:
+    rcParams['font.sans-serif'] = CJK_FONTS
+    rcParams['axes.unicode_minus'] = False
+
+
+def has_cjk_font() -> bool:
+    """系統是否安裝了 CJK_FONTS 中任一個中文字體"""
+    installed = {font.name for font in font_manager.fontManager.ttflist}
+    return any(font_name in installed for font_name in CJK_FONTS[:-1])
+
+
+def render_chart(spec: dict, output_dir: str) -> str:
+    """
+    依圖表設定輸出 PNG。直接建立 Figure 而不經過 pyplot，圖表不會留在全域狀態中，函式結束即可回收。
+    為模組層級函式，可在子程序中執行。
+
+    :param spec: 圖表設定，kind 為 bar 或 line；bar 使用 x、y，line 使用 x 與 series（名稱 -> 數值列表）。
+    :param output_dir: 輸出資料夾。
+    :return: PNG 路徑。
+    """
+    _set_fonts()
+    fig = Figure(figsize=spec.get('figsize', (10, 6)))
+    ax = fig.subplots()
+    if spec['kind'] == 'bar':
+        ax.bar(spec['x'], spec['y'], color=spec.get('color', 'skyblue'))
+    else:
+        for label, values in spec['series'].items():
+            ax.plot(spec['x'], values, marker='o', label=label)
+        ax.legend()
+    ax.set_title(spec['title'], fontsize=14)
+    ax.set_xlabel(spec.get('xlabel', ''), fontsize=12)
+    ax.set_ylabel(spec.get('ylabel', ''), fontsize=12)
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+
+    png_path = os.path.join(output_dir, f"{spec['file_name']}.png")
+    fig.savefig(png_path, dpi=spec.get('dpi', 100))
+    return png_path
+
+
+def _render_chart_quietly(spec: dict, output_dir: str) -> str:
+    # 缺字警告每個字元各一則，會淹沒排程紀錄；是否缺字體改由 ReportBuilder.build 統一提示一次
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', message='Glyph .* missing from font')
+        return render_chart(spec, output_dir)
+
+
+class ReportBuilder:
+
+    def __init__(self, output_root: str, workers: int = 4, top_n: int = 10, top_industries: int = 3,
+                 trend_stocks: int = 5) -> None:
+        """
+        產生新聞提及統計報表：以子程序平行繪製圖表，輸出到以日期命名的資料夾，
+        並產生將 PNG 內嵌為 base64 的單一 HTML 檔。
+
+        :param output_root: 報表根目錄，每次輸出到 output_root/YYYY-MM-DD。
+        :param workers: 繪圖子程序數，1 表示在目前程序中依序繪製。
+        :param top_n: 個股長條圖與細產業長條圖的數量。
+        :param top_industries: 產業長條圖的數量。
+        :param trend_stocks: 每日趨勢圖包含的個股數。
+        """
+        self.output_root = output_root
+        self.workers = workers
+        self.top_n = top_n
+        self.top_industries = top_industries
+        self.trend_stocks = trend_stocks
+
+    def chart_specs(self, stock_counts: pd.DataFrame, daily_counts: Optional[pd.DataFrame] = None,
+                    sub_industry_counts: Optional[pd.DataFrame] = None) -> List[dict]:
+        """
+        由統計結果產生圖表設定與對應的資料表，只包含可序列化的資料，方便傳給子程序。
+
+        :param stock_counts: 含 股票名稱、股票代碼、產業別、出現次數 的個股統計。
+        :param daily_counts: index 為日期、欄位為股票代碼的每日提及次數。
+        :param sub_industry_counts: 含 細產業、出現次數 的細產業統計。
+        :return: 圖表設定列表，table 欄位為報表中顯示的資料表。
+        """
+        df_stock_count = stock_counts.groupby(['股票名稱', '股票代碼', '產業別'])['出現次數'].sum().reset_index()
+        top_stocks = df_stock_count.nlargest(self.top_n, '出現次數')
+        df_industry_count = df_stock_count.groupby('產業別')['出現次數'].sum().reset_index()
+        top_industries = df_industry_count.nlargest(self.top_industries, '出現次數')
+
+        specs = [
+            {
+                'file_name': f'新聞出現最多次的前{self.top_n}大股票', 'kind': 'bar',
+                'title': f'新聞出現最多次的前{self.top_n}大股票名稱', 'xlabel': '股票名稱', 'ylabel': '出現次數',
+                'x': top_stocks['股票名稱'].tolist(), 'y': top_stocks['出現次數'].tolist(), 'color': 'skyblue',
+                'table': top_stocks,
+            },
+            {
+                'file_name': f'新聞出現最多次的前{self.top_industries}大產業', 'kind': 'bar', 'figsize': (8, 5),
+                'title': f'新聞出現最多次的前{self.top_industries}大產業名稱', 'xlabel': '產業別', 'ylabel': '出現次數',
+                'x': top_industries['產業別'].tolist(), 'y': top_industries['出現次數'].tolist(),
+                'color': 'lightcoral', 'table': top_industries,
+            },
+        ]
+
+        if daily_counts is not None and len(daily_counts):
+            trend_codes = [code for code in top_stocks['股票代碼'].head(self.trend_stocks)
+                           if code in daily_counts.columns]
+            code_to_name = dict(zip(top_stocks['股票代碼'], top_stocks['股票名稱']))
+            trend = daily_counts[trend_codes].sort_index()
+            trend_table = trend.rename(columns=code_to_name)
+            trend_table.index = trend_table.index.strftime('%Y-%m-%d')
+            specs.append({
+                'file_name': '前幾大股票每日提及趨勢', 'kind': 'line',
+                'title': f'前{len(trend_codes)}大股票每日提及次數', 'xlabel': '日期', 'ylabel': '出現次數',
+                'x': trend_table.index.tolist(),
+                'series': {name: trend_table[name].tolist() for name in trend_table.columns},
+                'table': trend_table.reset_index(names='日期'),
+            })
+
+        if sub_industry_counts is not None and len(sub_industry_counts):
+            top_sub_industries = sub_industry_counts.nlargest(self.top_n, '出現次數')
+            specs.append({
+                'file_name': f'新聞出現最多次的前{self.top_n}大細產業', 'kind': 'bar',
+                'title': f'新聞出現最多次的前{self.top_n}大細產業', 'xlabel': '細產業', 'ylabel': '出現次數',
+                'x': top_sub_industries['細產業'].tolist(), 'y': top_sub_industries['出現次數'].tolist(),
+                'color': 'mediumseagreen', 'table': top_sub_industries,
+            })
+        return specs
+
+    def render(self, specs: List[dict], output_dir: str) -> List[str]:
+        """平行繪製所有圖表，回傳順序與 specs 相同的 PNG 路徑"""
+        chart_specs = [{key: value for key, value in spec.items() if key != 'table'} for spec in specs]
+        if self.workers <= 1 or len(chart_specs) <= 1:
+            return [_render_chart_quietly(spec, output_dir) for spec in chart_specs]
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(chart_specs))) as executor:
+            return list(executor.map(_render_chart_quietly, chart_specs, [output_dir] * len(chart_specs)))
+
+    @staticmethod
+    def write_html(specs: List[dict], png_paths: List[str], html_path: str, title: str) -> None:
+        """將 PNG 以 base64 內嵌，產生不依賴其他檔案的 HTML 報表"""
+        sections = []
+        for spec, png_path in zip(specs, png_paths):
+            with open(png_path, 'rb') as png_file:
+                encoded = base64.b64encode(png_file.read()).decode('ascii')
+            sections.append(
+                f"<section><h2>{html.escape(spec['title'])}</h2>"
+                f"<img src=\"data:image/png;base64,{encoded}\" alt=\"{html.escape(spec['title'])}\">"
+                f"{spec['table'].to_html(index=False, border=0, classes='counts')}</section>"
+            )
+        with open(html_path, 'w', encoding='utf-8') as html_file:
+            html_file.write(
+                "<!DOCTYPE html><html lang=\"zh-Hant\"><head><meta charset=\"utf-8\">"
+                f"<title>{html.escape(title)}</title><style>"
+                "body{font-family:sans-serif;margin:2em;}img{max-width:100%;}"
+                "table.counts{border-collapse:collapse;margin:1em 0;}"
+                "table.counts td,table.counts th{border:1px solid #ccc;padding:4px 8px;text-align:right;}"
+                "</style></head><body>"
+                f"<h1>{html.escape(title)}</h1><p>產生時間：{datetime.now():%Y-%m-%d %H:%M:%S}</p>"
+                f"{''.join(sections)}</body></html>"
+            )
+
+    def build(self, stock_counts: pd.DataFrame, daily_counts: Optional[pd.DataFrame] = None,
+              sub_industry_counts: Optional[pd.DataFrame] = None, report_date: Optional[str] = None) -> Dict[str, str]:
+        """
+        產生完整報表。
+
+        :param report_date: 報表日期（YYYY-MM-DD），決定輸出資料夾，預設為今天。
+        :return: {'output_dir': 資料夾, 'html': HTML 路徑}。
+        """
+        report_date = report_date or datetime.now().strftime('%Y-%m-%d')
+        if not has_cjk_font():
+            print(f"找不到中文字體（{', '.join(CJK_FONTS[:-1])}），圖表中的中文會顯示為方框")
+        output_dir = os.path.join(self.output_root, report_date)
+        os.makedirs(output_dir, exist_ok=True)
+
+        specs = self.chart_specs(stock_counts, daily_counts, sub_industry_counts)
+        png_paths = self.render(specs, output_dir)
+        html_path = os.path.join(output_dir, 'report.html')
+        self.write_html(specs, png_paths, html_path, title=f'財經新聞股票提及統計 {report_date}')
+        return {'output_dir': output_dir, 'html': html_path}
+
+
+if __name__ == "__main__":
+    from stock_prediction_system.utils.extract_path import PathSetting
+
+    stock_counts = pd.DataFrame({
+        '股票名稱': ['台積電', '鴻海', '聯電', '聯發科', '台泥'],
+        '股票代碼': ['2330', '2317', '2303', '2454', '1101'],
+        '產業別': ['半導體業', '其他電子業', '半導體業', '半導體業', '水泥工業'],
+        '出現次數': [27, 12, 8, 6, 2],
+    })
+    daily_counts = pd.DataFrame({'2330': [10, 17], '2317': [5, 7], '2303': [3, 5]},
+                                index=pd.to_datetime(['2024-09-07', '2024-09-08']))
+
+    start = time.perf_counter()
+    report = ReportBuilder(PathSetting().get_files_path('report_path')).build(stock_counts, daily_counts)
+    print(f"report: {report['html']} ({time.perf_counter() - start:.2f}s)")
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from stock_prediction_system.controller.stock_list import GetStockList
+from stock_prediction_system.utils.extract_path import PathSetting
+
+
+class SecurityMaster:
+
+    columns = ['stock_id', 'ticker', '股票代碼', '股票名稱', '產業別', '市場別']
+
+    def __init__(self, securities: pd.DataFrame) -> None:
+        """
+        精簡、具型別的股票主檔，並預先建立常用索引。
+
+        :param securities: 已篩選的股票主檔，欄位同 SecurityMaster.columns，index 需等於 stock_id。
+        """
+        self.securities: pd.DataFrame = securities
+
+        stock_ids = securities['stock_id'].to_numpy()
+        self.code_to_id: Dict[str, int] = dict(zip(securities['股票代碼'].tolist(), stock_ids.tolist()))
+        self.name_to_id: Dict[str, int] = dict(zip(securities['股票名稱'].tolist(), stock_ids.tolist()))
+        self.industry_to_ids: Dict[str, np.ndarray] = self._group_stock_ids(securities['產業別'], stock_ids)
+        self.market_to_ids: Dict[str, np.ndarray] = self._group_stock_ids(securities['市場別'], stock_ids)
+        self.version: str = self._compute_version(securities)
+
+    @staticmethod
+    def _group_stock_ids(column: pd.Series, stock_ids: np.ndarray) -> Dict[str, np.ndarray]:
+        """以 categorical 的整數編碼排序後切段，建立 類別 -> stock_id 陣列 的索引"""
+        codes = column.cat.codes.to_numpy()
+        order = np.argsort(codes, kind='stable')
+        boundaries = np.searchsorted(codes[order], np.arange(len(column.cat.categories) + 1))
+        return {
+            category: stock_ids[order[boundaries[code]:boundaries[code + 1]]]
+            for code, category in enumerate(column.cat.categories)
+            if boundaries[code] < boundaries[code + 1]
+        }
+
+    @staticmethod
+    def _compute_version(securities: pd.DataFrame) -> str:
+        """以代碼、名稱、產業別、市場別計算主檔版本，主檔內容變動時版本即改變"""
+        row_hashes = pd.util.hash_pandas_object(
+            securities[['股票代碼', '股票名稱', '產業別', '市場別']].astype(str), index=False
+        )
+        return hashlib.sha1(row_hashes.to_numpy().tobytes()).hexdigest()
+
+    @classmethod
+    def from_stock_list_frame(cls, stock_list_all: pd.DataFrame) -> 'SecurityMaster':
+        """
+        由完整股票列表建立主檔，只保留有產業別的股票（排除權證等非股票商品）。
+
+        :param stock_list_all: 含 股票代碼、股票名稱、產業別、市場別 的完整列表。
+        :return: SecurityMaster。
+        """
+        industry = stock_list_all['產業別']
+        equities = stock_list_all[industry.notna() & (industry.astype(str).str.len() > 0)]
+
+        securities = pd.DataFrame({
+            'stock_id': np.arange(len(equities), dtype=np.int32),
+            # 純數字代碼直接轉為整數，特別股等含英文字母的代碼記為 -1
+            'ticker': pd.to_numeric(equities['股票代碼'], errors='coerce').fillna(-1).astype(np.int32).to_numpy(),
+            '股票代碼': equities['股票代碼'].astype(str).to_numpy(),
+            '股票名稱': equities['股票名稱'].astype(str).to_numpy(),
+            '產業別': pd.Categorical(equities['產業別'].astype(str)),
+            '市場別': pd.Categorical(equities['市場別'].astype(str)),
+        })
+        return cls(securities)
+
+    @classmethod
+    def refresh(cls, cache_path: str, stock_list: Optional[GetStockList] = None) -> 'SecurityMaster':
+        """
+        重新爬取股票列表並更新主檔快取。
+
+        :param cache_path: 主檔快取檔路徑（feather）。
+        :param stock_list: 已爬取的 GetStockList，未提供時重新爬取。
+        :return: SecurityMaster。
+        """
+        stock_list = stock_list or GetStockList()
+        security_master = cls.from_stock_list_frame(stock_list.get_all_stock_frame())
+        security_master.save(cache_path)
+        return security_master
+
+    @classmethod
+    def load(cls, cache_path: str, stocks_list_path: Optional[str] = None) -> 'SecurityMaster':
+        """
+        讀取主檔快取；快取不存在或比股票列表 CSV 舊時，由 CSV 重建並寫回快取。
+
+        :param cache_path: 主檔快取檔路徑（feather）。
+        :param stocks_list_path: 股票列表 CSV 路徑。
+        :return: SecurityMaster。
+        """
+        cache_is_fresh = os.path.exists(cache_path) and (
+            not stocks_list_path or not os.path.exists(stocks_list_path)
+            or os.path.getmtime(cache_path) >= os.path.getmtime(stocks_list_path)
+        )
+        if cache_is_fresh:
+            securities = pd.read_feather(cache_path)
+            securities.index = securities['stock_id'].to_numpy()
+            return cls(securities)
+
+        stock_list_all = pd.read_csv(stocks_list_path, encoding='utf-8-sig', dtype=str)
+        security_master = cls.from_stock_list_frame(stock_list_all)
+        security_master.save(cache_path)
+        return security_master
+
+    def save(self, cache_path: str) -> None:
+        """將主檔寫入 feather 快取檔，保留 categorical 型別"""
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        tmp_path = f'{cache_path}.tmp'
+        self.securities.reset_index(drop=True).to_feather(tmp_path)
+        os.replace(tmp_path, cache_path)
+
+    def universe(self, markets: Iterable[str] = ('上市',)) -> pd.DataFrame:
+        """
+        取得指定市場的股票，直接使用預先建立的市場索引，不需重新篩選。
+
+        :param markets: 市場別，例如 上市、上櫃。
+        :return: 股票主檔子集，index 為 stock_id。
+        """
+        stock_ids = [self.market_to_ids[market] for market in markets if market in self.market_to_ids]
+        if not stock_ids:
+            return self.securities.iloc[0:0]
+        return self.securities.loc[np.sort(np.concatenate(stock_ids))]
+
+    def industry_codes(self, industry: str) -> pd.Series:
+        """取得產業的所有股票代碼"""
+        return self.securities.loc[self.industry_to_ids.get(industry, np.array([], dtype=np.int32)), '股票代碼']
+
+    def __len__(self) -> int:
+        return len(self.securities)
+
+
+if __name__ == "__main__":
+    path_setting = PathSetting()
+    security_master_path = path_setting.get_files_path('security_master_path')
+    stocks_list_path = path_setting.get_files_path('stocks_list_path')
+
+    start = time.perf_counter()
+    stock_list_all = pd.read_csv(stocks_list_path, encoding='utf-8-sig')
+    stock_lists = stock_list_all[(stock_list_all["市場別"] == "上市") & (pd.notna(stock_list_all["產業別"]))]
+    print(f"read_csv + filter: {time.perf_counter() - start:.4f}s, {len(stock_lists)} stocks")
+
+    SecurityMaster.load(security_master_path, stocks_list_path)
+    start = time.perf_counter()
+    security_master = SecurityMaster.load(security_master_path, stocks_list_path)
+    listed_stocks = security_master.universe(['上市'])
+    print(f"security master: {time.perf_counter() - start:.4f}s, {len(listed_stocks)} stocks")
@@ -0,0 +1,223 @@
+import json
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import yaml
+
+from stock_prediction_system.controller.security_master import SecurityMaster
+from stock_prediction_system.controller.stock_matcher import AhoCorasickAutomaton
+from stock_prediction_system.controller.text_normalizer import TextNormalizer
+
+
+class SentimentScorer:
+
+    def __init__(self, positive: Dict[str, float], negative: Dict[str, float], negators: Iterable[str] = (),
+                 neutral_terms: Iterable[str] = (), negation_window: int = 4, mention_window: int = 40,
+                 clause_breaks: str = "。!?;,\n", security_master: Optional[SecurityMaster] = None,
+                 text_normalizer: Optional[TextNormalizer] = None) -> None:
+        """
+        以情緒詞典為新聞與個股提及評分。情緒詞、否定詞與中性詞編譯成一個 Aho-Corasick 比對器，
+        每批文章串接後只掃描一次；否定判斷、文章分數與提及窗口加總都以 NumPy 陣列一次計算。
+
+        :param positive: 正面詞 -> 權重。
+        :param negative: 負面詞 -> 權重。
+        :param negators: 否定詞，後方 negation_window 個字內的情緒詞極性反轉。
+        :param neutral_terms: 不帶情緒的一般詞（例如 非常、買賣超），以最長詞優先排除誤判的否定與情緒詞。
+        :param negation_window: 否定詞結束到情緒詞開始之間最多相隔幾個字。
+        :param mention_window: 個股情緒只計算股票名稱或代碼前後各幾個字內的情緒詞。
+        :param clause_breaks: 斷句符號，否定不跨越斷句；換行一律視為斷句。
+        :param security_master: 股票主檔，計算個股提及情緒時用來取得 stock_id 對應的名稱與代碼。
+        :param text_normalizer: 提供時詞典與股票名稱先正規化，與 clean_text 使用相同規則。
+        """
+        self.negation_window = negation_window
+        self.mention_window = mention_window
+        self.text_normalizer = text_normalizer
+        normalize = text_normalizer.normalize if text_normalizer is not None else str
+
+        # 同一個詞出現在多個清單時，情緒詞優先於否定詞，否定詞優先於中性詞
+        term_kinds: Dict[str, Tuple[float, bool]] = {}
+        term_kinds.update((normalize(term), (0.0, False)) for term in neutral_terms)
+        term_kinds.update((normalize(term), (0.0, True)) for term in negators)
+        term_kinds.update((normalize(term), (-float(weight), False)) for term, weight in negative.items())
+        term_kinds.update((normalize(term), (float(weight), False)) for term, weight in positive.items())
+        term_kinds.pop("", None)
+
+        self._automaton = AhoCorasickAutomaton(term_kinds)
+        terms = self._automaton.terms
+        self._term_length = np.array([len(term) for term in terms], dtype=np.int64)
+        self._term_polarity = np.array([term_kinds[term][0] for term in terms], dtype=np.float64)
+        self._term_negator = np.array([term_kinds[term][1] for term in terms], dtype=bool)
+        self._break_codes = np.array(sorted({ord(ch) for ch in clause_breaks + "\n"}), dtype=np.uint32)
+
+        # stock_id -> 正規化後的股票名稱與代碼，用於找出提及位置
+        self._stock_terms: List[Tuple[str, ...]] = []
+        if security_master is not None:
+            securities = security_master.securities
+            self._stock_terms = [
+                tuple(dict.fromkeys(term for term in (normalize(stock_name), normalize(stock_code)) if term))
+                for stock_name, stock_code in zip(securities['股票名稱'], securities['股票代碼'])
+            ]
+
+    @classmethod
+    def from_yaml(cls, config_path: str, security_master: Optional[SecurityMaster] = None,
+                  text_normalizer: Optional[TextNormalizer] = None) -> 'SentimentScorer':
+        """由 YAML 詞典建立評分器，欄位同 __init__ 參數"""
+        with open(config_path, 'r', encoding='utf-8') as file:
+            return cls(**(yaml.safe_load(file) or {}), security_master=security_master,
+                       text_normalizer=text_normalizer)
+
+    def _scan(self, text: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        掃描文字，保留最長且不被其他命中包含的詞，並套用否定。
+
+        :return: (開始位置, 結束位置, 帶正負號的權重)，依開始位置排序，只包含情緒詞。
+        """
+        ends, term_ids = [], []
+        for end, term_id in self._automaton.iter_matches(text):
+            ends.append(end)
+            term_ids.append(term_id)
+        ends = np.asarray(ends, dtype=np.int64)
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        lengths = self._term_length[term_ids]
+        starts = ends - lengths + 1
+
+        # 依開始位置排序、同位置長詞優先；結束位置不超過前面命中的最大結束位置者為被包含的短詞，
+        # 例如 不佳 裡的 不、非常看好 裡的 非
+        order = np.lexsort((-lengths, starts))
+        starts, ends, term_ids = starts[order], ends[order], term_ids[order]
+        keep = np.ones(len(ends), dtype=bool)
+        keep[1:] = ends[1:] > np.maximum.accumulate(ends)[:-1]
+        starts, ends, term_ids = starts[keep], ends[keep], term_ids[keep]
+
+        polarity = self._term_polarity[term_ids]
+        negator_ends = ends[self._term_negator[term_ids]]
+        scored = polarity != 0
+        starts, ends, polarity = starts[scored], ends[scored], polarity[scored]
+        if not len(negator_ends) or not len(starts):
+            return starts, ends, polarity
+
+        # 每個情緒詞找前方最近的否定詞；距離在窗口內且中間沒有斷句時反轉極性
+        nearest = np.searchsorted(negator_ends, starts) - 1
+        has_negator = nearest >= 0
+        negator_end = negator_ends[np.maximum(nearest, 0)]
+        has_negator &= starts - negator_end - 1 <= self.negation_window
+        code_points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        breaks = np.flatnonzero(np.isin(code_points, self._break_codes))
+        has_negator &= np.searchsorted(breaks, starts) == np.searchsorted(breaks, negator_end)
+        polarity = np.where(has_negator, -polarity, polarity)
+        return starts, ends, polarity
+
+    def _mention_spans(self, texts: Sequence[str], offsets: np.ndarray,
+                       stock_ids_list: Sequence[Iterable[int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[int]]:
+        """
+        找出每篇文章中已比對到的股票名稱與代碼的所有位置。
+
+        :return: (提及序號, 提及開始位置, 提及結束位置, 每篇文章的提及數)，位置為串接後文字的位置。
+        """
+        pair_index, span_starts, span_ends, pair_counts = [], [], [], []
+        pair = 0
+        for text, offset, stock_ids in zip(texts, offsets, stock_ids_list):
+            stock_ids = list(stock_ids)
+            for stock_id in stock_ids:
+                for term in self._stock_terms[stock_id]:
+                    position = text.find(term)
+                    while position >= 0:
+                        pair_index.append(pair)
+                        span_starts.append(offset + position)
+                        span_ends.append(offset + position + len(term))
+                        position = text.find(term, position + len(term))
+                pair += 1
+            pair_counts.append(len(stock_ids))
+        return (np.asarray(pair_index, dtype=np.int64), np.asarray(span_starts, dtype=np.int64),
+                np.asarray(span_ends, dtype=np.int64), pair_counts)
+
+    @staticmethod
+    def _polarity_score(positive: np.ndarray, negative: np.ndarray) -> np.ndarray:
+        """(正面 - 負面) / (正面 + 負面)，介於 -1 到 1，沒有情緒詞時為 0"""
+        # 沒有任何命中時 np.bincount 回傳整數陣列，轉為浮點數才能寫入除法結果
+        positive, negative = positive.astype(np.float64, copy=False), negative.astype(np.float64, copy=False)
+        total = positive + negative
+        return np.divide(positive - negative, total, out=np.zeros_like(total), where=total > 0)
+
+    def score_texts(self, texts: Sequence[str],
+                    stock_ids_list: Optional[Sequence[Iterable[int]]] = None) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """
+        一次評分一批文字。
+
+        :param texts: 已正規化的文字（clean_text）。
+        :param stock_ids_list: 每篇文章比對到的 stock_id，提供時一併計算個股提及情緒。
+        :return: (每篇文章的情緒分數, 每篇文章與 stock_ids 對應的個股情緒分數)，分數介於 -1 到 1。
+        """
+        if not len(texts):
+            return np.zeros(0), []
+        # 以換行串接，換行是斷句符號，否定不會跨文章；情緒詞不含換行，也不會跨文章命中
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+        offsets = np.zeros(len(texts), dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths + 1)[:-1]
+        starts, ends, polarity = self._scan("\n".join(texts))
+
+        article = np.searchsorted(offsets, starts, side='right') - 1
+        positive = np.where(polarity > 0, polarity, 0.0)
+        negative = np.where(polarity < 0, -polarity, 0.0)
+        article_scores = self._polarity_score(np.bincount(article, weights=positive, minlength=len(texts)),
+                                              np.bincount(article, weights=negative, minlength=len(texts)))
+        if stock_ids_list is None:
+            return article_scores, []
+        if not self._stock_terms:
+            raise ValueError("mention sentiment requires security_master")
+
+        # 提及窗口為名稱前後 mention_window 個字、限制在同一篇文章內，以前綴和加總窗口內開始的情緒詞
+        pair_index, span_starts, span_ends, pair_counts = self._mention_spans(texts, offsets, stock_ids_list)
+        span_article = np.searchsorted(offsets, span_starts, side='right') - 1
+        window_low = np.maximum(span_starts - self.mention_window, offsets[span_article])
+        window_high = np.minimum(span_ends + self.mention_window, offsets[span_article] + lengths[span_article])
+        low, high = np.searchsorted(starts, window_low), np.searchsorted(starts, window_high)
+        positive_prefix = np.concatenate([[0.0], np.cumsum(positive)])
+        negative_prefix = np.concatenate([[0.0], np.cumsum(negative)])
+        pair_total = sum(pair_counts)
+        mention_scores = self._polarity_score(
+            np.bincount(pair_index, weights=positive_prefix[high] - positive_prefix[low], minlength=pair_total),
+            np.bincount(pair_index, weights=negative_prefix[high] - negative_prefix[low], minlength=pair_total),
+        )
+        return article_scores, np.split(mention_scores, np.cumsum(pair_counts)[:-1])
+
+    def score_articles(self, articles: List[dict], stock_ids_list: Optional[Sequence[Iterable[int]]] = None,
+                       batch_size: int = 512) -> List[np.ndarray]:
+        """
+        批次評分新聞，文章分數寫入 sentiment 欄位。
+
+        :param articles: 已正規化的新聞（需有 clean_text）。
+        :param stock_ids_list: 每篇文章比對到的 stock_id。
+        :param batch_size: 每批串接的文章數。
+        :return: 每篇文章與 stock_ids 對應的個股情緒分數；未提供 stock_ids_list 時為空列表。
+        """
+        mention_scores: List[np.ndarray] = []
+        for batch_start in range(0, len(articles), batch_size):
+            batch = articles[batch_start:batch_start + batch_size]
+            batch_stock_ids = None if stock_ids_list is None else stock_ids_list[batch_start:batch_start + batch_size]
+            article_scores, batch_mention_scores = self.score_texts(
+                [article.get("clean_text") or "" for article in batch], batch_stock_ids)
+            for article, article_score in zip(batch, article_scores):
+                article["sentiment"] = float(article_score)
+            mention_scores.extend(batch_mention_scores)
+        return mention_scores
+
+
+if __name__ == "__main__":
+    from stock_prediction_system.utils.extract_path import PathSetting
+
+    path_setting = PathSetting()
+    text_normalizer = TextNormalizer()
+    scorer = SentimentScorer.from_yaml(path_setting.get_files_path("sentiment_lexicon_path"),
+                                       text_normalizer=text_normalizer)
+    print(scorer.score_texts(["台積電今年營收大漲,法人看好", "市場不看好,營收未見衰退", "需求疲弱,獲利不佳"])[0])
+
+    with open("../data/processed/stock_news_extraction.json", "r", encoding="utf-8") as json_file:
+        all_news_data_json = json.load(json_file)
+    text_normalizer.normalize_articles(all_news_data_json)
+    start = time.perf_counter()
+    scorer.score_articles(all_news_data_json)
+    seconds = time.perf_counter() - start
+    print(f"scored {len(all_news_data_json)} news in {seconds:.3f}s "
+          f"({len(all_news_data_json) / seconds:.0f} news/s)")
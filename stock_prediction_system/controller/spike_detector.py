@@ -0,0 +1,289 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from stock_prediction_system.controller.security_master import SecurityMaster
+
+# 時間區塊編號的起點；發佈時間為不含時區的當地時間，直接以差值計算
+_EPOCH = datetime(1970, 1, 1)
+
+
+class _EntityState:
+
+    def __init__(self, size: int, window_buckets: int) -> None:
+        """一組實體（個股或產業）的偵測狀態，每個實體一列"""
+        self.count = np.zeros(size, dtype=np.float64)  # 目前時間區塊的提及次數
+        self.bucket = np.full(size, -1, dtype=np.int64)  # count 所屬的時間區塊，-1 表示尚未出現
+        self.mean = np.zeros(size, dtype=np.float64)  # 已結束時間區塊的 EWMA 平均
+        self.var = np.zeros(size, dtype=np.float64)  # 已結束時間區塊的 EWMA 變異數
+        self.ring = np.zeros((size, window_buckets), dtype=np.float32)  # 最近 window_buckets 個時間區塊的提及次數
+        self.rolling = np.zeros(size, dtype=np.float64)  # ring 的總和
+        self.alerted_bucket = np.full(size, -1, dtype=np.int64)  # 最近一次發出警示的時間區塊
+
+    fields = ('count', 'bucket', 'mean', 'var', 'ring', 'rolling', 'alerted_bucket')
+
+    def remapped(self, positions: np.ndarray, size: int, window_buckets: int) -> "_EntityState":
+        """依 新位置 -> 舊位置（-1 表示新實體）的對應建立新的狀態"""
+        state = _EntityState(size, window_buckets)
+        kept = positions >= 0
+        for field in self.fields:
+            getattr(state, field)[kept] = getattr(self, field)[positions[kept]]
+        return state
+
+
+class MentionSpikeDetector:
+
+    def __init__(self, security_master: SecurityMaster, bucket_minutes: int = 60, half_life_buckets: float = 72,
+                 window_buckets: int = 24, z_threshold: float = 4.0, min_count: int = 3, min_std: float = 1.0,
+                 warmup_buckets: int = 24) -> None:
+        """
+        逐篇更新的新聞提及異常偵測。每支股票與每個產業別保存目前時間區塊的提及次數、
+        已結束時間區塊的 EWMA 平均與變異數，以及最近幾個時間區塊的環狀緩衝區；
+        每篇文章只更新它提及的股票與產業，成本與股票總數及歷史長度無關。
+
+        :param security_master: 股票主檔，stock_id 即為個股的狀態列。
+        :param bucket_minutes: 時間區塊長度（分鐘）。
+        :param half_life_buckets: EWMA 的半衰期（時間區塊數）。
+        :param window_buckets: 滾動提及次數的時間區塊數。
+        :param z_threshold: 目前時間區塊提及次數的 z-score 達到此值時發出警示。
+        :param min_count: 目前時間區塊至少要有的提及次數，避免冷門股票一則新聞就觸發。
+        :param min_std: 計算 z-score 時標準差的下限。
+        :param warmup_buckets: 偵測器開始後經過這麼多時間區塊才發出警示，讓 EWMA 先收斂。
+        """
+        self.security_master = security_master
+        self.bucket_minutes = bucket_minutes
+        self.half_life_buckets = half_life_buckets
+        self.window_buckets = window_buckets
+        self.z_threshold = z_threshold
+        self.min_count = min_count
+        self.min_std = min_std
+        self.warmup_buckets = warmup_buckets
+        self.alpha = 1 - 0.5 ** (1 / half_life_buckets)
+
+        self.stock_codes = np.asarray(security_master.securities['股票代碼'], dtype=str)
+        self.stock_names = np.asarray(security_master.securities['股票名稱'], dtype=str)
+        industry = security_master.securities['產業別']
+        self.industries = np.asarray(industry.cat.categories, dtype=str)
+        self.stock_industry = industry.cat.codes.to_numpy().astype(np.int64)
+
+        # 個股與產業放在同一組狀態，產業的列號為 股票數 + 產業編號，每篇文章只需一次更新
+        self.entities = _EntityState(len(self.stock_codes) + len(self.industries), window_buckets)
+        self.start_bucket = -1
+        self.latest_bucket = -1
+        self.late_articles = 0
+        # 最近 window_buckets 內處理過的 news_id，重複送入的文章不重複計數
+        self._seen_news: Dict[int, int] = {}
+
+    @property
+    def config(self) -> dict:
+        return {"bucket_minutes": self.bucket_minutes, "half_life_buckets": self.half_life_buckets,
+                "window_buckets": self.window_buckets, "z_threshold": self.z_threshold,
+                "min_count": self.min_count, "min_std": self.min_std, "warmup_buckets": self.warmup_buckets}
+
+    def bucket_of(self, publish_at: str) -> int:
+        """發佈時間（'YYYY-MM-DD HH:MM:SS'）所屬的時間區塊編號"""
+        seconds = (datetime.strptime(publish_at, '%Y-%m-%d %H:%M:%S') - _EPOCH).total_seconds()
+        return int(seconds // (self.bucket_minutes * 60))
+
+    def bucket_start(self, bucket: int) -> str:
+        return (_EPOCH + timedelta(minutes=bucket * self.bucket_minutes)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def _advance(self, state: _EntityState, ids: np.ndarray, bucket: int) -> None:
+        """將 ids 的狀態推進到 bucket：結束目前的時間區塊，中間沒有提及的區塊以封閉公式一次併入 EWMA"""
+        unseen = state.bucket[ids] < 0
+        state.bucket[ids[unseen]] = self.start_bucket
+        behind = ids[state.bucket[ids] < bucket]
+        if not len(behind):
+            return
+        gaps = bucket - state.bucket[behind]
+
+        # 結束目前的時間區塊：增量 EWMA 平均與變異數
+        diff = state.count[behind] - state.mean[behind]
+        increment = self.alpha * diff
+        state.mean[behind] += increment
+        state.var[behind] = (1 - self.alpha) * (state.var[behind] + diff * increment)
+
+        # 其後 gaps - 1 個時間區塊都沒有提及：連續 k 次以 0 更新的封閉形式
+        decay = (1 - self.alpha) ** (gaps - 1)
+        state.var[behind] = decay * state.var[behind] + decay * (1 - decay) * state.mean[behind] ** 2
+        state.mean[behind] *= decay
+
+        # 清除環狀緩衝區中已滑出視窗的區塊：舊區塊之後的 gaps 個位置（超過視窗長度時整列清除）
+        offsets = (np.arange(self.window_buckets) - state.bucket[behind, None] - 1) % self.window_buckets
+        expired = offsets < gaps[:, None]
+        ring = state.ring[behind]
+        state.rolling[behind] -= (ring * expired).sum(axis=1)
+        ring[expired] = 0
+        state.ring[behind] = ring
+
+        state.count[behind] = 0
+        state.bucket[behind] = bucket
+
+    def _add(self, state: _EntityState, ids: np.ndarray, bucket: int) -> np.ndarray:
+        """ids 在 bucket 各加一次提及，回傳需要警示的 ids 與其 z-score"""
+        self._advance(state, ids, bucket)
+        # 比實體目前區塊更早的文章（亂序到達）併入目前區塊
+        entity_buckets = state.bucket[ids]
+        state.count[ids] += 1
+        state.ring[ids, entity_buckets % self.window_buckets] += 1
+        state.rolling[ids] += 1
+
+        z_scores = (state.count[ids] - state.mean[ids]) / np.maximum(np.sqrt(state.var[ids]), self.min_std)
+        alert = ((z_scores >= self.z_threshold) & (state.count[ids] >= self.min_count)
+                 & (state.alerted_bucket[ids] != entity_buckets))
+        if bucket - self.start_bucket < self.warmup_buckets:
+            alert[:] = False
+        state.alerted_bucket[ids[alert]] = entity_buckets[alert]
+        return np.flatnonzero(alert), z_scores
+
+    def _event(self, entity_id: int, z_score: float, news_id: int) -> dict:
+        if entity_id < len(self.stock_codes):
+            kind, key, name = 'stock', self.stock_codes[entity_id], self.stock_names[entity_id]
+        else:
+            kind = 'industry'
+            key = name = self.industries[entity_id - len(self.stock_codes)]
+        state = self.entities
+        return {
+            'kind': kind, 'key': str(key), 'name': str(name), 'news_id': news_id,
+            'bucket_start': self.bucket_start(int(state.bucket[entity_id])),
+            'count': int(state.count[entity_id]), 'rolling_count': int(state.rolling[entity_id]),
+            'ewma_mean': float(state.mean[entity_id]), 'z_score': float(z_score),
+        }
+
+    def update(self, news_id: int, publish_at: str, stock_ids: Iterable[int]) -> List[dict]:
+        """
+        以一篇已比對的文章更新狀態。
+
+        :param news_id: 文章 ID，視窗內重複送入的文章會略過。
+        :param publish_at: 發佈時間（'YYYY-MM-DD HH:MM:SS'）。
+        :param stock_ids: 文章提及的 stock_id。
+        :return: 這篇文章觸發的警示事件；同一股票或產業在同一時間區塊只警示一次。
+        """
+        bucket = self.bucket_of(publish_at)
+        if news_id in self._seen_news:
+            return []
+        if self.latest_bucket >= 0 and bucket <= self.latest_bucket - self.window_buckets:
+            self.late_articles += 1  # 早於滾動視窗的文章無法正確計入
+            return []
+        if self.start_bucket < 0:
+            self.start_bucket = bucket
+        if bucket > self.latest_bucket:
+            self.latest_bucket = bucket
+            self._prune_seen_news()
+        self._seen_news[news_id] = bucket
+
+        stock_ids = np.unique(np.asarray(stock_ids, dtype=np.int64))
+        if not len(stock_ids):
+            return []
+        # 產業別每篇文章只計一次
+        industry_ids = np.unique(self.stock_industry[stock_ids])
+        entity_ids = np.concatenate([stock_ids, len(self.stock_codes) + industry_ids[industry_ids >= 0]])
+        alerts, z_scores = self._add(self.entities, entity_ids, bucket)
+        return [self._event(int(entity_ids[position]), z_scores[position], news_id) for position in alerts]
+
+    def update_many(self, article_matches: Iterable[Tuple[int, str, np.ndarray]]) -> List[dict]:
+        """
+        依發佈時間順序送入多篇文章。
+
+        :param article_matches: (news_id, publish_at, stock_ids) 列表，同 count_stock_times_in_news.article_matches。
+        """
+        events = []
+        for news_id, publish_at, stock_ids in sorted(article_matches, key=lambda match: match[1]):
+            events.extend(self.update(news_id, publish_at, stock_ids))
+        return events
+
+    def _prune_seen_news(self) -> None:
+        # 只在 dict 變大時整理，攤提後每篇文章仍為 O(1)
+        if len(self._seen_news) < 4096:
+            return
+        oldest = self.latest_bucket - self.window_buckets
+        self._seen_news = {news_id: bucket for news_id, bucket in self._seen_news.items() if bucket > oldest}
+
+    def snapshot(self, kind: str = 'stock', top_n: int = 10) -> List[dict]:
+        """目前時間區塊 z-score 最高的股票或產業，供儀表板顯示"""
+        state = self.entities
+        stock_count = len(self.stock_codes)
+        entity_range = np.arange(stock_count) if kind == 'stock' else stock_count + np.arange(len(self.industries))
+        current = entity_range[state.bucket[entity_range] == self.latest_bucket]
+        z_scores = (state.count[current] - state.mean[current]) / np.maximum(np.sqrt(state.var[current]),
+                                                                             self.min_std)
+        order = np.argsort(-z_scores, kind='stable')[:top_n]
+        return [self._event(int(current[position]), z_scores[position], -1) for position in order]
+
+    @property
+    def entity_keys(self) -> np.ndarray:
+        """狀態列對應的鍵值，產業加上前綴以免與股票代碼混淆"""
+        return np.concatenate([self.stock_codes, np.char.add('產業:', self.industries)])
+
+    def save(self, state_path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+        tmp_path = f"{state_path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            config=np.array(json.dumps(self.config)),
+            clock=np.array([self.start_bucket, self.latest_bucket, self.late_articles], dtype=np.int64),
+            entity_keys=self.entity_keys,
+            seen_news_ids=np.fromiter(self._seen_news.keys(), dtype=np.int64, count=len(self._seen_news)),
+            seen_news_buckets=np.fromiter(self._seen_news.values(), dtype=np.int64, count=len(self._seen_news)),
+            **{field: getattr(self.entities, field) for field in _EntityState.fields},
+        )
+        os.replace(tmp_path, state_path)
+
+    @classmethod
+    def load(cls, state_path: str, security_master: SecurityMaster, **kwargs) -> "MentionSpikeDetector":
+        """
+        讀取狀態；檔案不存在時建立新的偵測器。主檔更新過時依股票代碼與產業別名稱對應，新的股票從零開始。
+
+        :param kwargs: 建立新偵測器時的參數，讀取既有狀態時以檔案內的設定為準。
+        """
+        if not os.path.exists(state_path):
+            return cls(security_master, **kwargs)
+        with np.load(state_path) as saved:
+            detector = cls(security_master, **json.loads(str(saved['config'])))
+            detector.start_bucket, detector.latest_bucket, detector.late_articles = saved['clock'].tolist()
+            detector._seen_news = dict(zip(saved['seen_news_ids'].tolist(), saved['seen_news_buckets'].tolist()))
+            saved_keys = saved['entity_keys']
+            state = _EntityState(len(saved_keys), detector.window_buckets)
+            for field in _EntityState.fields:
+                setattr(state, field, saved[field])
+
+        current_keys = detector.entity_keys
+        if not np.array_equal(saved_keys, current_keys):
+            saved_position = {key: position for position, key in enumerate(saved_keys.tolist())}
+            positions = np.array([saved_position.get(key, -1) for key in current_keys.tolist()], dtype=np.int64)
+            state = state.remapped(positions, len(current_keys), detector.window_buckets)
+        detector.entities = state
+        return detector
+
+
+if __name__ == "__main__":
+    from stock_prediction_system.utils.extract_path import PathSetting
+
+    path_setting = PathSetting()
+    master = SecurityMaster.load(path_setting.get_files_path("security_master_path"),
+                                 path_setting.get_files_path("stocks_list_path"))
+
+    # 模擬兩週每小時的新聞，最後一小時某檔股票突然被大量提及
+    rng = np.random.default_rng(0)
+    start_time = datetime(2024, 9, 1)
+    simulated = []
+    for hour in range(14 * 24):
+        for position in range(rng.poisson(30)):
+            publish_at = (start_time + timedelta(hours=hour, minutes=int(rng.integers(60)))).strftime('%Y-%m-%d %H:%M:%S')
+            simulated.append((hour * 1000 + position, publish_at, rng.integers(0, len(master), size=rng.integers(1, 4))))
+    spike_stock = master.code_to_id.get('2330', 0)
+    for position in range(12):
+        publish_at = (start_time + timedelta(hours=14 * 24, minutes=position * 4)).strftime('%Y-%m-%d %H:%M:%S')
+        simulated.append((10 ** 9 + position, publish_at, np.array([spike_stock])))
+
+    detector = MentionSpikeDetector(master)
+    begin = time.perf_counter()
+    spike_events = detector.update_many(simulated)
+    seconds = time.perf_counter() - begin
+    print(f"{len(simulated)} articles: {seconds / len(simulated) * 1e6:.0f} us/article, {len(spike_events)} events")
+    for spike_event in spike_events[-3:]:
+        print(spike_event)
@@ -1,22 +1,44 @@
 import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 import json
 import os
-from typing import List, Dict
-from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import List, Dict, Optional
+from lxml import etree
 
 from stock_prediction_system.utils.extract_path import PathSetting
 
 
 class GetStockList:
 
-    def __init__(self) -> None:
+    listed_url: str = "https://isin.twse.com.tw/isin/C_public.jsp?strMode=2"
+    otc_url: str = "https://isin.twse.com.tw/isin/C_public.jsp?strMode=4"
+
+    def __init__(self, cache_dir: Optional[str] = '../data/cache/isin') -> None:
+        """
+        初始化類別並同時爬取上市和上櫃股票列表。
+
+        :param cache_dir: ISIN 頁面的快取資料夾，頁面未變動時直接使用快取，設為 None 則不使用快取。
+        """
+        self.cache_dir = cache_dir
+        self.session = requests.Session()
+
+        # 上市與上櫃頁面互不相依，同時發出請求
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            stock_list_future = executor.submit(self._crawler_stock_list)
+            stock_OTC_list_future = executor.submit(self._crawler_stock_OTC_list)
+            self.stock_list: pd.DataFrame = stock_list_future.result()
+            self.stock_OTC_list: pd.DataFrame = stock_OTC_list_future.result()
+
+    def get_all_stock_frame(self) -> pd.DataFrame:
         """
-        初始化類別並調用私有方法獲取上市和上櫃股票列表。
+        合併上市和上櫃股票列表，並僅保留指定的欄位。
+
+        :return: 合併後的股票列表 DataFrame，包含 股票代碼、股票名稱、產業別、市場別。
         """
-        self.stock_list: List[Dict[str, str]] = self._crawler_stock_list()
-        self.stock_OTC_list: List[Dict[str, str]] = self._crawler_stock_OTC_list()
+        combined_frame: pd.DataFrame = pd.concat([self.stock_list, self.stock_OTC_list], ignore_index=True)
+        return combined_frame[['股票代碼', '股票名稱', '產業別', '市場別']]
 
     def get_all_stock_list(self) -> List[Dict[str, str]]:
         """
@@ -24,21 +46,8 @@ class GetStockList:
 
         :return: 合併後的股票列表，每個股票包含指定的字段。
         """
-        # 合併兩個 JSON 對象列表
-        combined_list: List[Dict[str, str]] = self.stock_list + self.stock_OTC_list
-
-        # 只保留指定的 key
-        filtered_list: List[Dict[str, str]] = [
-            {
-                '股票代碼': item.get('股票代碼', ''),
-                '股票名稱': item.get('股票名稱', ''),
-                '產業別': item.get('產業別', ''),
-                '市場別': item.get('市場別', '')
-            }
-            for item in combined_list
-        ]
-
-        return filtered_list
+        filtered_frame = self.get_all_stock_frame().astype(object).where(lambda frame: frame.notna(), '')
+        return filtered_frame.to_dict(orient='records')
 
     def download_stock_list_to_csv(self, file_path: str) -> None:
         """
@@ -53,71 +62,99 @@ class GetStockList:
         # 確保資料夾存在，若不存在則創建
         os.makedirs(folder_path, exist_ok=True)
 
-        # 獲取所有股票列表
-        stock_list = self.get_all_stock_list()
-
-        # 將股票列表轉換為 DataFrame
-        df = pd.DataFrame(stock_list)
+        # 直接輸出合併後的 DataFrame，不再經過 JSON 轉換
+        df = self.get_all_stock_frame()
 
         # 將 DataFrame 保存為 CSV 檔案
         df.to_csv(file_path, index=False, encoding='utf-8-sig')
 
-    def _crawler_stock_list(self) -> List[Dict[str, str]]:
+    def _crawler_stock_list(self) -> pd.DataFrame:
         """
-        爬取台灣證券交易所的上市股票列表，並轉換為 JSON 對象。
+        爬取台灣證券交易所的上市股票列表。
 
-        :return: 上市股票列表的 JSON 對象，每個股票為一個字典。
+        :return: 上市股票列表 DataFrame。
         """
-        url: str = "https://isin.twse.com.tw/isin/C_public.jsp?strMode=2"
-        res: requests.Response = requests.get(url)
-
-        soup: BeautifulSoup = BeautifulSoup(res.text, "lxml")
-        tr = soup.findAll('tr')
-
-        # 將爬取的數據整理到列表中
-        tds: List[List[str]] = []
-        for raw in tqdm(tr, desc="Processing Stock List", unit="tr"):
-            data = [td.get_text() for td in raw.findAll("td")]
-            if len(data) == 7:
-                tds.append(data)
-
-        # 轉換為 DataFrame 並拆分「有價證券代號及名稱」欄位
-        stock_list: pd.DataFrame = pd.DataFrame(tds[1:], columns=tds[0])
-        stock_list[['股票代碼', '股票名稱']] = stock_list['有價證券代號及名稱 '].str.split(expand=True).iloc[:, :2]
+        return self._crawler_isin_page(self.listed_url, 'listed')
 
-        # 將 DataFrame 轉換為 JSON 格式並返回 JSON 對象
-        json_data_stock_list: List[Dict[str, str]] = json.loads(stock_list.to_json(orient='records', force_ascii=False))
+    def _crawler_stock_OTC_list(self) -> pd.DataFrame:
+        """
+        爬取台灣櫃檯買賣中心的上櫃股票列表。
 
-        return json_data_stock_list
+        :return: 上櫃股票列表 DataFrame。
+        """
+        return self._crawler_isin_page(self.otc_url, 'otc')
 
-    def _crawler_stock_OTC_list(self) -> List[Dict[str, str]]:
+    def _crawler_isin_page(self, url: str, cache_key: str) -> pd.DataFrame:
         """
-        爬取台灣櫃檯買賣中心的上櫃股票列表，並轉換為 JSON 對象。
+        以條件式請求（ETag / If-Modified-Since）下載 ISIN 頁面，頁面未變動時直接讀取上次解析好的結果。
 
-        :return: 上櫃股票列表的 JSON 對象，每個股票為一個字典。
+        :param url: ISIN 頁面網址。
+        :param cache_key: 快取檔名前綴。
+        :return: 股票列表 DataFrame。
+        """
+        meta_path = os.path.join(self.cache_dir, f'{cache_key}.json') if self.cache_dir else None
+        parsed_path = os.path.join(self.cache_dir, f'{cache_key}.parquet') if self.cache_dir else None
+
+        headers: Dict[str, str] = {}
+        cache_meta: Dict[str, str] = {}
+        if meta_path and os.path.exists(meta_path) and os.path.exists(parsed_path):
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                cache_meta = json.load(file)
+            if cache_meta.get('etag'):
+                headers['If-None-Match'] = cache_meta['etag']
+            if cache_meta.get('last_modified'):
+                headers['If-Modified-Since'] = cache_meta['last_modified']
+
+        res: requests.Response = self.session.get(url, headers=headers)
+        if res.status_code == requests.codes.not_modified:
+            return pd.read_parquet(parsed_path)
+        res.raise_for_status()
+
+        stock_list = self._parse_isin_table(res.content, res.encoding or 'cp950')
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            stock_list.to_parquet(parsed_path, index=False)
+            with open(meta_path, 'w', encoding='utf-8') as file:
+                json.dump({
+                    'url': url,
+                    'etag': res.headers.get('ETag'),
+                    'last_modified': res.headers.get('Last-Modified'),
+                }, file, ensure_ascii=False, indent=4)
+
+        return stock_list
+
+    @staticmethod
+    def _parse_isin_table(content: bytes, encoding: str) -> pd.DataFrame:
         """
-        url: str = 'https://isin.twse.com.tw/isin/C_public.jsp?strMode=4'
-        res: requests.Response = requests.get(url)
+        以 lxml iterparse 串流解析 ISIN 頁面，只保留 7 個欄位的資料列並直接轉為具型別的欄位。
 
-        soup: BeautifulSoup = BeautifulSoup(res.text, "lxml")
-        tr = soup.findAll('tr')
+        :param content: 頁面原始內容。
+        :param encoding: 頁面編碼。
+        :return: 股票列表 DataFrame。
+        """
+        # 統一轉成 UTF-8，避免頁面內 meta charset 與實際編碼不一致
+        source = BytesIO(content.decode(encoding, errors='replace').encode('utf-8'))
 
         # 將爬取的數據整理到列表中
         tds: List[List[str]] = []
-        for raw in tqdm(tr, desc="Processing OTC Stock List", unit="tr"):
-            data = [td.get_text() for td in raw.findAll("td")]
-            if len(data) == 7:
-                tds.append(data)
+        for _, tr in etree.iterparse(source, events=('end',), tag='tr', html=True, encoding='utf-8'):
+            cells = tr.findall('td')
+            if len(cells) == 7:
+                tds.append([''.join(td.itertext()) for td in cells])
+            # 處理完即釋放節點，記憶體不隨列數成長
+            tr.clear()
+            while tr.getprevious() is not None:
+                del tr.getparent()[0]
 
         # 轉換為 DataFrame 並拆分「有價證券代號及名稱」欄位
         stock_list: pd.DataFrame = pd.DataFrame(tds[1:], columns=tds[0])
         stock_list[['股票代碼', '股票名稱']] = stock_list['有價證券代號及名稱 '].str.split(expand=True).iloc[:, :2]
+        stock_list['上市日'] = pd.to_datetime(stock_list['上市日'], format='%Y/%m/%d', errors='coerce')
+        stock_list['市場別'] = stock_list['市場別'].astype('category')
+        stock_list['產業別'] = stock_list['產業別'].astype('category')
 
-        # 將 DataFrame 轉換為 JSON 格式並返回 JSON 對象
-        json_data_stock_OTC_list: List[Dict[str, str]] = json.loads(
-            stock_list.to_json(orient='records', force_ascii=False))
-
-        return json_data_stock_OTC_list
+        return stock_list
 
 if __name__ == "__main__":
     # stock_list = GetStockList()
@@ -127,4 +164,3 @@ if __name__ == "__main__":
     stocks_list_path = path_setting.get_files_path('stocks_list_path')
 
     print(f"Stocks list path: {stocks_list_path}")
-
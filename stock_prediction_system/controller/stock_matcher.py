@@ -0,0 +1,532 @@
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from stock_prediction_system.controller.text_normalizer import TextNormalizer
+
+
+class AhoCorasickAutomaton:
+
+    def __init__(self, terms: Iterable[str]) -> None:
+        """
+        將所有關鍵字編譯為 Aho-Corasick 自動機，之後每篇文章只需線性掃描一次。
+
+        :param terms: 關鍵字列表，關鍵字的 index 即為 term_id。
+        """
+        self.terms: List[str] = list(terms)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+
+        for term_id, term in enumerate(self.terms):
+            self._add_term(term_id, term)
+        self._build_fail_links()
+
+    def _add_term(self, term_id: int, term: str) -> None:
+        state = 0
+        for ch in term:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][ch] = next_state
+            state = next_state
+        self._output[state] = self._output[state] + (term_id,)
+
+    def _build_fail_links(self) -> None:
+        # 以 BFS 建立失敗指標，並把失敗指標上的輸出合併進來，掃描時就不用再沿 fail 鏈找輸出
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and ch not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                self._fail[next_state] = self._goto[fail_state].get(ch, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        逐字掃描文字，產出所有命中的關鍵字。
+
+        :param text: 要掃描的文字。
+        :return: (結束位置, term_id) 的迭代器，結束位置為關鍵字最後一個字元的 index。
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        root = goto[0]
+        state = 0
+        for index, ch in enumerate(text):
+            if state == 0 and ch not in root:
+                continue
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for term_id in output[state]:
+                yield index, term_id
+
+    def find_terms(self, text: str) -> Set[int]:
+        """
+        掃描文字並回傳所有出現過的 term_id。
+
+        :param text: 要掃描的文字。
+        :return: 命中的 term_id 集合。
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        root = goto[0]
+        found: Set[int] = set()
+        state = 0
+        for ch in text:
+            if state == 0 and ch not in root:
+                continue
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class DisambiguationRules:
+    # 股票代碼命中的判斷結果
+    REJECT = 0
+    ACCEPT = 1
+    CORROBORATE = 2  # 需要同一篇文章中也出現該股名稱才採計
+
+    def __init__(self, stop_terms: Iterable[str] = (), ambiguous_terms: Optional[Dict[str, List[str]]] = None,
+                 blocked_phrases: Optional[Dict[str, List[str]]] = None,
+                 context_terms: Iterable[str] = (), context_window: int = 12,
+                 numeric_suffixes: Iterable[str] = (), year_range: Tuple[int, int] = (1900, 2099),
+                 title_weight: float = 1.0, body_weight: float = 1.0) -> None:
+        """
+        股票名稱與代碼的消歧規則。
+
+        :param stop_terms: 不以名稱判斷的股票名稱（一般詞彙），仍可由股票代碼命中。
+        :param ambiguous_terms: 模稜兩可的名稱 -> 額外上下文詞，附近需出現上下文詞或同篇出現該股代碼才採計。
+        :param blocked_phrases: 名稱 -> 包含該名稱的一般詞組，命中位置落在詞組內時不採計，例如 東南亞 中的 南亞。
+        :param context_terms: 模稜兩可名稱共用的上下文詞。
+        :param context_window: 檢查上下文時，名稱前後各取幾個字。
+        :param numeric_suffixes: 代碼後接這些字時視為數量、日期或價格。
+        :param year_range: 容易與年份混淆的代碼區間，需 -TW 代碼格式或名稱佐證。
+        :param title_weight: 標題命中的權重。
+        :param body_weight: 內文命中的權重。
+        """
+        self.stop_terms: Set[str] = set(stop_terms)
+        self.context_terms: Tuple[str, ...] = tuple(context_terms)
+        self.ambiguous_terms: Dict[str, Tuple[str, ...]] = {
+            term: self.context_terms + tuple(extra_terms or ())
+            for term, extra_terms in (ambiguous_terms or {}).items()
+        }
+        self.blocked_phrases: Dict[str, Tuple[str, ...]] = {
+            term: tuple(phrases) for term, phrases in (blocked_phrases or {}).items()
+        }
+        self.context_window = context_window
+        self.numeric_suffixes: Tuple[str, ...] = tuple(numeric_suffixes)
+        self.year_range = tuple(year_range)
+        self.title_weight = title_weight
+        self.body_weight = body_weight
+
+    @classmethod
+    def from_yaml(cls, config_path: str) -> 'DisambiguationRules':
+        """由 YAML 設定檔建立規則，欄位同 __init__ 參數"""
+        with open(config_path, 'r', encoding='utf-8') as file:
+            return cls(**(yaml.safe_load(file) or {}))
+
+    @property
+    def fingerprint(self) -> str:
+        """規則內容的識別字串，規則變動時比對快取會失效"""
+        payload = json.dumps([sorted(self.stop_terms), sorted(self.ambiguous_terms.items()),
+                              sorted(self.blocked_phrases.items()), self.context_terms,
+                              self.context_window, self.numeric_suffixes, self.year_range,
+                              self.title_weight, self.body_weight], ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+    def code_status(self, text: str, start: int, end: int) -> int:
+        """
+        判斷文字中 text[start:end + 1] 這段數字是否為股票代碼。
+
+        :return: REJECT、ACCEPT 或 CORROBORATE。
+        """
+        before = text[start - 1] if start > 0 else ""
+        after = text[end + 1] if end + 1 < len(text) else ""
+
+        # 代碼必須是獨立的 token：不可緊鄰英數字、小數點或千分位，例如 21092.75、AMK01-240900022
+        if (before.isascii() and before.isalnum()) or (after.isascii() and after.isalnum()):
+            return self.REJECT
+        # 代碼位於文字開頭或結尾時 before / after 為空字串，空字串 `in` 任何字串皆成立，每個判斷都需先排除
+        digit_before = start > 1 and text[start - 2].isdigit()
+        digit_after = end + 2 < len(text) and text[end + 2].isdigit()
+        # 小數點與千分位兩側都是數字，例如 1.2330、2330.5；一般的逗號、句號是標點，例如 關注 2330，營收創高
+        if (before and before in ".," and digit_before) or (after and after in ".," and digit_after):
+            return self.REJECT
+        if (before and before in "$") or (after and after in "%"):
+            return self.REJECT
+        # 日期、電話、區間，例如 2024/09/04、8758-1568、2010-2012
+        if (before and before in "-/:" and digit_before) or (after and after in "-/:" and digit_after):
+            return self.REJECT
+        # 數量、日期或價格，例如 2024 年、4138 張、2484 美元
+        if text[end + 1:end + 8].lstrip(" ").startswith(self.numeric_suffixes):
+            return self.REJECT
+
+        # 台股新聞的代碼格式，例如 (2330-TW)
+        if text.startswith("-TW", end + 1):
+            return self.ACCEPT
+        # 只有括號沒有 -TW 的代碼常是港股，例如 廣達 (2382) 其實是舜宇光學 (2382)；年份區間的數字也需佐證
+        if (before and before in "(（") or self.year_range[0] <= int(text[start:end + 1]) <= self.year_range[1]:
+            return self.CORROBORATE
+        return self.ACCEPT
+
+    def in_blocked_phrase(self, text: str, start: int, term: str) -> bool:
+        """名稱命中位置是否落在一般詞組內"""
+        for phrase in self.blocked_phrases.get(term, ()):
+            offset = phrase.find(term)
+            while offset >= 0:
+                if start >= offset and text.startswith(phrase, start - offset):
+                    return True
+                offset = phrase.find(term, offset + 1)
+        return False
+
+    def has_context(self, text: str, start: int, end: int, term: str) -> bool:
+        """模稜兩可的名稱前後 context_window 個字內是否出現上下文詞"""
+        window = (text[max(0, start - self.context_window):start]
+                  + "\n" + text[end + 1:end + 1 + self.context_window])
+        return any(context_term in window for context_term in self.ambiguous_terms[term])
+
+
+class StockMatcher:
+
+    def __init__(self, stock_lists: pd.DataFrame, text_normalizer: Optional[TextNormalizer] = None,
+                 rules: Optional[DisambiguationRules] = None) -> None:
+        """
+        以股票列表的「股票名稱」與「股票代碼」建立多關鍵字比對器，只需建立一次即可重複使用。
+
+        :param stock_lists: 已篩選過的股票列表，需包含 股票名稱、股票代碼、產業別 欄位；
+                            若有 stock_id 欄位（SecurityMaster），match_stock_ids 會回傳主檔的 stock_id。
+        :param text_normalizer: 提供時關鍵字與沒有 clean_text 的文章都會先正規化，與 clean_text 使用相同規則。
+        :param rules: 消歧規則；None 時為子字串比對，結果與逐列 `term in text` 相同。
+        """
+        self.text_normalizer = text_normalizer
+        self.rules = rules
+        self.stocks: List[Tuple[str, str, str]] = list(zip(
+            stock_lists["股票名稱"], stock_lists["股票代碼"], stock_lists["產業別"]
+        ))
+        if "stock_id" in stock_lists:
+            self.stock_ids: np.ndarray = stock_lists["stock_id"].to_numpy(dtype=np.int64)
+        else:
+            self.stock_ids = np.arange(len(self.stocks), dtype=np.int64)
+
+        # 同一個關鍵字可能對應多筆股票，以 term -> row ids 記錄
+        term_rows: Dict[str, List[int]] = {}
+        for row_id, (stock_name, stock_code, _) in enumerate(self.stocks):
+            for term in (stock_name, stock_code):
+                if text_normalizer is not None:
+                    term = text_normalizer.normalize(term)
+                term_rows.setdefault(term, []).append(row_id)
+
+        # 空字串在 `in` 判斷下永遠成立，為了和逐列比對結果一致，直接視為每篇都命中
+        self._always_rows: List[int] = term_rows.pop("", [])
+        self._term_rows: List[List[int]] = list(term_rows.values())
+        self._automaton = AhoCorasickAutomaton(term_rows.keys())
+        # 純數字的關鍵字為股票代碼，消歧時以 token 邊界與上下文判斷
+        self._is_code_term: List[bool] = [term.isascii() and term.isdigit() for term in self._automaton.terms]
+
+    def article_text(self, article: dict) -> str:
+        """
+        取得要掃描的文字：優先使用匯入時已正規化的 clean_text，否則串接標題與內文。
+
+        :param article: 新聞資料，使用 clean_text 或 title 與 content 欄位。
+        :return: 要掃描的文字。
+        """
+        clean_text = article.get("clean_text")
+        if clean_text is not None:
+            return clean_text
+        if self.text_normalizer is not None:
+            return self.text_normalizer.normalize_article(article)
+        # 以換行串接標題與內文，股票名稱與代碼不含換行，因此不會跨欄位誤判
+        return f"{article.get('title', '')}\n{article.get('content', '')}"
+
+    def match_ids(self, article: dict) -> List[int]:
+        """
+        找出文章標題或內文中提及的股票。
+
+        :param article: 新聞資料，使用 clean_text 或 title 與 content 欄位。
+        :return: 命中股票在股票列表中的位置（row id），依列表順序排列。
+        """
+        if self.rules is not None:
+            return sorted(self._match_rows_with_rules(self.article_text(article)))
+
+        matched_rows = set(self._always_rows)
+        for term_id in self._automaton.find_terms(self.article_text(article)):
+            matched_rows.update(self._term_rows[term_id])
+
+        return sorted(matched_rows)
+
+    def _match_rows_with_rules(self, text: str) -> Dict[int, float]:
+        """
+        消歧模式：檢查每個命中位置，回傳 row id -> 權重（標題命中為 title_weight，否則為 body_weight）。
+        仍只掃描文字一次，額外檢查只發生在命中位置附近。
+        """
+        rules = self.rules
+        terms = self._automaton.terms
+        title_end = text.find("\n")
+        if title_end < 0:
+            title_end = len(text)
+
+        name_spans: List[Tuple[int, int, int]] = []
+        code_spans: List[Tuple[int, int, int]] = []
+        for end, term_id in self._automaton.iter_matches(text):
+            span = (end - len(terms[term_id]) + 1, end, term_id)
+            (code_spans if self._is_code_term[term_id] else name_spans).append(span)
+
+        # row id -> 是否在標題命中；strong 為直接採計，weak 需要同一檔股票有其他證據佐證
+        strong_rows: Dict[int, bool] = {}
+        weak_rows: Dict[int, bool] = {}
+
+        def mark(rows: Dict[int, bool], term_id: int, start: int) -> None:
+            for row_id in self._term_rows[term_id]:
+                rows[row_id] = rows.get(row_id, False) or start < title_end
+
+        # 最長匹配優先：被較長名稱完全包含的名稱不採計，例如 聯發科 中的 聯發、中華電 中的 華電
+        name_spans.sort(key=lambda span: (span[0], -span[1]))
+        covered_end = -1
+        strong_starts: Set[int] = set()
+        strong_ends: Set[int] = set()
+        ambiguous_spans: List[Tuple[int, int, int]] = []
+        for start, end, term_id in name_spans:
+            if end <= covered_end:
+                continue
+            covered_end = end
+            term = terms[term_id]
+            if term in rules.stop_terms or rules.in_blocked_phrase(text, start, term):
+                continue
+            if term in rules.ambiguous_terms and not rules.has_context(text, start, end, term):
+                ambiguous_spans.append((start, end, term_id))
+            else:
+                mark(strong_rows, term_id, start)
+                strong_starts.add(start)
+                strong_ends.add(end)
+
+        # 模稜兩可的名稱若與其他股票名稱以頓號並列，例如「碩天、技嘉、創意、智原」，視為股票名稱
+        for start, end, term_id in ambiguous_spans:
+            listed = ((start >= 2 and text[start - 1] in "、," and start - 2 in strong_ends)
+                      or (end + 2 < len(text) and text[end + 1] in "、," and end + 2 in strong_starts))
+            mark(strong_rows if listed else weak_rows, term_id, start)
+
+        for start, end, term_id in code_spans:
+            status = rules.code_status(text, start, end)
+            if status == rules.ACCEPT:
+                mark(strong_rows, term_id, start)
+            elif status == rules.CORROBORATE:
+                mark(weak_rows, term_id, start)
+
+        matched_rows = {row_id: rules.body_weight for row_id in self._always_rows}
+        for row_id, in_title in strong_rows.items():
+            in_title = in_title or weak_rows.get(row_id, False)
+            matched_rows[row_id] = rules.title_weight if in_title else rules.body_weight
+        return matched_rows
+
+    def match_weighted(self, article: dict) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        找出文章中提及的股票與權重；未設定消歧規則時權重皆為 1。
+
+        :param article: 新聞資料，使用 clean_text 或 title 與 content 欄位。
+        :return: (stock_id 陣列, 權重陣列)，依列表順序排列。
+        """
+        if self.rules is None:
+            stock_ids = self.match_stock_ids(article)
+            return stock_ids, np.ones(len(stock_ids), dtype=np.float64)
+
+        matched_rows = self._match_rows_with_rules(self.article_text(article))
+        row_ids = sorted(matched_rows)
+        return self.stock_ids[row_ids], np.array([matched_rows[row_id] for row_id in row_ids], dtype=np.float64)
+
+    def match_stock_ids(self, article: dict) -> np.ndarray:
+        """
+        找出文章中提及的股票。
+
+        :param article: 新聞資料，使用 clean_text 或 title 與 content 欄位。
+        :return: 命中股票的 stock_id 陣列。
+        """
+        return self.stock_ids[self.match_ids(article)]
+
+    def match_article(self, article: dict) -> Set[Tuple[str, str, str]]:
+        """
+        找出文章中提及的股票；未設定消歧規則時，結果與逐列 `term in text` 比對完全相同。
+
+        :param article: 新聞資料，使用 clean_text 或 title 與 content 欄位。
+        :return: 命中股票的 (股票名稱, 股票代碼, 產業別) 集合。
+        """
+        return {self.stocks[row_id] for row_id in self.match_ids(article)}
+
+
+# 每個子程序各自持有一份比對器，由 initializer 在程序啟動時設定一次，之後的任務不再傳送比對器
+_worker_stock_matcher: Optional[StockMatcher] = None
+
+
+def _init_match_worker(stock_matcher: StockMatcher) -> None:
+    global _worker_stock_matcher
+    _worker_stock_matcher = stock_matcher
+
+
+def _match_shard(articles: List[dict]) -> List[Tuple[np.ndarray, np.ndarray]]:
+    return [_worker_stock_matcher.match_weighted(article) for article in articles]
+
+
+class ParallelStockMatcher:
+
+    def __init__(self, stock_matcher: StockMatcher, workers: Optional[int] = None, shard_size: int = 256) -> None:
+        """
+        以多個程序平行比對大量文章，適用於回補長時間區間的新聞。
+        比對器在每個子程序啟動時傳入一次（fork 時直接繼承），不隨每個任務序列化。
+
+        :param stock_matcher: 已建立的比對器。
+        :param workers: 子程序數量，預設為 CPU 核心數。
+        :param shard_size: 每個任務包含的文章數，過小會增加程序間傳輸成本。
+        """
+        self.stock_matcher = stock_matcher
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_match_worker,
+                                             initargs=(stock_matcher,))
+
+    def match_weighted(self, articles: List[dict]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        平行比對文章，結果順序與輸入相同，與單程序比對結果完全一致。
+
+        :param articles: 新聞資料列表，使用 clean_text 或 title 與 content 欄位。
+        :return: 每篇文章的 (stock_id 陣列, 權重陣列)。
+        """
+        # 只傳送要掃描的文字，減少程序間序列化的資料量
+        payload = [{"clean_text": self.stock_matcher.article_text(article)} for article in articles]
+        shards = [payload[start:start + self.shard_size] for start in range(0, len(payload), self.shard_size)]
+
+        # executor.map 依提交順序回傳，合併結果與分片方式無關
+        matched: List[Tuple[np.ndarray, np.ndarray]] = []
+        for shard_result in self._executor.map(_match_shard, shards):
+            matched.extend(shard_result)
+        return matched
+
+    def match_stock_ids(self, articles: List[dict]) -> List[np.ndarray]:
+        """平行比對文章，只回傳每篇文章命中股票的 stock_id 陣列"""
+        return [stock_ids for stock_ids, _ in self.match_weighted(articles)]
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def __enter__(self) -> 'ParallelStockMatcher':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    # 基準測試：比較原本 iterrows 逐列比對與 Aho-Corasick 自動機的速度與結果
+    stock_list_all = pd.read_csv("../data/feature/stocks_list.csv", encoding="utf-8-sig")
+    stock_lists = stock_list_all[(stock_list_all["市場別"] == "上市") & (pd.notna(stock_list_all["產業別"]))]
+
+    with open("../data/processed/stock_news_extraction.json", "r", encoding="utf-8") as json_file:
+        all_news_data_json = json.load(json_file)
+
+    start = time.perf_counter()
+    iterrows_result = []
+    for article in all_news_data_json:
+        article_title = article.get("title", "")
+        article_content = article.get("content", "")
+        matched_stocks = set()
+        for _, row in stock_lists.iterrows():
+            if any(term in article_title or term in article_content for term in [row["股票名稱"], row["股票代碼"]]):
+                matched_stocks.add((row["股票名稱"], row["股票代碼"], row["產業別"]))
+        iterrows_result.append(matched_stocks)
+    iterrows_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stock_matcher = StockMatcher(stock_lists)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    automaton_result = [stock_matcher.match_article(article) for article in all_news_data_json]
+    automaton_seconds = time.perf_counter() - start
+
+    print(f"articles: {len(all_news_data_json)}, stocks: {len(stock_lists)}")
+    print(f"iterrows:        {iterrows_seconds:.3f}s")
+    print(f"automaton build: {build_seconds:.3f}s")
+    print(f"automaton scan:  {automaton_seconds:.3f}s")
+    print(f"speedup (scan):  {iterrows_seconds / automaton_seconds:.1f}x")
+    print(f"identical results: {iterrows_result == automaton_result}")
+
+    # 正規化：去除 HTML 後掃描的文字較短，也不會再命中網址、圖片屬性中的數字
+    text_normalizer = TextNormalizer()
+    normalized_matcher = StockMatcher(stock_lists, text_normalizer)
+    clean_articles = [{"clean_text": text_normalizer.normalize_article(article)} for article in all_news_data_json]
+    start = time.perf_counter()
+    normalized_result = [normalized_matcher.match_article(article) for article in clean_articles]
+    normalized_seconds = time.perf_counter() - start
+    print(f"clean_text scan: {normalized_seconds:.3f}s, "
+          f"mentions: {sum(map(len, automaton_result))} -> {sum(map(len, normalized_result))}")
+
+    # 消歧模式：以人工標註樣本計算精確率與召回率，並比較掃描速度
+    rules = DisambiguationRules.from_yaml("../config/stock_disambiguation.yaml")
+    disambiguated_matcher = StockMatcher(stock_lists, text_normalizer, rules)
+    start = time.perf_counter()
+    disambiguated_result = [disambiguated_matcher.match_article(article) for article in clean_articles]
+    disambiguated_seconds = time.perf_counter() - start
+    print(f"disambiguated scan: {disambiguated_seconds:.3f}s "
+          f"({disambiguated_seconds / normalized_seconds:.2f}x of plain clean_text scan), "
+          f"mentions: {sum(map(len, disambiguated_result))}")
+
+    # 每篇文章的成本應與語料大小無關：語料放大 20 倍時，每篇平均時間應維持不變
+    start = time.perf_counter()
+    for article in clean_articles * 20:
+        disambiguated_matcher.match_ids(article)
+    scaled_seconds = time.perf_counter() - start
+    print(f"disambiguated per article: {disambiguated_seconds / len(clean_articles) * 1e6:.0f}us "
+          f"(x1 corpus), {scaled_seconds / (len(clean_articles) * 20) * 1e6:.0f}us (x20 corpus)")
+
+    # tune 為調整規則時參考的樣本，holdout 為規則定案後才標註的樣本，精確率以 holdout 為準
+    with open("../data/processed/stock_mention_labels.json", "r", encoding="utf-8") as json_file:
+        labels = json.load(json_file)
+    article_positions = {article["news_id"]: position for position, article in enumerate(all_news_data_json)}
+    for split in ("tune", "holdout"):
+        split_labels = [label for label in labels if label["split"] == split]
+        for mode, result in (("substring", normalized_result), ("disambiguated", disambiguated_result)):
+            true_positive = false_positive = false_negative = 0
+            for label in split_labels:
+                label_codes = set(label["stock_codes"])
+                matched_codes = {stock_code for _, stock_code, _ in result[article_positions[label["news_id"]]]}
+                true_positive += len(matched_codes & label_codes)
+                false_positive += len(matched_codes - label_codes)
+                false_negative += len(label_codes - matched_codes)
+            print(f"{split} {mode}: precision {true_positive / (true_positive + false_positive):.3f}, "
+                  f"recall {true_positive / (true_positive + false_negative):.3f} "
+                  f"on {len(split_labels)} labelled articles")
+
+    # 平行比對：以樣本新聞複製出合成語料，比較不同程序數的處理速度
+    synthetic_articles = [
+        {"title": f"{article.get('title', '')} {copy_id}", "content": article.get("content", "")}
+        for copy_id in range(50) for article in all_news_data_json
+    ]
+    start = time.perf_counter()
+    serial_result = [stock_matcher.match_stock_ids(article) for article in synthetic_articles]
+    serial_seconds = time.perf_counter() - start
+    print(f"synthetic articles: {len(synthetic_articles)}, cpu cores: {os.cpu_count()}")
+    print(f"workers=1 (serial): {serial_seconds:.3f}s")
+
+    for workers in (2, 4, 8):
+        with ParallelStockMatcher(stock_matcher, workers=workers) as parallel_matcher:
+            start = time.perf_counter()
+            parallel_result = parallel_matcher.match_stock_ids(synthetic_articles)
+            parallel_seconds = time.perf_counter() - start
+        identical = all(np.array_equal(a, b) for a, b in zip(serial_result, parallel_result))
+        print(f"workers={workers}: {parallel_seconds:.3f}s, speedup: {serial_seconds / parallel_seconds:.2f}x, "
+              f"identical results: {identical}")
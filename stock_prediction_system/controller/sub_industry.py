@@ -0,0 +1,296 @@
+import asyncio
+import os
+import re
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urljoin
+
+import aiohttp
+import numpy as np
+import pandas as pd
+from lxml import etree
+from scipy import sparse
+
+from stock_prediction_system.controller.async_news_spider import TokenBucket
+from stock_prediction_system.controller.security_master import SecurityMaster
+from stock_prediction_system.utils.extract_path import PathSetting
+
+# 族群頁面的儲存格 class，兩種底色交錯出現
+_GROUP_CELL_XPATH = "//td[@class='t3t1' or @class='t3t1_rev']"
+_QUOTED_PATTERN = re.compile(r"'(.*?)'")
+# 個股連結的代碼前綴（例如 'AS1101'），只保留代碼本身
+_CODE_PREFIX_PATTERN = re.compile(r"^[A-Za-z]+")
+
+
+class SubIndustrySpider:
+
+    index_url: str = "http://jsjustweb.jihsun.com.tw/z/zh/zha/zha.djhtm"
+
+    def __init__(self, rate_limit: float = 4.0, burst: int = 8, max_concurrency: int = 8, max_retries: int = 3,
+                 index_url: Optional[str] = None) -> None:
+        """
+        以一般 HTTP 請求並行抓取日盛的產業族群頁面，不需啟動瀏覽器。
+
+        :param rate_limit: 每秒最多發出的請求數（令牌桶補充速率）。
+        :param burst: 令牌桶容量，允許的瞬間請求數。
+        :param max_concurrency: 同時進行中的請求上限。
+        :param max_retries: 單頁最多重試次數。
+        :param index_url: 族群總覽頁位址，測試時可指向本機 stub server。
+        """
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        if index_url:
+            self.index_url = index_url
+
+    @staticmethod
+    def parse_group_links(page: str, base_url: str) -> Tuple[Dict[str, List[str]], Set[str]]:
+        """
+        解析族群總覽頁。
+
+        :param page: 總覽頁 HTML。
+        :param base_url: 總覽頁網址，用於轉換相對連結。
+        :return: (族群名稱 -> 族群頁網址列表, 主產業名稱集合)；總覽頁中出現超過一次的名稱為主產業，各個連結的成分股都要合併。
+        """
+        group_links: Dict[str, List[str]] = {}
+        name_counts: Dict[str, int] = {}
+        for link in etree.HTML(page).xpath(f"{_GROUP_CELL_XPATH}/a"):
+            group_name = ''.join(link.itertext()).strip()
+            if not group_name or not link.get('href'):
+                continue
+            group_url = urljoin(base_url, link.get('href'))
+            urls = group_links.setdefault(group_name, [])
+            if group_url not in urls:
+                urls.append(group_url)
+            name_counts[group_name] = name_counts.get(group_name, 0) + 1
+        main_groups = {group_name for group_name, count in name_counts.items() if count > 1}
+        return group_links, main_groups
+
+    @staticmethod
+    def parse_group_stocks(page: str) -> List[Tuple[str, str]]:
+        """
+        解析族群頁的成分股，個股寫在儲存格內的 javascript 呼叫中，例如 GenLink2stk('AS1101','台泥')。
+
+        :param page: 族群頁 HTML。
+        :return: (股票代碼, 股票名稱) 列表。
+        """
+        stocks: List[Tuple[str, str]] = []
+        for script in etree.HTML(page).xpath(f"{_GROUP_CELL_XPATH}//script"):
+            quoted = _QUOTED_PATTERN.findall(script.text or '')
+            if len(quoted) >= 2:
+                stocks.append((_CODE_PREFIX_PATTERN.sub('', quoted[0]), quoted[1]))
+        return stocks
+
+    async def _fetch_page(self, session: aiohttp.ClientSession, bucket: TokenBucket,
+                          semaphore: asyncio.Semaphore, url: str) -> Optional[str]:
+        for attempt in range(self.max_retries):
+            await bucket.acquire()
+            try:
+                async with semaphore:
+                    async with session.get(url) as r:
+                        if r.status == 200:
+                            content = await r.read()
+                            # 日盛頁面為 Big5 編碼，回應標頭沒有標示時以 cp950 解碼
+                            return content.decode(r.charset or 'cp950', errors='replace')
+                        print(f'請求失敗，網址: {url}，狀態碼: {r.status}')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f'請求失敗，網址: {url}，錯誤: {e}')
+            await asyncio.sleep(min(2 ** attempt, 10))
+        return None
+
+    async def fetch_memberships_async(self) -> pd.DataFrame:
+        """
+        抓取總覽頁後並行抓取所有族群頁。
+
+        :return: 欄位為 細產業、主產業、股票代碼、股票名稱 的 DataFrame，每列為一筆「族群 - 個股」關係。
+        """
+        bucket = TokenBucket(self.rate_limit, self.burst)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+
+        async with aiohttp.ClientSession(connector=connector) as session:
+            index_page = await self._fetch_page(session, bucket, semaphore, self.index_url)
+            if index_page is None:
+                raise ConnectionError(f'無法取得族群總覽頁: {self.index_url}')
+            group_links, main_groups = self.parse_group_links(index_page, self.index_url)
+
+            group_urls = [(group_name, url) for group_name, urls in group_links.items() for url in urls]
+            group_pages = await asyncio.gather(*(
+                self._fetch_page(session, bucket, semaphore, url) for _, url in group_urls
+            ))
+
+        rows = []
+        for (group_name, _), group_page in zip(group_urls, group_pages):
+            if group_page is None:
+                continue
+            is_main = group_name in main_groups
+            rows.extend((group_name, is_main, code, name) for code, name in self.parse_group_stocks(group_page))
+        return pd.DataFrame(rows, columns=['細產業', '主產業', '股票代碼', '股票名稱'])
+
+    def fetch_memberships(self) -> pd.DataFrame:
+        """fetch_memberships_async 的同步介面"""
+        return asyncio.run(self.fetch_memberships_async())
+
+
+class SubIndustryTaxonomy:
+
+    def __init__(self, stock_codes: np.ndarray, stock_names: np.ndarray, categories: np.ndarray,
+                 main_categories: np.ndarray, stock_to_categories: sparse.csr_matrix,
+                 category_to_stocks: Optional[sparse.csr_matrix] = None) -> None:
+        """
+        細產業分類：個股 -> 細產業 的多對多對應，以及 細產業 -> 個股 的反向索引，兩者皆為 CSR 結構。
+
+        :param stock_codes: 股票代碼，對應 stock_to_categories 的列。
+        :param stock_names: 股票名稱。
+        :param categories: 細產業名稱，對應 stock_to_categories 的欄。
+        :param main_categories: 每個細產業是否為主產業的布林陣列。
+        :param stock_to_categories: 股票 × 細產業 的 0/1 CSR 矩陣。
+        :param category_to_stocks: 反向索引，未提供時由 stock_to_categories 轉置。
+        """
+        self.stock_codes = np.asarray(stock_codes).astype(str)
+        self.stock_names = np.asarray(stock_names).astype(str)
+        self.categories = np.asarray(categories).astype(str)
+        self.main_categories = np.asarray(main_categories, dtype=bool)
+        self.stock_to_categories = stock_to_categories.tocsr()
+        self.category_to_stocks = (category_to_stocks if category_to_stocks is not None
+                                   else self.stock_to_categories.T.tocsr())
+
+        self._code_to_row: Dict[str, int] = {code: row for row, code in enumerate(self.stock_codes.tolist())}
+        self._category_to_column: Dict[str, int] = {
+            category: column for column, category in enumerate(self.categories.tolist())
+        }
+
+    @classmethod
+    def from_memberships(cls, memberships: pd.DataFrame) -> 'SubIndustryTaxonomy':
+        """
+        由「族群 - 個股」關係表一次建立正向與反向索引，不需逐一比對股票名稱。
+
+        :param memberships: 欄位為 細產業、主產業、股票代碼、股票名稱 的 DataFrame。
+        :return: SubIndustryTaxonomy。
+        """
+        memberships = memberships.drop_duplicates(['股票代碼', '細產業'])
+        stock_rows, stock_codes = pd.factorize(memberships['股票代碼'].astype(str))
+        category_columns, categories = pd.factorize(memberships['細產業'].astype(str))
+
+        stock_names = memberships.groupby(stock_rows, sort=True)['股票名稱'].first().to_numpy()
+        main_categories = memberships.groupby(category_columns, sort=True)['主產業'].any().to_numpy()
+        stock_to_categories = sparse.csr_matrix(
+            (np.ones(len(memberships), dtype=np.int8), (stock_rows, category_columns)),
+            shape=(len(stock_codes), len(categories))
+        )
+        return cls(np.asarray(stock_codes), stock_names, np.asarray(categories), main_categories, stock_to_categories)
+
+    @classmethod
+    def refresh(cls, cache_path: str, spider: Optional[SubIndustrySpider] = None) -> 'SubIndustryTaxonomy':
+        """
+        重新抓取族群頁並更新快取。
+
+        :param cache_path: 細產業快取檔路徑（.npz）。
+        :param spider: SubIndustrySpider，未提供時使用預設設定。
+        :return: SubIndustryTaxonomy。
+        :raises ConnectionError: 總覽頁或所有族群頁都無法取得時拋出，快取檔不會被更動。
+        """
+        memberships = (spider or SubIndustrySpider()).fetch_memberships()
+        if memberships.empty:
+            # 總覽頁取得但所有族群頁都失敗時不覆寫既有快取
+            raise ConnectionError('族群頁皆無法取得，保留既有細產業快取')
+        taxonomy = cls.from_memberships(memberships)
+        taxonomy.save(cache_path)
+        return taxonomy
+
+    @classmethod
+    def load(cls, cache_path: str) -> 'SubIndustryTaxonomy':
+        """讀取 save 寫出的快取檔，正向與反向索引皆直接由檔案還原"""
+        with np.load(cache_path) as cache:
+            stock_count, category_count = len(cache['stock_codes']), len(cache['categories'])
+            stock_to_categories = sparse.csr_matrix(
+                (np.ones(len(cache['stock_indices']), dtype=np.int8), cache['stock_indices'], cache['stock_indptr']),
+                shape=(stock_count, category_count)
+            )
+            category_to_stocks = sparse.csr_matrix(
+                (np.ones(len(cache['category_indices']), dtype=np.int8), cache['category_indices'],
+                 cache['category_indptr']),
+                shape=(category_count, stock_count)
+            )
+            return cls(cache['stock_codes'], cache['stock_names'], cache['categories'], cache['main_categories'],
+                       stock_to_categories, category_to_stocks)
+
+    def save(self, cache_path: str) -> None:
+        """將正向與反向索引寫入同一個 npz 檔"""
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        tmp_path = f'{cache_path}.tmp.npz'
+        np.savez_compressed(
+            tmp_path,
+            stock_codes=self.stock_codes,
+            stock_names=self.stock_names,
+            categories=self.categories,
+            main_categories=self.main_categories,
+            stock_indptr=self.stock_to_categories.indptr.astype(np.int64),
+            stock_indices=self.stock_to_categories.indices.astype(np.int32),
+            category_indptr=self.category_to_stocks.indptr.astype(np.int64),
+            category_indices=self.category_to_stocks.indices.astype(np.int32),
+        )
+        os.replace(tmp_path, cache_path)
+
+    def categories_of(self, stock_code: str) -> List[str]:
+        """個股所屬的所有細產業"""
+        row = self._code_to_row.get(stock_code)
+        if row is None:
+            return []
+        columns = self.stock_to_categories.indices[
+            self.stock_to_categories.indptr[row]:self.stock_to_categories.indptr[row + 1]
+        ]
+        return self.categories[columns].tolist()
+
+    def stocks_of(self, category: str) -> np.ndarray:
+        """細產業的所有股票代碼"""
+        column = self._category_to_column.get(category)
+        if column is None:
+            return np.array([], dtype=str)
+        rows = self.category_to_stocks.indices[
+            self.category_to_stocks.indptr[column]:self.category_to_stocks.indptr[column + 1]
+        ]
+        return self.stock_codes[rows]
+
+    def indicator(self, security_master: SecurityMaster) -> sparse.csr_matrix:
+        """
+        依股票代碼把分類對應到主檔的 stock_id，產生 stock_id × 細產業 的 0/1 矩陣。
+        計數陣列左乘轉置矩陣即可得到各細產業的合計，成本與依 產業別 加總相同。
+
+        :param security_master: 股票主檔，主檔中沒有的股票會被略過。
+        :return: shape 為 (主檔股票數, 細產業數) 的 CSR 矩陣。
+        """
+        code_to_id = security_master.code_to_id
+        row_to_id = np.array([code_to_id.get(code, -1) for code in self.stock_codes.tolist()], dtype=np.int64)
+        memberships = self.stock_to_categories.tocoo()
+        stock_ids = row_to_id[memberships.row]
+        known = stock_ids >= 0
+        return sparse.csr_matrix(
+            (np.ones(known.sum(), dtype=np.float64), (stock_ids[known], memberships.col[known])),
+            shape=(len(security_master), len(self.categories))
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """展開為「細產業 - 個股」關係表"""
+        memberships = self.stock_to_categories.tocoo()
+        return pd.DataFrame({
+            '細產業': self.categories[memberships.col],
+            '主產業': self.main_categories[memberships.col],
+            '股票代碼': self.stock_codes[memberships.row],
+            '股票名稱': self.stock_names[memberships.row],
+        })
+
+    def __len__(self) -> int:
+        return len(self.categories)
+
+
+if __name__ == "__main__":
+    path_setting = PathSetting()
+    sub_industry_path = path_setting.get_files_path('sub_industry_path')
+
+    start = time.perf_counter()
+    taxonomy = SubIndustryTaxonomy.refresh(sub_industry_path)
+    print(f"fetch + build: {time.perf_counter() - start:.2f}s, {len(taxonomy)} categories, "
+          f"{len(taxonomy.stock_codes)} stocks, {taxonomy.stock_to_categories.nnz} memberships")
+    print("1101:", taxonomy.categories_of('1101'))
@@ -0,0 +1,105 @@
+import html
+import json
+import re
+import time
+from typing import Iterable, Optional
+
+try:
+    import opencc
+except ImportError:  # 繁簡轉換為選用功能，未安裝 opencc 時不影響其他正規化步驟
+    opencc = None
+
+# 區塊標籤以換行取代，保留段落邊界；行內標籤直接移除，避免把 <a>台積電</a> 這類詞拆開
+_BLOCK_TAGS = {"p", "br", "div", "li", "ul", "ol", "tr", "td", "th", "table",
+               "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "figure", "figcaption"}
+_TAG_PATTERN = re.compile(r"<\s*(/?)\s*([a-zA-Z][a-zA-Z0-9]*)[^>]*>")
+_COMMENT_PATTERN = re.compile(r"<!--.*?-->|<(script|style)\b.*?</\1\s*>", re.S | re.I)
+_SPACE_PATTERN = re.compile(r"[^\S\n]+")
+_NEWLINE_PATTERN = re.compile(r"\s*\n\s*")
+
+# 全形 ASCII（U+FF01 ~ U+FF5E）對應到半形，全形空白對應到一般空白
+_FULL_WIDTH_TABLE = {code_point: code_point - 0xFEE0 for code_point in range(0xFF01, 0xFF5F)}
+_FULL_WIDTH_TABLE[0x3000] = 0x20
+
+
+def _replace_tag(match: "re.Match") -> str:
+    return "\n" if match.group(2).lower() in _BLOCK_TAGS else ""
+
+
+class TextNormalizer:
+    # 正規化規則變動時遞增，讓依賴正規化結果的快取失效
+    version = "1"
+
+    def __init__(self, fold_variants: Optional[str] = None) -> None:
+        """
+        新聞文字正規化：HTML 反跳脫、移除標籤、全形轉半形、合併空白，並可選擇繁簡轉換。
+
+        :param fold_variants: opencc 轉換設定，例如 s2twp（簡體轉台灣繁體）；None 表示不轉換。
+        """
+        self.fold_variants = fold_variants
+        self._converter = None
+        if fold_variants:
+            if opencc is None:
+                raise ImportError("fold_variants requires the opencc package")
+            self._converter = opencc.OpenCC(fold_variants)
+
+    @property
+    def fingerprint(self) -> str:
+        """正規化設定的識別字串，納入快取版本"""
+        return f"normalizer-{self.version}-{self.fold_variants or 'none'}"
+
+    def normalize(self, text: Optional[str]) -> str:
+        """
+        正規化單段文字。
+
+        :param text: 原始文字，可為 HTML 跳脫過的內容（&lt;p&gt;...）。
+        :return: 正規化後的文字，段落以換行分隔。
+        """
+        if not text:
+            return ""
+
+        text = html.unescape(text)
+        if "<" in text:
+            text = _COMMENT_PATTERN.sub("", text)
+            text = _TAG_PATTERN.sub(_replace_tag, text)
+            # 標籤內可能還有 &nbsp; 等實體，移除標籤後再反跳脫一次
+            if "&" in text:
+                text = html.unescape(text)
+
+        text = text.translate(_FULL_WIDTH_TABLE)
+        if self._converter is not None:
+            text = self._converter.convert(text)
+
+        text = _SPACE_PATTERN.sub(" ", text)
+        return _NEWLINE_PATTERN.sub("\n", text).strip()
+
+    def normalize_article(self, article: dict) -> str:
+        """
+        將標題與內文正規化為單一 clean_text，標題與內文以換行分隔。
+
+        :param article: 新聞資料，使用 title 與 content 欄位。
+        :return: clean_text。
+        """
+        return f"{self.normalize(article.get('title'))}\n{self.normalize(article.get('content'))}"
+
+    def normalize_articles(self, articles: Iterable[dict]) -> None:
+        """為尚未正規化的新聞加上 clean_text 欄位，已有 clean_text 的新聞不會重複計算"""
+        for article in articles:
+            if article.get("clean_text") is None:
+                article["clean_text"] = self.normalize_article(article)
+
+
+if __name__ == "__main__":
+    with open("../data/processed/stock_news_extraction.json", "r", encoding="utf-8") as json_file:
+        all_news_data_json = json.load(json_file)
+
+    text_normalizer = TextNormalizer()
+    start = time.perf_counter()
+    clean_texts = [text_normalizer.normalize_article(article) for article in all_news_data_json]
+    seconds = time.perf_counter() - start
+
+    raw_length = sum(len(article.get("title", "")) + len(article.get("content", "")) for article in all_news_data_json)
+    clean_length = sum(len(clean_text) for clean_text in clean_texts)
+    print(f"articles: {len(all_news_data_json)}, normalize: {seconds:.3f}s")
+    print(f"characters: {raw_length} -> {clean_length} ({clean_length / raw_length:.1%})")
+    print(clean_texts[0][:200])
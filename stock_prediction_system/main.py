@@ -4,6 +4,7 @@ import pandas as pd
 import plotly.express as px
 from stock_war_room_system.controller.google_real_time_news import CnyesNewsSpider
 from stock_war_room_system.controller.stock_list import GetStockList
+from stock_war_room_system.controller.stock_matcher import StockMatcher
 from stock_war_room_system.utils.extract_path import PathSetting
 
 if __name__ == '__main__':
@@ -24,21 +25,14 @@ if __name__ == '__main__':
         end_time="2024-09-04 23:59:59"
     )
 
+    # 所有股票名稱與代碼只編譯一次，每篇文章線性掃描一次
+    stock_matcher = StockMatcher(stock_lists)
+
     # 儲存符合條件的股票和產業名稱出現次數
     stock_occurrences = []
 
     for article in all_news_data_json:
-        article_title = article.get("title", "")
-        article_content = article.get("content", "")
-        matched_stocks = set()  # 每篇文章中可能有多支股票匹配，用集合來避免重複
-
-        for _, row in stock_lists.iterrows():
-            stock_name = row["股票名稱"]
-            stock_code = row["股票代碼"]
-
-            # 將 title 和 content 的檢查合併，減少重複邏輯
-            if any(term in article_title or term in article_content for term in [stock_name, stock_code]):
-                matched_stocks.add((stock_name, stock_code, row["產業別"]))
+        matched_stocks = stock_matcher.match_article(article)  # 每篇文章中可能有多支股票匹配，用集合來避免重複
 
         # 將每篇文章中提到的股票累加至結果列表
         for stock_name, stock_code, industry in matched_stocks:
@@ -1,22 +1,88 @@
 from stock_prediction_system.controller.pipelines import Preflight
 from stock_prediction_system.controller.pipelines import stock_lists_download
+from stock_prediction_system.controller.pipelines import sub_industry_download
+from stock_prediction_system.controller.pipelines import daily_price_download
 from stock_prediction_system.controller.pipelines import stock_news_extraction
 from stock_prediction_system.controller.pipelines import count_stock_times_in_news
+from stock_prediction_system.controller.pipelines import build_mention_matrix
 from stock_prediction_system.controller.pipelines import plot_statistic_result
+from stock_prediction_system.controller.pipelines import stock_prediction
+from stock_prediction_system.controller.dag_runner import DagRunner
+from stock_prediction_system.utils.extract_path import PathSetting
+
+
+def count_step(all_news_data_json, *_):
+    # 除了統計結果，也輸出每篇文章的比對結果給 build_mention_matrix，以及每日與細產業統計給報表；
+    # 多來源轉載的同一則新聞只計一次；每篇比對結果同時送入提及異常偵測器，並以情緒詞典評分個股提及
+    counter = count_stock_times_in_news("count_stock_times_in_news", all_news_data_json, count_story_once=True,
+                                        detect_spikes=True, score_sentiment=True, keep_article_matches=True)
+    stock_counts = counter.execute()
+    aggregator = counter.aggregator
+    return stock_counts, counter.article_matches, aggregator.daily_frame(), aggregator.sub_industry_frame()
+
 
 if __name__ == '__main__':
 
     Preflight("Preflight").execute()
 
-    stock_lists_download("stock_lists_download").execute()
+    path_setting = PathSetting()
+    stocks_list_path = path_setting.get_files_path("stocks_list_path")
+    security_master_path = path_setting.get_files_path("security_master_path")
+    sub_industry_path = path_setting.get_files_path("sub_industry_path")
+    mention_matrix_path = path_setting.get_files_path("mention_matrix_path")
+    price_store_path = path_setting.get_files_path("price_store_path")
+    sentiment_lexicon_path = path_setting.get_files_path("sentiment_lexicon_path")
 
-    stock_news_extraction = stock_news_extraction("stock_news_extraction",
-                                                  start_time="2024-09-08 00:00:00",
-                                                  end_time="2024-09-08 23:59:59").execute()
+    # 指紋只涵蓋下列 lambda 與函式本身，修改 pipelines 中對應類別的實作後需調高該步驟的 version
+    dag_runner = DagRunner(path_setting.get_files_path("step_cache_path"))
 
-    statistic_result = count_stock_times_in_news("count_stock_times_in_news", stock_news_extraction).execute()
+    # 上市櫃清單很少變動，一天內重複執行直接使用快取；與新聞抓取互不相依，會並行執行
+    dag_runner.add_step("stock_lists_download",
+                        lambda: stock_lists_download("stock_lists_download").execute(),
+                        output_files=[stocks_list_path, security_master_path], ttl_seconds=24 * 60 * 60, version=1)
 
-    plot_statistic_result("plot_statistic_result", statistic_result).execute()
+    # 細產業族群變動更少，一週更新一次；網站無法連線時沿用上次的檔案，不中斷新聞統計
+    dag_runner.add_step("sub_industry_download",
+                        lambda: sub_industry_download("sub_industry_download").execute(),
+                        output_files=[sub_industry_path], ttl_seconds=7 * 24 * 60 * 60, version=1)
 
-    print("process done")
+    # 收盤資料一天更新一次，與新聞抓取互不相依
+    dag_runner.add_step("daily_price_download",
+                        lambda: daily_price_download("daily_price_download").execute(),
+                        output_files=[price_store_path], ttl_seconds=24 * 60 * 60, version=1)
+
+    # 所有新聞來源共用連線池並行抓取，跨來源重複的文章只保留一篇
+    dag_runner.add_step("stock_news_extraction",
+                        lambda start_time, end_time, sources: stock_news_extraction("stock_news_extraction",
+                                                                                    start_time=start_time,
+                                                                                    end_time=end_time,
+                                                                                    sources=sources).execute(),
+                        params={"start_time": "2024-09-08 00:00:00", "end_time": "2024-09-08 23:59:59",
+                                "sources": ["cnyes", "anue", "udn", "ctee", "cmoney"]},
+                        version=1)
+
+    # 股票主檔、細產業分類與情緒詞典納入指紋，更新後才會重新統計
+    dag_runner.add_step("count_stock_times_in_news", count_step,
+                        depends_on=["stock_news_extraction", "stock_lists_download", "sub_industry_download"],
+                        input_files=[security_master_path, sub_industry_path, sentiment_lexicon_path], version=1)
 
+    dag_runner.add_step("build_mention_matrix",
+                        lambda count_result: build_mention_matrix("build_mention_matrix", count_result[1]).execute(),
+                        depends_on=["count_stock_times_in_news"], output_files=[mention_matrix_path], version=1)
+
+    # 報表輸出到以日期命名的資料夾，排程環境不需顯示器
+    dag_runner.add_step("plot_statistic_result",
+                        lambda count_result: plot_statistic_result("plot_statistic_result", count_result[0],
+                                                                   daily_counts=count_result[2],
+                                                                   sub_industry_counts=count_result[3]).execute(),
+                        depends_on=["count_stock_times_in_news"], cache=False)
+
+    # 模型與價格庫、提及矩陣都在磁碟上，每次執行都重新評分；模型依訓練資料新舊決定是否重新訓練
+    dag_runner.add_step("stock_prediction",
+                        lambda *_: stock_prediction("stock_prediction").execute(),
+                        depends_on=["build_mention_matrix", "daily_price_download"], cache=False)
+
+    dag_runner.run()
+    print(dag_runner.report())
+
+    print("process done")
@@ -0,0 +1,59 @@
+import json
+import logging
+import os
+
+
+class IngestionStateStore:
+    def __init__(self, state_path='../data/processed/ingestion_state.json'):
+        """記錄每個新聞來源已匯入的最新位置（high-water mark）"""
+        self.state_path = state_path
+        self.state = self.load_state()
+
+    def load_state(self):
+        """讀取狀態檔，不存在時回傳空狀態"""
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def save_state(self):
+        """先寫入暫存檔再覆蓋，避免中斷時留下損毀的狀態檔"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.state, file, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.state_path)
+
+    def get_high_water_mark(self, source):
+        """
+        取得來源的 high-water mark。
+
+        :param source: 新聞來源名稱，例如 cnyes
+        :return: {"publish_at": 最新發佈時間（格式：'YYYY-MM-DD HH:MM:SS'）, "news_ids": 該時間點已匯入的 newsId}，尚未匯入過則為 None
+        """
+        return self.state.get(source)
+
+    def update_high_water_mark(self, source, news_data_list):
+        """
+        以新匯入的新聞更新來源的 high-water mark，並寫回狀態檔。
+
+        :param source: 新聞來源名稱
+        :param news_data_list: 新匯入的新聞，需包含 news_id 與 publish_at
+        """
+        if not news_data_list:
+            return
+
+        latest_publish_at = max(news_data['publish_at'] for news_data in news_data_list)
+        latest_news_ids = [news_data['news_id'] for news_data in news_data_list
+                           if news_data['publish_at'] == latest_publish_at]
+
+        high_water_mark = self.state.get(source)
+        if high_water_mark and high_water_mark['publish_at'] > latest_publish_at:
+            return
+        if high_water_mark and high_water_mark['publish_at'] == latest_publish_at:
+            # 同一秒發佈的新聞可能分兩次匯入，保留所有已見過的 newsId
+            latest_news_ids = sorted(set(high_water_mark['news_ids']) | set(latest_news_ids))
+
+        self.state[source] = {"publish_at": latest_publish_at, "news_ids": latest_news_ids}
+        self.save_state()
+        logging.info(f"Updated high-water mark of {source}: {self.state[source]}")
@@ -0,0 +1,117 @@
+import logging
+import os
+import sqlite3
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+
+class MatchCacheStore:
+    # SQLite 單一查詢可使用的參數數量有限，IN 查詢分批進行
+    query_batch_size = 500
+
+    def __init__(self, db_path='../data/cache/match_cache.sqlite', matcher_version=''):
+        """
+        以 SQLite 保存每篇文章的股票比對結果，鍵值為 news_id，並以內容指紋判斷文章是否被修改過。
+        matcher_version（例如股票主檔版本）改變時，整個快取自動失效。
+
+        :param db_path: SQLite 檔案路徑
+        :param matcher_version: 比對器版本，與快取內記錄的版本不同時清空快取
+        """
+        self.db_path = db_path
+        self.matcher_version = matcher_version
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(matches)")]
+        if columns and "weights" not in columns:
+            # 舊版快取沒有權重欄位，快取可隨時重建，直接捨棄
+            self.connection.execute("DROP TABLE matches")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS matches ("
+            "news_id INTEGER PRIMARY KEY, content_hash TEXT NOT NULL, stock_ids BLOB NOT NULL, weights BLOB NOT NULL)"
+        )
+        self._ensure_version()
+
+    def _ensure_version(self):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'matcher_version'").fetchone()
+        if row is not None and row[0] == self.matcher_version:
+            return
+
+        with self.connection:
+            if row is not None:
+                logging.info(f"Matcher version changed ({row[0]} -> {self.matcher_version}), clearing match cache")
+            self.connection.execute("DELETE FROM matches")
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('matcher_version', ?)",
+                                    (self.matcher_version,))
+
+    def get_many(self, keys: Iterable[Tuple[int, str]]) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """
+        批次查詢比對結果，只回傳 news_id 存在且內容指紋相同的文章。
+
+        :param keys: (news_id, content_hash) 列表
+        :return: news_id -> (stock_id 陣列, 權重陣列)
+        """
+        keys = list(keys)
+        content_hashes = dict(keys)
+        cached: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+        news_ids = list(content_hashes)
+        for start in range(0, len(news_ids), self.query_batch_size):
+            batch = news_ids[start:start + self.query_batch_size]
+            rows = self.connection.execute(
+                "SELECT news_id, content_hash, stock_ids, weights FROM matches "
+                f"WHERE news_id IN ({','.join('?' * len(batch))})",
+                batch
+            )
+            for news_id, content_hash, stock_ids, weights in rows:
+                if content_hashes[news_id] == content_hash:
+                    cached[news_id] = (np.frombuffer(stock_ids, dtype=np.int32).astype(np.int64),
+                                       np.frombuffer(weights, dtype=np.float32).astype(np.float64))
+
+        self.hits += len(cached)
+        self.misses += len(keys) - len(cached)
+        return cached
+
+    def put_many(self, rows: Iterable[Tuple[int, str, np.ndarray, np.ndarray]]):
+        """
+        批次寫入比對結果，已存在的 news_id 會被覆蓋。
+
+        :param rows: (news_id, content_hash, stock_ids, weights) 列表
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO matches (news_id, content_hash, stock_ids, weights) VALUES (?, ?, ?, ?)",
+                [(news_id, content_hash, np.asarray(stock_ids, dtype=np.int32).tobytes(),
+                  np.asarray(weights, dtype=np.float32).tobytes())
+                 for news_id, content_hash, stock_ids, weights in rows]
+            )
+
+    def stats(self) -> Dict[str, float]:
+        """
+        目前連線期間的命中統計。
+
+        :return: {"hits", "misses", "hit_rate", "entries"}
+        """
+        lookups = self.hits + self.misses
+        entries = self.connection.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from stock_prediction_system.utils.hashing import NEWS_CONTENT_FIELDS, content_fingerprint
+
+NEWS_SCHEMA = pa.schema([
+    ("news_id", pa.int64()),
+    ("url", pa.string()),
+    ("title", pa.string()),
+    ("content", pa.string()),
+    ("summary", pa.string()),
+    ("keyword", pa.list_(pa.string())),
+    ("publish_at", pa.string()),
+    ("category_name", pa.string()),
+    ("category_id", pa.int64()),
+    # 匯入時正規化的標題與內文（去除 HTML、全形轉半形），比對與後續 NLP 直接使用
+    ("clean_text", pa.string()),
+    # 新聞來源（cnyes、anue、udn、ctee、cmoney），多來源匯入前寫入的分區為 null
+    ("source", pa.string()),
+    # 近似重複新聞的群組 ID（同一則新聞第一篇的 news_id），未標記時為 null
+    ("cluster_id", pa.int64()),
+])
+
+PARTITION_SCHEMA = pa.schema([("publish_date", pa.string())])
+
+
+class NewsParquetStore:
+    def __init__(self, root_path='../data/processed/news_store', compression='zstd'):
+        """
+        以發佈日期分區的 Parquet 新聞儲存庫，每個分區為 publish_date=YYYY-MM-DD 資料夾。
+
+        :param root_path: 儲存庫根目錄
+        :param compression: Parquet 壓縮演算法，文字欄位以 zstd 壓縮
+        """
+        self.root_path = root_path
+        self.compression = compression
+        self.partitioning = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+
+    def _partition_path(self, publish_date):
+        return os.path.join(self.root_path, f"publish_date={publish_date}")
+
+    def _dataset(self):
+        return ds.dataset(self.root_path, format="parquet", schema=NEWS_SCHEMA.append(PARTITION_SCHEMA.field(0)),
+                          partitioning=self.partitioning)
+
+    def _partition_files(self, publish_date):
+        partition_path = self._partition_path(publish_date)
+        return [os.path.join(partition_path, file_name) for file_name in os.listdir(partition_path)
+                if file_name.endswith(".parquet")]
+
+    def _write_partition_file(self, publish_date, table):
+        partition_path = self._partition_path(publish_date)
+        os.makedirs(partition_path, exist_ok=True)
+        file_path = os.path.join(partition_path, f"part-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.parquet")
+        pq.write_table(table, file_path, compression=self.compression, use_dictionary=["category_name", "keyword"])
+        return file_path
+
+    def _existing_fingerprints(self, publish_date):
+        """只讀取單一分區判斷內容所需的欄位，回傳 news_id -> 內容指紋，用於 append 時去重與偵測編輯過的新聞"""
+        partition_path = self._partition_path(publish_date)
+        if not os.path.isdir(partition_path):
+            return {}
+        table = ds.dataset(partition_path, format="parquet", schema=NEWS_SCHEMA).to_table(
+            columns=["news_id", *NEWS_CONTENT_FIELDS])
+        return {news_data["news_id"]: content_fingerprint(news_data) for news_data in table.to_pylist()}
+
+    def _replace_news(self, publish_date, table):
+        """以 table 取代分區內相同 news_id 的舊資料，整個分區改寫為一個檔案"""
+        files = self._partition_files(publish_date)
+        kept = ds.dataset(files, format="parquet", schema=NEWS_SCHEMA).to_table()
+        kept = kept.filter(pc.invert(pc.is_in(kept.column("news_id"), value_set=table.column("news_id"))))
+        self._write_partition_file(publish_date,
+                                   pa.concat_tables([kept, table]).sort_by([("publish_at", "descending")]))
+        for file_path in files:
+            os.remove(file_path)
+
+    def append(self, news_data_list):
+        """
+        追加新聞至對應日期分區。已存在且內容（NEWS_CONTENT_FIELDS）相同的 news_id 會略過；
+        內容不同時視為編輯過的新聞，以新的內容取代分區內的舊資料（後寫入者為準），
+        下游的比對快取才會因 clean_text 改變而重新比對。發佈時間改到其他日期時，舊日期分區的資料不會刪除。
+
+        :param news_data_list: 新聞資料列表，格式同 CnyesNewsSpider.parse_news
+        :return: 實際寫入（新增或取代）的新聞數量
+        """
+        partitions = {}
+        for news_data in news_data_list:
+            partitions.setdefault(news_data["publish_at"][:10], []).append(news_data)
+
+        written_count = 0
+        for publish_date, partition_news in partitions.items():
+            existing_fingerprints = self._existing_fingerprints(publish_date)
+            new_news = {}
+            for news_data in partition_news:
+                stored_fingerprint = existing_fingerprints.get(news_data["news_id"])
+                if stored_fingerprint is None or stored_fingerprint != content_fingerprint(news_data):
+                    new_news[news_data["news_id"]] = news_data
+            if not new_news:
+                continue
+
+            table = pa.Table.from_pylist(
+                [{field: news_data.get(field) for field in NEWS_SCHEMA.names} for news_data in new_news.values()],
+                schema=NEWS_SCHEMA
+            )
+            if any(news_id in existing_fingerprints for news_id in new_news):
+                self._replace_news(publish_date, table)
+            else:
+                # 只有新文章時維持追加寫入，不需改寫既有檔案
+                self._write_partition_file(publish_date, table)
+            written_count += len(new_news)
+
+        logging.info(f"Appended {written_count} news to {self.root_path}")
+        return written_count
+
+    def read_table(self, start_time=None, end_time=None, category_ids=None, columns=None):
+        """
+        依條件讀取新聞，只會掃描符合日期的分區與指定的欄位。
+
+        :param start_time: 起始時間（格式：'YYYY-MM-DD HH:MM:SS'）
+        :param end_time: 結束時間（格式：'YYYY-MM-DD HH:MM:SS'）
+        :param category_ids: 只讀取指定的 category_id
+        :param columns: 要讀取的欄位，預設為全部欄位
+        :return: pyarrow.Table
+        """
+        columns = columns or NEWS_SCHEMA.names
+        if not os.path.isdir(self.root_path):
+            return NEWS_SCHEMA.empty_table().select(columns)
+
+        dataset = self._dataset()
+        filters = []
+        # publish_date 為分區欄位，條件會直接排除不需要的資料夾；publish_at 則利用 row group 統計值過濾
+        if start_time:
+            filters.append(ds.field("publish_date") >= start_time[:10])
+            filters.append(ds.field("publish_at") >= start_time)
+        if end_time:
+            filters.append(ds.field("publish_date") <= end_time[:10])
+            filters.append(ds.field("publish_at") <= end_time)
+        if category_ids is not None:
+            filters.append(ds.field("category_id").isin(list(category_ids)))
+
+        expression = None
+        for condition in filters:
+            expression = condition if expression is None else expression & condition
+
+        return dataset.to_table(columns=columns, filter=expression)
+
+    def read_news(self, start_time=None, end_time=None, category_ids=None, columns=None):
+        """依條件讀取新聞，回傳與爬蟲相同格式的 dict 列表，由新到舊排列"""
+        table = self.read_table(start_time=start_time, end_time=end_time, category_ids=category_ids, columns=columns)
+        if "publish_at" in table.column_names:
+            table = table.sort_by([("publish_at", "descending")])
+        return table.to_pylist()
+
+    def compact(self, publish_date):
+        """將單一分區內多次 append 產生的小檔案合併為一個檔案"""
+        files = self._partition_files(publish_date)
+        if len(files) <= 1:
+            return
+
+        table = ds.dataset(files, format="parquet", schema=NEWS_SCHEMA).to_table()
+        table = table.sort_by([("publish_at", "descending")])
+        compacted_path = self._write_partition_file(publish_date, table)
+        for file_path in files:
+            os.remove(file_path)
+        logging.info(f"Compacted {len(files)} files of {publish_date} into {compacted_path}")
+
+    def list_partitions(self, start_date=None, end_date=None):
+        """列出儲存庫中已有的日期分區"""
+        if not os.path.isdir(self.root_path):
+            return []
+        publish_dates = sorted(name.split("=", 1)[1] for name in os.listdir(self.root_path)
+                               if name.startswith("publish_date="))
+        if start_date:
+            publish_dates = [publish_date for publish_date in publish_dates if publish_date >= start_date]
+        if end_date:
+            publish_dates = [publish_date for publish_date in publish_dates if publish_date <= end_date]
+        return publish_dates
+
+
+if __name__ == "__main__":
+    news_store = NewsParquetStore()
+    with open("../data/processed/stock_news_extraction.json", "r", encoding="utf-8") as json_file:
+        news_store.append(json.load(json_file))
+
+    print(news_store.list_partitions())
+    print(news_store.read_table(columns=["title", "content"]).num_rows)
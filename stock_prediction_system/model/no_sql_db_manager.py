@@ -1,10 +1,15 @@
 import logging
-from pymongo import MongoClient
-from pymongo.errors import PyMongoError
+from pymongo import MongoClient, UpdateOne, ASCENDING
+from pymongo.errors import PyMongoError, BulkWriteError
 from bson.objectid import ObjectId
 import yaml
 import json
 
+from stock_prediction_system.utils.hashing import content_fingerprint
+
+# 重複鍵錯誤代碼
+DUPLICATE_KEY_ERROR = 11000
+
 # MongoDBManager 定義部分
 class ConfigLoader:
     def __init__(self, config_path='D:\python_workspace\Sunny_side_project\stock_war_room_system\config\config.yaml'):
@@ -23,57 +28,89 @@ class MongoDBManager:
         self.db_name = config['database']['mongodb']['name']
         self.client = MongoClient(self.uri)
         self.db = self.client[self.db_name]
+        self._indexed_collections = set()
 
     def get_collection(self, collection_name):
         """取得 MongoDB 集合"""
         return self.db[collection_name]
 
-    def create_many_with_deduplication(self, collection_name, data_list):
+    def ensure_news_indexes(self, collection_name, fingerprint_field="content_fingerprint"):
+        """建立 news_id 與內容指紋的唯一索引，同一個集合只建立一次"""
+        if collection_name in self._indexed_collections:
+            return
+        collection = self.get_collection(collection_name)
+        collection.create_index([("news_id", ASCENDING)], unique=True)
+        # 舊資料沒有指紋欄位，唯一索引會把缺欄位視為 null 而互相衝突，只對有指紋的文件建立唯一性
+        collection.create_index([(fingerprint_field, ASCENDING)], unique=True,
+                                partialFilterExpression={fingerprint_field: {"$exists": True}})
+        self._indexed_collections.add(collection_name)
+
+    def bulk_upsert_with_fingerprint(self, collection_name, data_list, batch_size=1000,
+                                     fingerprint_field="content_fingerprint"):
         """
-        批量插入資料，並處理以下兩種情況：
-        1. 資料有唯一值（如 news_id）。
-        2. 資料內容完全相同的重複資料。
+        批量匯入資料，以唯一索引去重：
+        1. news_id 已存在的資料不會覆寫。
+        2. 內容指紋（url、title、content、keyword、publish_at 的 sha256）已存在的資料視為重複。
+
+        :param collection_name: 集合名稱
+        :param data_list: 要匯入的資料
+        :param batch_size: 每次 bulk_write 的筆數
+        :param fingerprint_field: 儲存內容指紋的欄位名稱
+        :return: {"inserted": 新增筆數, "duplicates": 重複筆數, "inserted_ids": 新增文件的 _id}
         """
         try:
             collection = self.get_collection(collection_name)
-
-            # 1. 檢查重複的 news_id
-            existing_news_ids = collection.find(
-                {"news_id": {"$in": [data['news_id'] for data in data_list]}},
-                {"news_id": 1}
-            )
-            existing_ids = {doc['news_id'] for doc in existing_news_ids}
-
-            # 過濾掉已存在的 news_id 的資料
-            new_data_list = [data for data in data_list if data['news_id'] not in existing_ids]
-
-            # 2. 檢查資料內容完全相同的情況
-            for data in new_data_list[:]:  # 使用切片來創建副本，以免在迴圈中修改
-                existing_doc = collection.find_one({
-                    "url": data['url'],
-                    "title": data['title'],
-                    "content": data['content'],
-                    "keyword": data['keyword'],
-                    "publish_at": data['publish_at']
-                })
-                if existing_doc:
-                    logging.info(f"Duplicated document found with same content: {data['url']}")
-                    new_data_list.remove(data)
-
-            # 插入去重後的資料
-            if new_data_list:
-                result = collection.insert_many(new_data_list)
-                logging.info(f"Inserted new MongoDB document IDs: {result.inserted_ids}")
-                return [str(inserted_id) for inserted_id in result.inserted_ids]
-            else:
-                logging.info(
-                    "No new documents to insert. All provided documents are either duplicates or already exist.")
-                return []
+            self.ensure_news_indexes(collection_name, fingerprint_field)
+
+            inserted_ids = []
+            duplicates = 0
+            for batch_start in range(0, len(data_list), batch_size):
+                batch = data_list[batch_start:batch_start + batch_size]
+                operations = [
+                    UpdateOne(
+                        {"news_id": data["news_id"]},
+                        {"$setOnInsert": {**data, fingerprint_field: content_fingerprint(data)}},
+                        upsert=True
+                    )
+                    for data in batch
+                ]
+
+                try:
+                    # unordered：單筆重複不會中斷同批次其他資料的寫入
+                    result = collection.bulk_write(operations, ordered=False)
+                    upserted_ids = list(result.upserted_ids.values())
+                except BulkWriteError as e:
+                    other_errors = [error for error in e.details["writeErrors"]
+                                    if error["code"] != DUPLICATE_KEY_ERROR]
+                    if other_errors:
+                        raise
+                    upserted_ids = [upserted["_id"] for upserted in e.details.get("upserted", [])]
+
+                inserted_ids.extend(upserted_ids)
+                duplicates += len(batch) - len(upserted_ids)
+
+            logging.info(f"Bulk upserted {len(inserted_ids)} documents, skipped {duplicates} duplicates.")
+            return {"inserted": len(inserted_ids), "duplicates": duplicates,
+                    "inserted_ids": [str(inserted_id) for inserted_id in inserted_ids]}
 
         except PyMongoError as e:
-            logging.error(f"MongoDB batch insertion error with deduplication: {e}")
+            logging.error(f"MongoDB bulk upsert error: {e}")
             raise
 
+    def create_many_with_deduplication(self, collection_name, data_list):
+        """
+        批量插入資料，並處理以下兩種情況：
+        1. 資料有唯一值（如 news_id）。
+        2. 資料內容完全相同的重複資料。
+
+        去重改由唯一索引與 bulk upsert 處理，回傳新增文件的 ID。
+        """
+        result = self.bulk_upsert_with_fingerprint(collection_name, data_list)
+        if not result["inserted_ids"]:
+            logging.info(
+                "No new documents to insert. All provided documents are either duplicates or already exist.")
+        return result["inserted_ids"]
+
     def find_with_filter(self, collection_name, filter_criteria):
         """批量查詢文件"""
         try:
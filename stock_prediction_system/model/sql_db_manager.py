@@ -1,5 +1,13 @@
+import csv
+import io
 import logging
-from psycopg2 import connect, DatabaseError
+import threading
+import time
+from contextlib import contextmanager
+from psycopg2 import DatabaseError, sql
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 import yaml
 
 class ConfigLoader:
@@ -12,22 +20,84 @@ class ConfigLoader:
         return config
 
 class PostgreSQLManager:
-    def __init__(self, config):
+    # 同一個資料庫設定共用一個連線池，跨 PostgreSQLManager 實例與執行緒重複使用連線
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, config, minconn=1, maxconn=10, acquire_timeout=30.0):
+        """
+        每個執行緒應使用各自的 PostgreSQLManager 實例，連線則由共用的連線池取得。
+        連線池在第一次取得連線時才建立，建立實例不會連線資料庫。
+
+        :param config: 設定檔內容
+        :param minconn: 連線池最少保留的連線數
+        :param maxconn: 連線池最多的連線數
+        :param acquire_timeout: 連線池用盡時等待其他執行緒歸還連線的秒數，逾時拋出 PoolError
+        """
         self.db_name = config['database']['postgres']['name']
         self.user = config['database']['postgres']['user']
         self.password = config['database']['postgres']['password']
+        self.host = config['database']['postgres'].get('host', 'localhost')
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self._pool = None
         self.conn = None
+        self._in_transaction = False
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = self._get_pool(self.minconn, self.maxconn)
+        return self._pool
+
+    def _get_pool(self, minconn, maxconn):
+        pool_key = (self.host, self.db_name, self.user)
+        with self._pools_lock:
+            if pool_key not in self._pools:
+                self._pools[pool_key] = ThreadedConnectionPool(
+                    minconn, maxconn,
+                    host=self.host,
+                    database=self.db_name,
+                    user=self.user,
+                    password=self.password
+                )
+                logging.info(f"PostgreSQL connection pool created for {pool_key}.")
+            return self._pools[pool_key]
+
+    @classmethod
+    def close_all_pools(cls):
+        """關閉所有連線池，通常在程式結束時呼叫"""
+        with cls._pools_lock:
+            for pool in cls._pools.values():
+                pool.closeall()
+            cls._pools.clear()
+
+    def _getconn(self):
+        # ThreadedConnectionPool 用盡時直接拋出 PoolError 而不等待，這裡以遞增間隔重試到 acquire_timeout 為止
+        deadline = time.monotonic() + self.acquire_timeout
+        retry_interval = 0.05
+        while True:
+            try:
+                return self.pool.getconn()
+            except PoolError:
+                if self.pool.closed:
+                    raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError(
+                        f"PostgreSQL connection pool for {(self.host, self.db_name, self.user)} exhausted: "
+                        f"all {self.maxconn} connections still in use after waiting {self.acquire_timeout}s. "
+                        f"Make sure every PostgreSQLManager is used as a context manager, or raise maxconn."
+                    ) from None
+                time.sleep(min(retry_interval, remaining))
+                retry_interval = min(retry_interval * 2, 1.0)
 
     def __enter__(self):
         try:
-            self.conn = connect(
-                host="localhost",
-                database=self.db_name,
-                user=self.user,
-                password=self.password
-            )
+            self.conn = self._getconn()
             self.cursor = self.conn.cursor()
-            logging.info("PostgreSQL connection opened.")
+            logging.info("PostgreSQL connection acquired from pool.")
         except DatabaseError as e:
             logging.error(f"PostgreSQL connection error: {e}")
             raise
@@ -35,24 +105,112 @@ class PostgreSQLManager:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.conn:
-            self.conn.close()
-            logging.info("PostgreSQL connection closed.")
+            # 未提交的交易一律還原，避免把髒狀態的連線還回連線池
+            if exc_type or self.conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                self.conn.rollback()
+            self.cursor.close()
+            self.pool.putconn(self.conn)
+            self.conn = None
+            logging.info("PostgreSQL connection returned to pool.")
+
+    @contextmanager
+    def transaction(self):
+        """明確的交易範圍：區塊內的語句不逐筆提交，離開區塊時一次提交，發生例外則還原"""
+        self._in_transaction = True
+        try:
+            yield self
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+
+    def _commit(self):
+        if not self._in_transaction:
+            self.conn.commit()
 
     def execute_query(self, query, params=None):
-        """執行傳入的 SQL 查詢並處理參數化查詢"""
+        """執行傳入的 SQL 查詢並處理參數化查詢，交易範圍內不逐筆提交"""
         try:
             self.cursor.execute(query, params)
-            if query.strip().lower().startswith("select"):
+            if self.cursor.description is not None:
                 results = self.cursor.fetchall()
                 logging.info(f"Query returned {len(results)} results.")
+                self._commit()
                 return results
             else:
-                self.conn.commit()
+                self._commit()
                 logging.info(f"Query executed: {query}")
         except DatabaseError as e:
             logging.error(f"PostgreSQL query error: {e}")
             raise
 
+    def insert_many(self, table_name, rows, page_size=1000):
+        """
+        以 execute_values 批次寫入，多筆資料合併成一條 INSERT 語句。
+
+        :param table_name: 表名稱
+        :param rows: dict 列表，所有 dict 的 key 需相同
+        :param page_size: 每條 INSERT 語句包含的筆數
+        :return: 寫入筆數
+        """
+        if not rows:
+            return 0
+        columns = list(rows[0].keys())
+        query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+            sql.Identifier(table_name), sql.SQL(', ').join(map(sql.Identifier, columns))
+        )
+        try:
+            execute_values(self.cursor, query.as_string(self.conn),
+                           [tuple(row[column] for column in columns) for row in rows], page_size=page_size)
+            self._commit()
+            logging.info(f"Inserted {len(rows)} rows into {table_name}.")
+            return len(rows)
+        except DatabaseError as e:
+            logging.error(f"PostgreSQL batch insert error: {e}")
+            raise
+
+    def copy_dataframe(self, table_name, df):
+        """
+        以 COPY FROM STDIN 寫入 DataFrame，適合大量資料（例如每日股票提及次數）。
+
+        :param table_name: 表名稱，欄位名稱需與 DataFrame 欄位相同
+        :param df: 要寫入的 DataFrame
+        :return: 寫入筆數
+        """
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False, quoting=csv.QUOTE_MINIMAL)
+        buffer.seek(0)
+        query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+            sql.Identifier(table_name), sql.SQL(', ').join(map(sql.Identifier, df.columns))
+        )
+        try:
+            self.cursor.copy_expert(query.as_string(self.conn), buffer)
+            self._commit()
+            logging.info(f"Copied {len(df)} rows into {table_name}.")
+            return len(df)
+        except DatabaseError as e:
+            logging.error(f"PostgreSQL copy error: {e}")
+            raise
+
+    def stream_query(self, query, params=None, itersize=2000):
+        """
+        以 server-side cursor 串流讀取查詢結果，每次只從資料庫取回 itersize 筆。
+
+        :param query: SELECT 語句
+        :param params: 查詢參數
+        :param itersize: 每次取回的筆數
+        :return: 逐筆資料的 generator
+        """
+        # server-side cursor 只能存在於交易中，讀完後才結束交易
+        with self.conn.cursor(name=f"stream_{id(self)}_{threading.get_ident()}") as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query, params)
+            for row in cursor:
+                yield row
+        self._commit()
+
     def create_table(self, table_name, columns):
         """根據動態傳入的表名稱和欄位資訊創建表"""
         columns_str = ', '.join([f"{col} {dtype}" for col, dtype in columns.items()])
@@ -123,3 +281,10 @@ if __name__ == "__main__":
 
         postgres_manager.delete_data('employees', {'id': new_employee_id})
 
+        # 批次寫入：整批資料在同一個交易內完成
+        with postgres_manager.transaction():
+            postgres_manager.insert_many('employees', [{'name': f'user_{i}', 'age': 20 + i % 40} for i in range(10000)])
+
+        for employee in postgres_manager.stream_query("SELECT id, name FROM employees WHERE age > %s;", (50,)):
+            logging.info(f"Streamed PostgreSQL employee: {employee}")
+
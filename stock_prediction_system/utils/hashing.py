@@ -0,0 +1,19 @@
+import hashlib
+import json
+
+# 判斷新聞內容是否相同時使用的欄位
+NEWS_CONTENT_FIELDS = ("url", "title", "content", "keyword", "publish_at")
+# 股票比對只掃描正規化後的標題與內文，其他欄位變動不影響比對結果
+MATCH_CONTENT_FIELDS = ("clean_text",)
+
+
+def content_fingerprint(document, fields=NEWS_CONTENT_FIELDS):
+    """
+    將文件指定欄位序列化後計算 sha256，內容完全相同的文件會得到相同的指紋。
+
+    :param document: 文件 dict
+    :param fields: 納入指紋的欄位
+    :return: sha256 十六進位字串
+    """
+    payload = json.dumps([document.get(field) for field in fields], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,27 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+ROOT_PATH = Path(__file__).resolve().parents[1]
+DATA_PATH = ROOT_PATH / "data"
+
+
+@pytest.fixture(scope="session")
+def stock_lists():
+    """上市且有產業別的股票，與 count_stock_times_in_news 的預設比對範圍相同"""
+    stock_list_all = pd.read_csv(DATA_PATH / "feature" / "stocks_list.csv", encoding="utf-8-sig")
+    return stock_list_all[(stock_list_all["市場別"] == "上市") & pd.notna(stock_list_all["產業別"])]
+
+
+@pytest.fixture(scope="session")
+def sample_news():
+    with open(DATA_PATH / "processed" / "stock_news_extraction.json", "r", encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+
+@pytest.fixture(scope="session")
+def mention_labels():
+    with open(DATA_PATH / "processed" / "stock_mention_labels.json", "r", encoding="utf-8") as json_file:
+        return json.load(json_file)
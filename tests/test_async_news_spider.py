@@ -0,0 +1,179 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from aiohttp import web
+
+from stock_prediction_system.controller.async_news_spider import AsyncCnyesNewsSpider, TokenBucket
+
+
+def _acquire_times(rate, capacity, count):
+    async def acquire_all():
+        bucket = TokenBucket(rate=rate, capacity=capacity)
+        start = time.monotonic()
+        acquired_at = []
+        for _ in range(count):
+            await bucket.acquire()
+            acquired_at.append(time.monotonic() - start)
+        return acquired_at
+
+    return asyncio.run(acquire_all())
+
+
+def test_token_bucket_allows_burst_then_limits_rate():
+    rate, capacity, count = 50.0, 5, 30
+    acquired_at = _acquire_times(rate, capacity, count)
+
+    # 桶內原有的令牌立即放行，其餘依 rate 補充，總時間約為 (count - capacity) / rate
+    assert acquired_at[capacity - 1] < 0.05
+    expected_seconds = (count - capacity) / rate
+    assert expected_seconds * 0.9 <= acquired_at[-1] <= expected_seconds * 1.5
+
+
+def test_token_bucket_rate_is_shared_by_concurrent_tasks():
+    async def acquire_concurrently():
+        bucket = TokenBucket(rate=40.0, capacity=1)
+        start = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(21)))
+        return time.monotonic() - start
+
+    # 多個協程共用同一個桶，整體速率仍不超過 rate
+    assert asyncio.run(acquire_concurrently()) >= 20 / 40.0 * 0.9
+
+
+class StubNewsApi:
+    """
+    以 aiohttp.web 模擬鉅亨網新聞列表 API，在背景執行緒執行，同步與非同步介面皆可直接抓取。
+
+    :param pages: 頁數 -> 該頁新聞列表
+    :param statuses: 頁數 -> 成功前依序回傳的錯誤狀態碼
+    :param delays: 頁數 -> 回應前等待的秒數，讓並行請求以亂序完成
+    """
+
+    def __init__(self, pages, statuses=None, delays=None):
+        self.pages = pages
+        self.statuses = {page: list(page_statuses) for page, page_statuses in (statuses or {}).items()}
+        self.delays = delays or {}
+        self.requests = []  # (頁數, 收到請求的時間)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.base_url = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    async def newslist(self, request):
+        page = int(request.query["page"])
+        self.requests.append((page, time.monotonic()))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(page, 0))
+            if self.statuses.get(page):
+                return web.Response(status=self.statuses[page].pop(0))
+            return web.json_response({"items": {"total": sum(len(news) for news in self.pages.values()),
+                                                "last_page": len(self.pages), "data": self.pages[page]}})
+        finally:
+            self.in_flight -= 1
+
+    def __enter__(self):
+        async def start():
+            app = web.Application()
+            app.router.add_get("/newslist", self.newslist)
+            self._runner = web.AppRunner(app)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, "127.0.0.1", 0).start()
+            return f"http://127.0.0.1:{self._runner.addresses[0][1]}/newslist"
+
+        self._thread.start()
+        self.base_url = asyncio.run_coroutine_threadsafe(start(), self._loop).result()
+        return self
+
+    def __exit__(self, *exc_info):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def page_requests(self, page):
+        return [requested_at for requested_page, requested_at in self.requests if requested_page == page]
+
+
+def _news(news_id, publish_at):
+    return {"newsId": news_id, "publishAt": int(publish_at.timestamp()), "title": f"新聞 {news_id}",
+            "content": "內文", "summary": "", "keyword": [], "categoryName": "台股", "categoryId": 827}
+
+
+def _news_pages(page_count, page_size=3):
+    """由新到舊排列的新聞，newsId 由大到小"""
+    latest = datetime(2024, 9, 8, 18, 0)
+    news_count = page_count * page_size
+    news_list = [_news(news_count - position, latest - timedelta(minutes=position)) for position in range(news_count)]
+    return {page: news_list[(page - 1) * page_size:page * page_size] for page in range(1, page_count + 1)}
+
+
+def _spider(stub, **kwargs):
+    return AsyncCnyesNewsSpider(**{"rate_limit": 1000.0, "burst": 100, "max_concurrency": 4, "max_retries": 3,
+                                   "backoff_base": 0.05, "backoff_max": 0.05, "api_url": stub.base_url, **kwargs})
+
+
+def test_fetch_keeps_page_order_and_deduplicates_shifted_pages():
+    pages = _news_pages(5)
+    # 抓取期間有新文章發佈，第 3 頁位移後重複出現第 2 頁最後一篇
+    pages[3] = [pages[2][-1]] + pages[3][:-1]
+    # 後面的頁面先回應，結果仍需依頁面順序排列
+    delays = {page: 0.05 * (6 - page) for page in pages}
+    with StubNewsApi(pages, delays=delays) as stub:
+        news_data_list = _spider(stub).fetch_all_news_within_timeframe()
+
+    expected_ids = [news["newsId"] for page in sorted(pages) for news in pages[page]]
+    expected_ids = list(dict.fromkeys(expected_ids))
+    assert [news_data["news_id"] for news_data in news_data_list] == expected_ids
+    assert len(expected_ids) == 14
+    assert news_data_list[0]["url"].endswith(f"/{expected_ids[0]}")
+
+
+def test_fetch_retries_transient_errors_with_backoff():
+    pages = _news_pages(3)
+    with StubNewsApi(pages, statuses={2: [503, 429]}) as stub:
+        news_data_list = _spider(stub).fetch_all_news_within_timeframe()
+
+    assert len(news_data_list) == 9
+    # 503 與 429 之後各退避一次，第三次才成功
+    retried_at = stub.page_requests(2)
+    assert len(retried_at) == 3
+    assert all(later >= earlier for earlier, later in zip(retried_at, retried_at[1:]))
+
+
+def test_fetch_raises_when_page_still_fails_after_retries():
+    pages = _news_pages(4)
+    with StubNewsApi(pages, statuses={3: [500] * 3}) as stub:
+        # 重試用盡的頁面不可默默變成空頁，呼叫端（例如增量模式）才不會越過缺漏的新聞
+        with pytest.raises(ConnectionError, match=r"\[3\]"):
+            _spider(stub).fetch_all_news_within_timeframe()
+        assert len(stub.page_requests(3)) == 3
+
+    with StubNewsApi(pages, statuses={3: [500] * 3}) as stub:
+        yielded_pages = []
+        with pytest.raises(ConnectionError, match=r"\[3\]"):
+            for news_page in _spider(stub, max_concurrency=2).iter_news_pages():
+                yielded_pages.append([news_data["news_id"] for news_data in news_page])
+        # 失敗頁之前的批次已產出
+        assert yielded_pages == [[news["newsId"] for news in pages[1]]]
+
+
+def test_iter_news_pages_fetches_in_batches_of_max_concurrency():
+    pages = _news_pages(7)
+    with StubNewsApi(pages, delays={page: 0.05 for page in pages}) as stub:
+        yielded_pages = []
+        for news_page in _spider(stub, max_concurrency=3).iter_news_pages():
+            yielded_pages.append([news_data["news_id"] for news_data in news_page])
+            # 產出第 k 頁時只請求到該頁所屬批次的最後一頁（1、4、4、4、7、7、7）
+            requested_pages = {page for page, _ in stub.requests}
+            assert max(requested_pages) <= 1 + 3 * ((len(yielded_pages) + 1) // 3)
+
+    assert yielded_pages == [[news["newsId"] for news in pages[page]] for page in sorted(pages)]
+    assert stub.max_in_flight <= 3
+    # 第 1 頁單獨抓取，之後每批 3 頁：2-4、5-7
+    first_requested = {page: min(stub.page_requests(page)) for page in pages}
+    assert first_requested[5] > max(first_requested[page] for page in (2, 3, 4))
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction_system.controller.backtester import MentionBacktester, expand_grid, run_sweep
+
+
+@pytest.fixture(scope="module")
+def panel():
+    # 60 個交易日 x 8 檔股票，部分日期停牌（收盤價為 NaN），並加入幾次提及暴增
+    rng = np.random.default_rng(7)
+    dates = pd.DatetimeIndex(pd.bdate_range("2024-01-02", periods=60), name="日期")
+    codes = pd.Index([str(code) for code in range(2301, 2309)], name="股票代碼")
+    mentions = rng.poisson(1.0, size=(len(dates), len(codes))).astype(float)
+    mentions[rng.integers(10, 60, size=12), rng.integers(0, len(codes), size=12)] += 8
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, size=mentions.shape), axis=0))
+    close[rng.random(close.shape) < 0.05] = np.nan
+    return pd.DataFrame(mentions, index=dates, columns=codes), pd.DataFrame(close, index=dates, columns=codes)
+
+
+def _dense_signals(mentions, close, config):
+    """逐日、逐檔計算選股結果，作為向量化版本的對照"""
+    lookback = config["lookback"]
+    selected = np.zeros(mentions.shape, dtype=bool)
+    for day in range(len(mentions)):
+        window_sum = mentions[max(0, day - lookback + 1):day + 1].sum(axis=0)
+        eligible = [stock for stock in range(mentions.shape[1])
+                    if not np.isnan(close[day, stock]) and window_sum[stock] >= config["min_mentions"]]
+        if config["rule"] == "top_n":
+            # 分數相同時依欄位順序
+            ranked = sorted(eligible, key=lambda stock: -window_sum[stock])
+            selected[day, ranked[:config["top_n"]]] = True
+        elif day >= lookback:
+            history = mentions[day - lookback:day]
+            z_scores = (mentions[day] - history.mean(axis=0)) / np.maximum(history.std(axis=0), 1.0)
+            selected[day, [stock for stock in eligible if z_scores[stock] >= config["z_threshold"]]] = True
+    return selected
+
+
+def _dense_net_returns(close, selected, config):
+    """以 日期 x 股票 的持倉權重矩陣計算每日淨報酬"""
+    holding_days = config["holding_days"]
+    pick_counts = selected.sum(axis=1, keepdims=True)
+    portfolios = np.divide(selected, pick_counts, out=np.zeros(selected.shape), where=pick_counts > 0)
+    weights = np.zeros(selected.shape)
+    for day in range(len(selected)):
+        weights[day] = portfolios[max(0, day - holding_days + 1):day + 1].sum(axis=0) / holding_days
+
+    next_returns = np.nan_to_num(close[1:] / close[:-1] - 1, nan=0.0)
+    gross_returns = (weights[:-1] * next_returns).sum(axis=1)
+    turnover = np.abs(np.diff(weights, axis=0, prepend=0)).sum(axis=1)[:-1]
+    return gross_returns - turnover * config["cost_bps"] / 10000
+
+
+CONFIGS = expand_grid({"rule": ["top_n"], "lookback": [1, 5], "top_n": [1, 3], "holding_days": [1, 3],
+                       "cost_bps": [0, 30]}) + \
+    expand_grid({"rule": ["spike"], "lookback": [5, 10], "z_threshold": [2.05, 2.95], "holding_days": [1, 4],
+                 "cost_bps": [0, 30]})  # 門檻避開整數，z-score 恰好等於門檻時兩種算法的捨入誤差可能不同
+
+
+@pytest.mark.parametrize("config", CONFIGS, ids=lambda config: "-".join(
+    str(config[name]) for name in ("rule", "lookback", "top_n", "z_threshold", "holding_days", "cost_bps")))
+def test_vectorized_backtest_matches_dense_computation(panel, config):
+    mention_counts, close = panel
+    backtester = MentionBacktester(mention_counts, close)
+    expected_signals = _dense_signals(mention_counts.to_numpy(), close.to_numpy(), config)
+
+    np.testing.assert_array_equal(backtester.signals(config), expected_signals)
+    assert expected_signals.any()
+
+    metrics, net_returns = backtester.run(config, return_series=True)
+    np.testing.assert_allclose(net_returns.to_numpy(),
+                               _dense_net_returns(close.to_numpy(), expected_signals, config), atol=1e-12)
+    assert list(net_returns.index) == list(mention_counts.index[:-1])
+    assert metrics["picks"] <= expected_signals.sum()
+
+
+def test_parallel_sweep_equals_serial_sweep(panel):
+    backtester = MentionBacktester(*panel)
+    serial_metrics, serial_returns = run_sweep(backtester, CONFIGS, workers=1, batch_size=5)
+    parallel_metrics, parallel_returns = run_sweep(backtester, CONFIGS, workers=2, batch_size=5)
+
+    pd.testing.assert_frame_equal(parallel_metrics, serial_metrics)
+    pd.testing.assert_frame_equal(parallel_returns, serial_returns)
+    # 每日淨報酬的欄位依設定編號排列，與逐一呼叫 run 相同
+    np.testing.assert_array_equal(serial_returns[3].to_numpy(),
+                                  backtester.run(CONFIGS[3], return_series=True)[1].to_numpy())
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from stock_prediction_system.controller.dag_runner import DagRunner, PipelineStep
+
+
+def _step_fingerprint(func, **kwargs):
+    return PipelineStep("step", func, **kwargs).fingerprint([])
+
+
+def test_fingerprint_changes_with_constants_and_names():
+    # 三個函式的位元碼相同，只有常數或引用的名稱不同
+    assert _step_fingerprint(lambda: "2024-09-01") != _step_fingerprint(lambda: "2024-09-02")
+    assert _step_fingerprint(lambda: len([])) != _step_fingerprint(lambda: sum([]))
+
+
+def test_fingerprint_covers_nested_code():
+    # 巢狀 lambda 的常數改變時，外層函式的指紋也要改變
+    assert _step_fingerprint(lambda: (lambda: 1)) != _step_fingerprint(lambda: (lambda: 2))
+
+
+def test_fingerprint_changes_with_version():
+    func = lambda: 1
+    assert _step_fingerprint(func, version=1) == _step_fingerprint(func, version=1)
+    assert _step_fingerprint(func, version=1) != _step_fingerprint(func, version=2)
+
+
+def test_fingerprint_is_stable_across_processes():
+    # frozenset 常數的迭代順序受 PYTHONHASHSEED 影響、巢狀 code object 的 repr 含記憶體位址，指紋仍需一致
+    script = ("from stock_prediction_system.controller.dag_runner import PipelineStep\n"
+              "func = lambda x: x in {'cnyes', 'anue', 'udn', 'ctee'} and (lambda: x)\n"
+              "print(PipelineStep('step', func).fingerprint([]))")
+    fingerprints = {subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                                   env={"PYTHONHASHSEED": str(seed), "PYTHONPATH": str(Path(__file__).resolve().parents[1])}).stdout
+                    for seed in range(4)}
+    assert len(fingerprints) == 1
+
+
+def test_version_bump_invalidates_cache(tmp_path):
+    calls = []
+
+    def run(version):
+        dag_runner = DagRunner(str(tmp_path))
+        dag_runner.add_step("step", lambda: calls.append(version) or len(calls), version=version)
+        dag_runner.run()
+        return dag_runner.run_stats["step"]["cache"]
+
+    assert run(1) == "miss"
+    assert run(1) == "hit"
+    assert run(2) == "miss"
+    assert calls == [1, 2]
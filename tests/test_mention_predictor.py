@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+
+from stock_prediction_system.controller.mention_predictor import MentionPricePanel
+
+
+def test_mention_features_need_full_covered_window():
+    dates = pd.bdate_range("2024-07-01", periods=30)
+    counts = pd.DataFrame({"2330": np.ones(30)}, index=dates)
+    counts.iloc[:5] = np.nan  # 前 5 天尚未收錄新聞
+    features = MentionPricePanel(mention_windows=(5, 20)).mention_features(counts)
+
+    # 沒有新聞的日子為 0；尚未收錄的日子，以及視窗涵蓋到未收錄日子的特徵皆為缺值
+    assert features["mention_log"]["2330"].isna().tolist() == [True] * 5 + [False] * 25
+    assert features["mention_log_5d"]["2330"].first_valid_index() == dates[9]
+    assert features["mention_z_20d"]["2330"].first_valid_index() == dates[24]
+    assert features["mention_log_5d"]["2330"].iloc[-1] == np.log1p(5)
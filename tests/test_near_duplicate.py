@@ -0,0 +1,59 @@
+import numpy as np
+
+from stock_prediction_system.controller.near_duplicate import NearDuplicateIndex
+
+STORY = ("台積電公布八月營收，年增百分之三十三，創下歷史新高。法人預期第三季營收可望優於財測，"
+         "先進製程需求強勁，外資連續三日買超，股價同步走強。")
+
+
+def _article(news_id, publish_at, text):
+    return {"news_id": news_id, "publish_at": publish_at, "clean_text": text}
+
+
+def _texts(count):
+    return [f"第{news_id}則：{STORY[news_id % 10:]}{news_id * 7919}" * 2 for news_id in range(count)]
+
+
+def test_save_prunes_articles_older_than_max_age(tmp_path):
+    index_path = str(tmp_path / "near_duplicate_index.npz")
+    near_duplicate_index = NearDuplicateIndex(max_age_days=30)
+    near_duplicate_index.tag_articles([
+        _article(1, "2024-07-01 09:00:00", "鴻海AI伺服器出貨暢旺，法人看好下半年營運，股價同步走強。" * 2),
+        _article(2, "2024-08-20 09:00:00", STORY),
+        _article(3, "2024-09-08 09:00:00", "聯發科法說會釋出第四季展望，天璣晶片出貨持續成長，毛利率維持高檔。" * 2),
+    ])
+    near_duplicate_index.save(index_path)
+
+    # 以索引內最新文章的發佈時間為基準，超過 30 天的文章在寫入前移除
+    loaded = NearDuplicateIndex.load(index_path)
+    assert len(loaded) == 2
+    assert loaded.cluster_of(1) is None
+    assert loaded.cluster_of(2) == 2
+    assert loaded.max_age_days == 30
+
+    # 移除後重建的 LSH 桶仍能找到保留下來的文章
+    repost = _article(4, "2024-09-08 10:00:00", "轉載：" + STORY)
+    assert loaded.tag_articles([repost]) == 1
+    assert repost["cluster_id"] == 2
+
+
+def test_prune_keeps_index_consistent_when_growing(tmp_path):
+    near_duplicate_index = NearDuplicateIndex(initial_capacity=4, max_age_days=None)
+    articles = [_article(news_id, f"2024-09-{news_id % 28 + 1:02d} 09:00:00", text)
+                for news_id, text in enumerate(_texts(20))]
+    near_duplicate_index.tag_articles(articles)
+    assert near_duplicate_index.prune(max_age_days=10) > 0
+
+    # 移除後繼續加入文章，陣列擴充與 news_id -> row 對應仍正確
+    near_duplicate_index.tag_articles([_article(100 + news_id, "2024-09-28 09:00:00", text)
+                                       for news_id, text in enumerate(_texts(20))])
+    for article in articles:
+        if article["publish_at"] >= "2024-09-18":
+            assert near_duplicate_index.cluster_of(article["news_id"]) == article["cluster_id"]
+            assert near_duplicate_index.cluster_of(100 + article["news_id"]) == article["cluster_id"]
+
+    index_path = str(tmp_path / "near_duplicate_index.npz")
+    near_duplicate_index.save(index_path)
+    loaded = NearDuplicateIndex.load(index_path)
+    assert len(loaded) == len(near_duplicate_index)
+    assert np.array_equal(loaded._published[:len(loaded)], near_duplicate_index._published[:len(loaded)])
@@ -0,0 +1,115 @@
+import asyncio
+
+from aiohttp import web
+
+from stock_prediction_system.controller.news_sources import NewsSourceCollector, UdnSource
+
+# 內文需超過 MIN_FINGERPRINT_LENGTH 才會以內文指紋去重
+CONTENT = ("台積電公布八月營收，年增百分之三十三，創下歷史新高。法人預期第三季營收可望優於財測，"
+           "先進製程需求強勁，外資連續三日買超，股價同步走強。")
+
+
+def _story_page(content):
+    return f"<html><body><section class='article-content__editor'><p>{content}</p></section></body></html>"
+
+
+def _listing(*items):
+    return {"lists": [{"titleLink": link, "title": title, "time": {"date": publish_at}}
+                      for link, title, publish_at in items]}
+
+
+class StubSource(UdnSource):
+    """以 udn 的解析邏輯抓取本機測試伺服器，不受真實網站的限流"""
+    rate_limit = 1000.0
+    burst = 100
+
+    def __init__(self, name, base_url):
+        super().__init__(max_pages=1)
+        self.name = name
+        self.base_url = base_url
+        self.list_url = f"{base_url}/{name}/api/more"
+        self.domains = (base_url.split("//")[1],)
+
+
+def _stub_app():
+    listings = {
+        "udn": _listing(("/news/story/1", "台積電八月營收創高", "2024-09-08 10:00"),
+                        ("/news/story/2", "聯發科法說", "2024-09-08 09:00")),
+        # 同一篇文章帶追蹤參數（網址去重），以及換網址轉載的同一篇內文（內文指紋去重）
+        "mirror": _listing(("/news/story/1?from=mirror", "台積電八月營收創高", "2024-09-08 10:00"),
+                           ("/mirror/3", "轉載：台積電營收", "2024-09-08 11:00"),
+                           ("/mirror/4", "鴻海AI伺服器出貨", "2024-09-08 12:00")),
+        # time 欄位格式錯誤，解析時拋出例外
+        "broken": {"lists": [{"titleLink": "/broken/1", "title": "壞掉的列表", "time": "2024-09-08"}]},
+    }
+    stories = {"/news/story/1": CONTENT, "/news/story/2": "聯發科法說會釋出第四季展望，天璣晶片出貨持續成長，毛利率維持高檔。",
+               "/mirror/3": CONTENT, "/mirror/4": "鴻海AI伺服器出貨暢旺，法人看好下半年營運，股價同步走強。"}
+
+    async def listing(request):
+        return web.json_response(listings[request.match_info["source"]])
+
+    async def story(request):
+        return web.Response(text=_story_page(stories[request.path]), content_type="text/html", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/{source}/api/more", listing)
+    app.router.add_get("/news/story/{id}", story)
+    app.router.add_get("/mirror/{id}", story)
+    return app
+
+
+def _collect(source_names, start_time=None, high_water_marks=None, base_url=None):
+    collector = NewsSourceCollector([StubSource(name, base_url) for name in source_names])
+    return collector, collector.collect_async(start_time=start_time, end_time="2024-09-08 23:59:59",
+                                              high_water_marks=high_water_marks)
+
+
+def _serve(scenario):
+    """啟動本機測試伺服器後執行 scenario(base_url)；news_id 由網址雜湊產生，同一個情境需使用同一個伺服器"""
+    async def run():
+        runner = web.AppRunner(_stub_app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        try:
+            return await scenario(f"http://127.0.0.1:{runner.addresses[0][1]}")
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def test_collector_deduplicates_across_sources_and_isolates_failures():
+    async def scenario(base_url):
+        collector, collecting = _collect(["udn", "broken", "mirror"], "2024-09-08 00:00:00", base_url=base_url)
+        return collector, await collecting
+
+    collector, articles = _serve(scenario)
+
+    # 排在前面的來源優先保留；網址相同或內文相同的轉載只留一篇
+    assert [(article["source"], article["title"]) for article in articles] == [
+        ("mirror", "鴻海AI伺服器出貨"), ("udn", "台積電八月營收創高"), ("udn", "聯發科法說")]
+    assert collector.stats["mirror"]["fetched"] == 3
+    assert collector.stats["mirror"]["duplicates"] == 2
+    assert all(article["clean_text"] for article in articles)
+
+    # 單一來源拋出例外時不影響其他來源，也不會留下該來源的文章
+    assert collector.stats["broken"] == {"fetched": 0, "duplicates": 0, "seconds": None}
+    assert "broken" not in collector.source_articles
+    assert len(collector.source_articles["mirror"]) == 3
+
+
+def test_collector_fetches_each_source_after_its_high_water_mark():
+    async def scenario(base_url):
+        _, collecting = _collect(["udn"], "2024-09-08 00:00:00", base_url=base_url)
+        story_1_id = next(article["news_id"] for article in await collecting if article["title"] == "台積電八月營收創高")
+        high_water_marks = {"udn": {"publish_at": "2024-09-08 10:00:00", "news_ids": [story_1_id]},
+                            "mirror": {"publish_at": "2024-09-08 11:00:00", "news_ids": []}}
+        collector, collecting = _collect(["udn", "mirror"], "2024-09-08 00:00:00", high_water_marks, base_url)
+        return collector, await collecting
+
+    collector, articles = _serve(scenario)
+
+    # udn 的兩篇都不晚於 mark；mirror 只抓 11:00 之後（含同一秒尚未匯入的 news_id）
+    assert collector.stats["udn"]["fetched"] == 0
+    assert [article["title"] for article in articles] == ["鴻海AI伺服器出貨", "轉載：台積電營收"]
@@ -0,0 +1,35 @@
+import os
+
+from stock_prediction_system.model.news_store import NewsParquetStore
+
+
+def _news(news_id, publish_at, content="內文"):
+    return {"news_id": news_id, "url": f"https://news.cnyes.com/news/id/{news_id}", "title": f"新聞 {news_id}",
+            "content": content, "keyword": ["台股"], "publish_at": publish_at, "clean_text": f"新聞 {news_id} {content}",
+            "source": "cnyes"}
+
+
+def _partition_files(tmp_path, publish_date):
+    return os.listdir(tmp_path / "news_store" / f"publish_date={publish_date}")
+
+
+def test_append_skips_unchanged_news_and_replaces_edited_news(tmp_path):
+    news_store = NewsParquetStore(str(tmp_path / "news_store"))
+    assert news_store.append([_news(1, "2024-09-08 09:00:00"), _news(2, "2024-09-08 10:00:00"),
+                              _news(3, "2024-09-09 09:00:00")]) == 3
+
+    # 內容相同的重複匯入不寫入任何檔案
+    assert news_store.append([_news(1, "2024-09-08 09:00:00"), _news(3, "2024-09-09 09:00:00")]) == 0
+    assert len(_partition_files(tmp_path, "2024-09-08")) == 1
+
+    # 編輯過的新聞以新內容取代，同一次匯入的新文章一併寫入，分區內每個 news_id 只有一列
+    assert news_store.append([_news(2, "2024-09-08 10:00:00", content="更正後的內文"),
+                              _news(4, "2024-09-08 11:00:00")]) == 2
+    news_data_list = news_store.read_news(start_time="2024-09-08 00:00:00", end_time="2024-09-08 23:59:59")
+    assert [news_data["news_id"] for news_data in news_data_list] == [4, 2, 1]
+    assert news_data_list[1]["content"] == "更正後的內文"
+    assert news_data_list[1]["clean_text"] == "新聞 2 更正後的內文"
+    assert len(_partition_files(tmp_path, "2024-09-08")) == 1
+
+    # 其他日期分區不受影響
+    assert [news_data["news_id"] for news_data in news_store.read_news(start_time="2024-09-09 00:00:00")] == [3]
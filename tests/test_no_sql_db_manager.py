@@ -0,0 +1,55 @@
+import mongomock
+import pytest
+
+from stock_prediction_system.model import no_sql_db_manager
+from stock_prediction_system.model.no_sql_db_manager import MongoDBManager
+
+
+def _news(news_id, title="台積電營收創高", publish_at="2024-09-05 11:25:01"):
+    return {"news_id": news_id, "url": f"https://news.cnyes.com/news/id/{news_id}", "title": title,
+            "content": "內文", "keyword": ["台積電"], "publish_at": publish_at}
+
+
+@pytest.fixture
+def mongo_manager(monkeypatch):
+    monkeypatch.setattr(no_sql_db_manager, "MongoClient", mongomock.MongoClient)
+    return MongoDBManager({"database": {"mongodb": {"uri": "mongodb://localhost:27017", "name": "stock_war_room"}}})
+
+
+def test_bulk_upsert_skips_duplicate_news_id_and_fingerprint(mongo_manager):
+    first = mongo_manager.bulk_upsert_with_fingerprint("stock_news", [_news(1), _news(2, title="聯發科法說")])
+    assert (first["inserted"], first["duplicates"]) == (2, 0)
+
+    # 轉載的新聞換了 news_id，url、標題與內文皆相同，指紋也相同
+    reposted = {**_news(1), "news_id": 3}
+    second = mongo_manager.bulk_upsert_with_fingerprint("stock_news", [_news(1), reposted, _news(4, title="鴻海")],
+                                                        batch_size=2)
+    # news_id 1 已存在、news_id 3 指紋重複觸發 11000，同批次其他資料仍會寫入
+    assert (second["inserted"], second["duplicates"]) == (1, 2)
+    assert sorted(document["news_id"] for document in mongo_manager.find_with_filter("stock_news", {})) == [1, 2, 4]
+
+
+def test_documents_without_fingerprint_do_not_conflict(mongo_manager):
+    mongo_manager.ensure_news_indexes("stock_news")
+    collection = mongo_manager.get_collection("stock_news")
+    fingerprint_index = collection.index_information()["content_fingerprint_1"]
+    assert fingerprint_index["partialFilterExpression"] == {"content_fingerprint": {"$exists": True}}
+
+    # 沒有指紋欄位的舊資料不受指紋唯一索引限制
+    collection.insert_many([{"news_id": 101}, {"news_id": 102}])
+    result = mongo_manager.bulk_upsert_with_fingerprint("stock_news", [_news(1)])
+    assert result["inserted"] == 1
+    assert collection.count_documents({}) == 3
+
+
+def test_non_duplicate_write_errors_are_raised(mongo_manager, monkeypatch):
+    collection = mongo_manager.get_collection("stock_news")
+
+    def failing_bulk_write(self, operations, ordered):
+        # 11000 以外的寫入錯誤（例如 schema 驗證失敗）不可被當成重複資料略過
+        raise no_sql_db_manager.BulkWriteError({"writeErrors": [{"index": 0, "code": 121, "errmsg": "validation"}],
+                                                "upserted": []})
+
+    monkeypatch.setattr(type(collection), "bulk_write", failing_bulk_write)
+    with pytest.raises(no_sql_db_manager.BulkWriteError):
+        mongo_manager.bulk_upsert_with_fingerprint("stock_news", [_news(1)])
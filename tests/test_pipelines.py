@@ -0,0 +1,372 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+from stock_prediction_system.controller import pipelines
+from stock_prediction_system.controller.mention_matrix import MentionMatrixStore
+from stock_prediction_system.controller.mention_predictor import RidgeModel
+from stock_prediction_system.controller.pipelines import (count_stock_times_in_news, daily_price_download,
+                                                          stock_news_extraction, stock_prediction,
+                                                          sub_industry_download)
+from stock_prediction_system.controller.security_master import SecurityMaster
+from stock_prediction_system.controller.spike_detector import MentionSpikeDetector
+from stock_prediction_system.controller.price_store import PriceStore
+from stock_prediction_system.controller.sub_industry import SubIndustryTaxonomy
+from stock_prediction_system.model.ingestion_state_store import IngestionStateStore
+from stock_prediction_system.model.news_store import NewsParquetStore
+
+
+def _news(news_id, publish_at):
+    return {"news_id": news_id, "title": f"新聞 {news_id}", "content": "內文", "publish_at": publish_at}
+
+
+class FakeNewsSpider:
+    source = "cnyes"
+
+    def __init__(self, news_data_list):
+        self.news_data_list = sorted(news_data_list, key=lambda news_data: news_data["publish_at"], reverse=True)
+
+    def fetch_all_news_within_timeframe(self, start_time=None, end_time=None):
+        return [dict(news_data) for news_data in self.news_data_list
+                if (start_time is None or news_data["publish_at"] >= start_time)
+                and (end_time is None or news_data["publish_at"] <= end_time)]
+
+    def fetch_news_since(self, high_water_mark, end_time=None):
+        return [news_data for news_data in self.fetch_all_news_within_timeframe(high_water_mark["publish_at"], end_time)
+                if news_data["news_id"] not in high_water_mark["news_ids"]]
+
+
+class FailingPageSpider(FakeNewsSpider):
+    """逐頁產出新聞，產出 fail_after 頁後拋出連線錯誤"""
+
+    def __init__(self, news_pages, fail_after):
+        super().__init__([news_data for news_page in news_pages for news_data in news_page])
+        self.news_pages = news_pages
+        self.fail_after = fail_after
+
+    def iter_news_pages(self, start_time=None, end_time=None):
+        for page_index, news_page in enumerate(self.news_pages):
+            if page_index == self.fail_after:
+                raise ConnectionError("cnyes api unavailable")
+            yield [dict(news_data) for news_data in news_page]
+
+
+class FakePathSetting:
+    def __init__(self, files_path):
+        self.files_path = files_path
+
+    def __call__(self):
+        return self
+
+    def get_files_path(self, key):
+        return self.files_path[key]
+
+
+@pytest.fixture
+def stream_paths(tmp_path, monkeypatch):
+    files_path = {"news_store_path": str(tmp_path / "news_store"),
+                  "near_duplicate_index_path": str(tmp_path / "near_duplicate_index.npz")}
+    monkeypatch.setattr(pipelines, "PathSetting", FakePathSetting(files_path))
+    return files_path
+
+
+@pytest.fixture
+def count_paths(tmp_path, monkeypatch):
+    root_path = Path(__file__).resolve().parents[1]
+    files_path = {"security_master_path": str(tmp_path / "security_master.feather"),
+                  "stocks_list_path": str(root_path / "data" / "feature" / "stocks_list.csv"),
+                  "disambiguation_config_path": str(root_path / "config" / "stock_disambiguation.yaml"),
+                  "sentiment_lexicon_path": str(root_path / "config" / "sentiment_lexicon.yaml"),
+                  "sub_industry_path": str(tmp_path / "sub_industry.npz"),
+                  "near_duplicate_index_path": str(tmp_path / "near_duplicate_index.npz"),
+                  "spike_detector_state_path": str(tmp_path / "spike_detector.npz"),
+                  "spike_events_path": str(tmp_path / "spike_events.jsonl")}
+    monkeypatch.setattr(pipelines, "PathSetting", FakePathSetting(files_path))
+    return files_path
+
+
+def _news_pages(sample_news, page_size=20):
+    return [[dict(article) for article in sample_news[start:start + page_size]]
+            for start in range(0, len(sample_news), page_size)]
+
+
+@pytest.mark.parametrize("keep_article_matches", [False, True])
+def test_stream_count_keeps_article_matches_only_when_requested(count_paths, sample_news, keep_article_matches):
+    counter = count_stock_times_in_news("count_stock_times_in_news", news_pages=_news_pages(sample_news),
+                                        use_match_cache=False, keep_article_matches=keep_article_matches)
+    stock_counts = counter.execute()
+
+    # 不保留逐篇比對結果時統計結果不變，記憶體不隨文章數成長
+    assert stock_counts["出現次數"].sum() > 0
+    assert len(counter.article_matches) == (len(sample_news) if keep_article_matches else 0)
+
+
+def _stream_with_spider(spider, tag_near_duplicates=True):
+    extraction = stock_news_extraction("stock_news_extraction", "2024-09-01 00:00:00", "2024-09-04 23:59:59",
+                                       tag_near_duplicates=tag_near_duplicates)
+    extraction._get_spider = lambda: spider
+    return extraction.stream(flush_size=10)
+
+
+def test_stream_saves_fetched_news_when_spider_fails(stream_paths):
+    news_pages = [[_news(4, "2024-09-04 09:00:00"), _news(3, "2024-09-03 09:00:00")],
+                  [_news(2, "2024-09-02 09:00:00")],
+                  [_news(1, "2024-09-01 09:00:00")]]
+    streamed_ids = []
+    with pytest.raises(ConnectionError):
+        for news_page in _stream_with_spider(FailingPageSpider(news_pages, fail_after=2)):
+            streamed_ids += [news_data["news_id"] for news_data in news_page]
+
+    # 未達 flush_size 的新聞與近似重複索引在例外時仍會寫入
+    news_store = NewsParquetStore(stream_paths["news_store_path"])
+    assert {news_data["news_id"] for news_data in news_store.read_news(columns=["news_id"])} == set(streamed_ids)
+    assert streamed_ids == [4, 3, 2]
+    assert os.path.exists(stream_paths["near_duplicate_index_path"])
+
+
+def test_stream_saves_current_page_when_consumer_stops(stream_paths):
+    news_pages = [[_news(4, "2024-09-04 09:00:00")], [_news(3, "2024-09-03 09:00:00")]]
+    news_stream = _stream_with_spider(FailingPageSpider(news_pages, fail_after=None), tag_near_duplicates=False)
+    # 下游只取第一頁就中斷，generator 關閉時已產出的新聞仍需寫入
+    next(news_stream)
+    news_stream.close()
+
+    news_store = NewsParquetStore(stream_paths["news_store_path"])
+    assert [news_data["news_id"] for news_data in news_store.read_news(columns=["news_id"])] == [4]
+
+
+def _run_incremental(tmp_path, spider, start_time, end_time, backfill):
+    extraction = stock_news_extraction("stock_news_extraction", start_time, end_time, incremental=True,
+                                       tag_near_duplicates=False, backfill=backfill)
+    news_store = NewsParquetStore(str(tmp_path / "news_store"))
+    state_path = str(tmp_path / "ingestion_state.json")
+    extraction._incremental_news_extraction(spider, news_store, state_path)
+    stored_ids = {news_data["news_id"] for news_data in news_store.read_news(columns=["news_id", "publish_at"])}
+    return stored_ids, IngestionStateStore(state_path).get_high_water_mark("cnyes")
+
+
+def test_incremental_backfill_before_high_water_mark(tmp_path):
+    spider = FakeNewsSpider([_news(1, "2024-09-01 09:00:00"), _news(2, "2024-09-02 09:00:00"),
+                             _news(3, "2024-09-03 09:00:00"), _news(4, "2024-09-04 09:00:00")])
+    stored_ids, _ = _run_incremental(tmp_path, spider, "2024-09-03 00:00:00", "2024-09-04 23:59:59", False)
+    assert stored_ids == {3, 4}
+
+    # 沒有 backfill 時只抓 high-water mark 之後的新聞，較早的區間不會補上
+    stored_ids, _ = _run_incremental(tmp_path, spider, "2024-09-01 00:00:00", "2024-09-04 23:59:59", False)
+    assert stored_ids == {3, 4}
+
+    spider.news_data_list.insert(0, _news(5, "2024-09-05 09:00:00"))
+    stored_ids, high_water_mark = _run_incremental(tmp_path, spider, "2024-09-01 00:00:00", "2024-09-05 23:59:59",
+                                                   True)
+    assert stored_ids == {1, 2, 3, 4, 5}
+    assert high_water_mark["publish_at"] == "2024-09-05 09:00:00"
+
+
+class FakeSubIndustrySpider:
+    memberships = None
+
+    def __init__(self, max_concurrency=8):
+        pass
+
+    def fetch_memberships(self):
+        if self.memberships is None:
+            raise ConnectionError("無法取得族群總覽頁")
+        return self.memberships
+
+
+@pytest.mark.parametrize("memberships", [None, pd.DataFrame(columns=["細產業", "主產業", "股票代碼", "股票名稱"])])
+def test_sub_industry_download_keeps_previous_file_on_failure(tmp_path, monkeypatch, memberships):
+    sub_industry_path = str(tmp_path / "sub_industry.npz")
+    SubIndustryTaxonomy.from_memberships(pd.DataFrame(
+        [("晶圓代工", True, "2330", "台積電"), ("IC設計", True, "2454", "聯發科")],
+        columns=["細產業", "主產業", "股票代碼", "股票名稱"])).save(sub_industry_path)
+    with open(sub_industry_path, "rb") as npz_file:
+        previous_content = npz_file.read()
+
+    monkeypatch.setattr(pipelines, "PathSetting", FakePathSetting({"sub_industry_path": sub_industry_path}))
+    monkeypatch.setattr(FakeSubIndustrySpider, "memberships", memberships)
+    monkeypatch.setattr(pipelines, "SubIndustrySpider", FakeSubIndustrySpider)
+
+    # 連線失敗或所有族群頁都失敗時不拋出例外，也不覆寫上次的快取
+    assert sub_industry_download("sub_industry_download").execute() is None
+    with open(sub_industry_path, "rb") as npz_file:
+        assert npz_file.read() == previous_content
+    assert SubIndustryTaxonomy.load(sub_industry_path).categories_of("2330") == ["晶圓代工"]
+
+
+class FakeCollector:
+    """記錄收到的 high-water mark，並依 mark 篩選各來源的新聞"""
+    articles = {}
+    received_marks = []
+
+    def __init__(self, source_names):
+        self.source_names = source_names
+        self.stats = {}
+        self.source_articles = {}
+
+    @classmethod
+    def from_names(cls, source_names, max_concurrency=16):
+        return cls(source_names)
+
+    def collect(self, start_time=None, end_time=None, high_water_marks=None):
+        FakeCollector.received_marks.append(high_water_marks)
+        for source_name in self.source_names:
+            high_water_mark = (high_water_marks or {}).get(source_name)
+            self.source_articles[source_name] = [
+                {**news_data, "source": source_name} for news_data in self.articles[source_name]
+                if not high_water_mark or news_data["publish_at"] > high_water_mark["publish_at"]]
+            self.stats[source_name] = {"fetched": len(self.source_articles[source_name])}
+        return [news_data for source_name in self.source_names for news_data in self.source_articles[source_name]]
+
+
+def test_multi_source_incremental_tracks_each_source(tmp_path, monkeypatch):
+    files_path = {"news_store_path": str(tmp_path / "news_store"),
+                  "ingestion_state_path": str(tmp_path / "ingestion_state.json")}
+    monkeypatch.setattr(pipelines, "PathSetting", FakePathSetting(files_path))
+    monkeypatch.setattr(pipelines, "NewsSourceCollector", FakeCollector)
+    monkeypatch.setattr(FakeCollector, "received_marks", [])
+    monkeypatch.setattr(FakeCollector, "articles", {"cnyes": [_news(1, "2024-09-02 09:00:00")],
+                                                    "udn": [_news(11, "2024-09-03 09:00:00")]})
+
+    def run():
+        return stock_news_extraction("stock_news_extraction", "2024-09-01 00:00:00", "2024-09-05 23:59:59",
+                                     incremental=True, sources=["cnyes", "udn"], tag_near_duplicates=False).execute()
+
+    assert {news_data["news_id"] for news_data in run()} == {1, 11}
+    # 第一次執行儲存庫為空，抓取完整區間
+    assert FakeCollector.received_marks == [None]
+
+    FakeCollector.articles["udn"].append(_news(12, "2024-09-04 09:00:00"))
+    assert {news_data["news_id"] for news_data in run()} == {1, 11, 12}
+    assert {source_name: high_water_mark["publish_at"]
+            for source_name, high_water_mark in FakeCollector.received_marks[1].items()} == {
+        "cnyes": "2024-09-02 09:00:00", "udn": "2024-09-03 09:00:00"}
+    state = IngestionStateStore(files_path["ingestion_state_path"])
+    assert state.get_high_water_mark("udn") == {"publish_at": "2024-09-04 09:00:00", "news_ids": [12]}
+    assert state.get_high_water_mark("cnyes")["publish_at"] == "2024-09-02 09:00:00"
+
+
+class FakeDailyPriceSpider:
+    prices = None
+
+    def fetch_latest(self, trade_date=None):
+        if self.prices is None:
+            raise requests.ConnectionError("openapi.twse.com.tw unreachable")
+        return self.prices
+
+
+@pytest.mark.parametrize("latest_prices", [None, pd.DataFrame({"日期": [pd.Timestamp("2024-09-09")],
+                                                               "股票代碼": ["2330"], "收盤價": [935.0]})])
+def test_daily_price_download_backfills_file_once(tmp_path, monkeypatch, latest_prices):
+    file_path = str(tmp_path / "daily_prices.csv")
+    pd.DataFrame({"日期": ["2024-09-05", "2024-09-06"], "股票代碼": ["2330", "2330"],
+                  "收盤價": [920.0, 925.0]}).to_csv(file_path, index=False)
+    files_path = {"daily_price_file_path": file_path, "price_store_path": str(tmp_path / "price_store")}
+    monkeypatch.setattr(pipelines, "PathSetting", FakePathSetting(files_path))
+    monkeypatch.setattr(FakeDailyPriceSpider, "prices", latest_prices)
+    monkeypatch.setattr(pipelines, "DailyPriceSpider", FakeDailyPriceSpider)
+
+    ingested = []
+    original_ingest = PriceStore.ingest
+    monkeypatch.setattr(PriceStore, "ingest", lambda self, prices: ingested.append(len(prices)) or
+                        original_ingest(self, prices))
+
+    # 歷史檔只在第一次匯入；之後每次只寫入 OpenAPI 的最近交易日，連線失敗時保留既有價格庫
+    for _ in range(2):
+        assert daily_price_download("daily_price_download").execute() is None
+    expected_dates = ["2024-09-05", "2024-09-06"] + (["2024-09-09"] if latest_prices is not None else [])
+    assert [str(date.date()) for date in PriceStore(files_path["price_store_path"]).dates] == expected_dates
+    assert ingested == ([2] if latest_prices is None else [2, 1, 1])
+
+
+def test_stock_prediction_trains_only_on_mention_coverage(tmp_path, monkeypatch, count_paths):
+    files_path = {**count_paths, "price_store_path": str(tmp_path / "price_store"),
+                  "mention_matrix_path": str(tmp_path / "mention_matrix"),
+                  "prediction_model_path": str(tmp_path / "mention_ridge.npz"),
+                  "model_predict_path": str(tmp_path / "model_predict.csv")}
+    monkeypatch.setattr(pipelines, "PathSetting", FakePathSetting(files_path))
+    security_master = SecurityMaster.load(files_path["security_master_path"], files_path["stocks_list_path"])
+
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2024-03-01", periods=120)
+    stock_codes = ["2330", "2317", "2454"]
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(len(dates), len(stock_codes))), axis=0))
+    PriceStore(files_path["price_store_path"]).ingest(pd.DataFrame({
+        "日期": np.repeat(dates, len(stock_codes)), "股票代碼": np.tile(stock_codes, len(dates)),
+        "收盤價": close.ravel(), "成交股數": rng.integers(1_000, 100_000, size=close.size).astype(float)}))
+
+    # 第 60 個交易日開盤前才開始收錄新聞
+    covered_from = 60
+    MentionMatrixStore(files_path["mention_matrix_path"], security_master).add_articles([
+        (news_id, f"{date:%Y-%m-%d} 09:00:00", np.array([security_master.code_to_id["2330"]]))
+        for news_id, date in enumerate(dates[covered_from:])])
+
+    ranking = stock_prediction("stock_prediction", train_days=200).execute()
+    model = RidgeModel.load(files_path["prediction_model_path"])
+
+    # 提及特徵的 20 天視窗完整落在收錄期間後才納入訓練；最後一天沒有隔日報酬
+    z_window = 20
+    assert model.train_rows == len(stock_codes) * (len(dates) - 1 - (covered_from + z_window - 1))
+    assert ranking.set_index("股票代碼").loc["2330", "新聞提及次數"] == 1
+
+
+def _spike_run(count_paths, articles, page_size=None):
+    """以全新的偵測狀態統計一次；page_size 指定時以串流模式逐頁送入，回傳 (事件, 存檔後的偵測器)"""
+    if os.path.exists(count_paths["spike_detector_state_path"]):
+        os.remove(count_paths["spike_detector_state_path"])
+    articles = [dict(article) for article in articles]
+    if page_size:
+        counter = count_stock_times_in_news("count_stock_times_in_news", news_pages=_news_pages(articles, page_size),
+                                            use_match_cache=False, detect_spikes=True)
+    else:
+        counter = count_stock_times_in_news("count_stock_times_in_news", all_news_data_json=articles,
+                                            use_match_cache=False, detect_spikes=True)
+    counter.execute()
+    security_master = SecurityMaster.load(count_paths["security_master_path"], count_paths["stocks_list_path"])
+    return counter.spike_events, MentionSpikeDetector.load(count_paths["spike_detector_state_path"], security_master)
+
+
+def _hourly_articles(hours, spike=True):
+    """每小時一篇聯發科、每 8 小時一篇台積電；spike 時最後一小時內台積電被大量提及，由舊到新排列"""
+    start_time = pd.Timestamp("2024-09-01 00:00:00")
+    articles = [{"news_id": hour, "title": "聯發科 法說會", "content": "",
+                 "publish_at": f"{start_time + pd.Timedelta(hours=hour, minutes=30):%Y-%m-%d %H:%M:%S}"}
+                for hour in range(hours)]
+    articles += [{"news_id": 1000 + hour, "title": "台積電 營收", "content": "",
+                  "publish_at": f"{start_time + pd.Timedelta(hours=hour, minutes=15):%Y-%m-%d %H:%M:%S}"}
+                 for hour in range(0, hours, 8)]
+    if spike:
+        articles += [{"news_id": 2000 + position, "title": "台積電 先進製程", "content": "",
+                      "publish_at": f"{start_time + pd.Timedelta(hours=hours, minutes=5 * position + 1):%Y-%m-%d %H:%M:%S}"}
+                     for position in range(8)]
+    return sorted(articles, key=lambda article: article["publish_at"])
+
+
+@pytest.mark.parametrize("page_size", [None, 10])
+def test_spike_detector_is_fed_in_publish_order(count_paths, page_size):
+    oldest_first = _hourly_articles(48)
+    expected_events, _ = _spike_run(count_paths, oldest_first)
+    assert "2330" in {event["key"] for event in expected_events if event["kind"] == "stock"}
+
+    # 新聞列表與 API 一樣由新到舊排列（串流模式下每頁與頁面之間皆由新到舊）時，觸發的事件需與依時間順序送入相同
+    events, detector = _spike_run(count_paths, oldest_first[::-1], page_size)
+    assert events == expected_events
+    assert detector.late_articles == 0
+
+
+def test_newest_first_stream_keeps_detector_state(count_paths):
+    # 72 小時、沒有真正暴增的新聞，以每頁 20 篇由新到舊串流送入
+    oldest_first = _hourly_articles(72, spike=False)
+    _, expected_detector = _spike_run(count_paths, oldest_first)
+    events, detector = _spike_run(count_paths, oldest_first[::-1], page_size=20)
+
+    assert events == []
+    assert detector.late_articles == 0
+    assert (detector.start_bucket, detector.latest_bucket) == (expected_detector.start_bucket,
+                                                               expected_detector.latest_bucket)
+    for field in ("count", "bucket", "mean", "var", "ring", "rolling"):
+        np.testing.assert_array_equal(getattr(detector.entities, field), getattr(expected_detector.entities, field))
@@ -0,0 +1,45 @@
+import os
+
+import pandas as pd
+
+from stock_prediction_system.controller.price_store import DailyPriceSpider, PriceStore
+
+
+def _write_prices(file_path, rows):
+    pd.DataFrame(rows, columns=["日期", "股票代碼", "收盤價"]).to_csv(file_path, index=False)
+
+
+def test_import_file_only_once_until_file_changes(tmp_path):
+    file_path = str(tmp_path / "daily_prices.csv")
+    _write_prices(file_path, [("2024-09-05", "2330", 920.0), ("2024-09-06", "2330", 925.0)])
+    price_store = PriceStore(str(tmp_path / "price_store"))
+
+    assert price_store.import_file(file_path) == 2
+    assert price_store.import_file(file_path) is None
+
+    # 檔案更新後重新匯入，同一天的資料以新檔案為準
+    _write_prices(file_path, [("2024-09-06", "2330", 930.0), ("2024-09-09", "2330", 935.0)])
+    os.utime(file_path, ns=(os.stat(file_path).st_atime_ns, os.stat(file_path).st_mtime_ns + 10 ** 9))
+    assert price_store.import_file(file_path) == 2
+    assert price_store.panel("收盤價")["2330"].tolist() == [920.0, 930.0, 935.0]
+
+
+def _stub_spider(monkeypatch, payloads):
+    spider = DailyPriceSpider(twse_url="twse", tpex_url="tpex")
+    monkeypatch.setattr(spider, "_fetch", lambda url: pd.DataFrame(payloads[url]))
+    return spider
+
+
+def test_fetch_latest_uses_payload_date_or_skips(monkeypatch):
+    spider = _stub_spider(monkeypatch, {
+        "twse": [{"Date": "1130906", "Code": "2330", "ClosingPrice": "925.00", "TradeVolume": "31,234,567"}],
+        "tpex": [{"SecuritiesCompanyCode": "6488", "ClosingPrice": "512.00"}],
+    })
+
+    # 上櫃資料沒有日期欄位，未指定 trade_date 時略過，不以今天的日期寫入
+    prices = spider.fetch_latest()
+    assert prices[["日期", "股票代碼", "收盤價"]].values.tolist() == [[pd.Timestamp("2024-09-06"), "2330", 925.0]]
+
+    prices = spider.fetch_latest(trade_date="2024-09-06")
+    assert sorted(prices["股票代碼"]) == ["2330", "6488"]
+    assert set(prices["日期"]) == {pd.Timestamp("2024-09-06")}
@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from stock_prediction_system.controller.mention_aggregator import MentionAggregator
+from stock_prediction_system.controller.security_master import SecurityMaster
+from stock_prediction_system.controller.sentiment import SentimentScorer
+from stock_prediction_system.controller.text_normalizer import TextNormalizer
+
+CONFIG_PATH = Path(__file__).resolve().parents[1] / "config"
+
+
+@pytest.fixture(scope="module")
+def security_master(stock_lists):
+    return SecurityMaster.from_stock_list_frame(stock_lists)
+
+
+@pytest.fixture(scope="module")
+def scorer(security_master):
+    return SentimentScorer.from_yaml(str(CONFIG_PATH / "sentiment_lexicon.yaml"), security_master, TextNormalizer())
+
+
+def _score(scorer, text):
+    return float(scorer.score_texts([TextNormalizer().normalize(text)])[0][0])
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("法人看好", 1.0),
+    ("法人不看好", -1.0),
+    ("營收衰退", -1.0),
+    ("營收未見衰退", 1.0),
+    # 中性詞以最長詞優先吃掉 非、未，不會被當成否定詞
+    ("法人非常看好", 1.0),
+    ("未來營收成長", 1.0),
+])
+def test_negation_flips_polarity(scorer, text, expected):
+    assert _score(scorer, text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    # 否定詞與情緒詞之間有斷句符號時不反轉
+    ("市場不,看好", 1.0),
+    ("並未說明。營收衰退", -1.0),
+    # 相隔超過 negation_window 個字時不反轉
+    ("沒想到今年營收大幅衰退", -1.0),
+])
+def test_negation_does_not_cross_clause_break_or_window(scorer, text, expected):
+    assert _score(scorer, text) == expected
+
+
+def test_longest_match_keeps_negative_term_whole(scorer):
+    # 不佳 是負面詞，其中的 不 不可再當成否定詞去反轉後面的 成長
+    assert _score(scorer, "需求不佳") == -1.0
+    assert _score(scorer, "需求不佳 營收成長") == 0.0
+
+
+def test_mention_window_stays_inside_article(scorer, security_master):
+    tsmc, mediatek = security_master.code_to_id["2330"], security_master.code_to_id["2454"]
+    texts = ["營收大漲,台積電", "大跌的聯發科", "台積電" + "公司" * 30 + "大跌"]
+    article_scores, mention_scores = scorer.score_texts(texts, [[tsmc], [mediatek], [tsmc]])
+
+    # 第一篇結尾的台積電不會算到下一篇開頭的大跌；窗口外的情緒詞只影響文章分數
+    np.testing.assert_array_equal(article_scores, [1.0, -1.0, -1.0])
+    assert [scores.tolist() for scores in mention_scores] == [[1.0], [-1.0], [0.0]]
+
+
+def test_batch_without_lexicon_hits(scorer, security_master):
+    tsmc = security_master.code_to_id["2330"]
+    article_scores, mention_scores = scorer.score_texts(["台積電今天法說會"], [[tsmc]])
+    assert article_scores.tolist() == [0.0]
+    assert [scores.tolist() for scores in mention_scores] == [[0.0]]
+
+    # 串流模式一次評分一頁，整頁沒有情緒詞也不能中斷統計
+    articles = [{"clean_text": "公告董事會日期"}, {"clean_text": ""}]
+    assert [scores.tolist() for scores in scorer.score_articles(articles, [[], []])] == [[], []]
+    assert [article["sentiment"] for article in articles] == [0.0, 0.0]
+
+
+def test_sentiment_columns_in_stock_frame(scorer, security_master):
+    tsmc, mediatek = security_master.code_to_id["2330"], security_master.code_to_id["2454"]
+    articles = [{"clean_text": "台積電營收大漲", "publish_at": "2024-09-08 09:00:00"},
+                {"clean_text": "台積電需求疲弱", "publish_at": "2024-09-08 10:00:00"},
+                {"clean_text": "聯發科法說會", "publish_at": "2024-09-08 11:00:00"}]
+    stock_ids_list = [[tsmc], [tsmc], [mediatek]]
+    weights_list = [[2.0], [1.0], [1.0]]
+    mention_scores = scorer.score_articles(articles, stock_ids_list)
+
+    aggregator = MentionAggregator(security_master)
+    for article, stock_ids, weights, sentiments in zip(articles, stock_ids_list, weights_list, mention_scores):
+        aggregator.add(stock_ids, article["publish_at"], weights, sentiments)
+    stock_frame = aggregator.stock_frame().set_index("股票代碼")
+
+    # 情緒加權次數 = 權重 × 提及情緒分數的加總；情緒分數 = 情緒加權次數 / 加權次數
+    assert stock_frame.loc["2330", "情緒加權次數"] == 2.0 * 1.0 + 1.0 * -1.0
+    assert stock_frame.loc["2330", "情緒分數"] == pytest.approx(1.0 / 3.0)
+    assert stock_frame.loc["2454", "情緒加權次數"] == 0.0
+    assert stock_frame.loc["2454", "情緒分數"] == 0.0
+
+    # 未評分時不輸出情緒欄位
+    unscored = MentionAggregator(security_master)
+    unscored.add([tsmc], "2024-09-08 09:00:00")
+    assert {"情緒加權次數", "情緒分數"}.isdisjoint(unscored.stock_frame().columns)
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction_system.controller.security_master import SecurityMaster
+from stock_prediction_system.controller.spike_detector import MentionSpikeDetector, _EntityState
+
+STOCK_LIST = pd.DataFrame({"股票代碼": ["2330", "2454", "2317", "1101", "2882"],
+                           "股票名稱": ["台積電", "聯發科", "鴻海", "台泥", "國泰金"],
+                           "產業別": ["半導體業", "半導體業", "其他電子業", "水泥工業", "金融保險業"],
+                           "市場別": ["上市"] * 5})
+
+
+@pytest.fixture(scope="module")
+def security_master():
+    return SecurityMaster.from_stock_list_frame(STOCK_LIST)
+
+
+def _simulated_articles(security_master, hours=72, spike_code="2330"):
+    """每小時數篇隨機提及，最後一小時某檔股票被大量提及；發佈時間皆不相同"""
+    rng = np.random.default_rng(0)
+    start_time = datetime(2024, 9, 1)
+    articles = []
+    for hour in range(hours):
+        for position, minute in enumerate(sorted(rng.choice(60, size=rng.poisson(4), replace=False))):
+            publish_at = (start_time + timedelta(hours=hour, minutes=int(minute))).strftime("%Y-%m-%d %H:%M:%S")
+            articles.append((hour * 100 + position, publish_at,
+                             rng.integers(0, len(security_master.code_to_id), size=rng.integers(1, 3))))
+    spike_stock = security_master.code_to_id[spike_code]
+    for position in range(10):
+        publish_at = (start_time + timedelta(hours=hours, minutes=position * 5 + 1)).strftime("%Y-%m-%d %H:%M:%S")
+        articles.append((10 ** 6 + position, publish_at, np.array([spike_stock])))
+    return articles
+
+
+def test_restart_from_saved_state_gives_same_events(tmp_path, security_master):
+    articles = _simulated_articles(security_master)
+    continuous = MentionSpikeDetector(security_master, z_threshold=3.0)
+    expected_events = continuous.update_many(articles)
+    assert "2330" in {event["key"] for event in expected_events if event["kind"] == "stock"}
+
+    # 每 50 篇存檔後重新載入，與不中斷執行的事件及狀態完全相同
+    state_path = str(tmp_path / "spike_detector.npz")
+    MentionSpikeDetector(security_master, z_threshold=3.0).save(state_path)
+    events = []
+    for start in range(0, len(articles), 50):
+        detector = MentionSpikeDetector.load(state_path, security_master)
+        events.extend(detector.update_many(articles[start:start + 50]))
+        detector.save(state_path)
+
+    restarted = MentionSpikeDetector.load(state_path, security_master)
+    assert events == expected_events
+    assert restarted.config == continuous.config
+    assert (restarted.start_bucket, restarted.latest_bucket) == (continuous.start_bucket, continuous.latest_bucket)
+    for field in _EntityState.fields:
+        np.testing.assert_array_equal(getattr(restarted.entities, field), getattr(continuous.entities, field))
+    # 重新送入已處理的文章不重複計數
+    assert restarted.update_many(articles[-5:]) == []
+
+
+def test_load_remaps_state_when_security_master_changes(tmp_path, security_master):
+    state_path = str(tmp_path / "spike_detector.npz")
+    detector = MentionSpikeDetector(security_master)
+    detector.update_many(_simulated_articles(security_master))
+    detector.save(state_path)
+
+    # 新主檔少了台泥、多了一檔新股票並改變順序，既有股票與產業的狀態依代碼與名稱保留，新股票從零開始
+    changed_master = SecurityMaster.from_stock_list_frame(pd.concat([
+        STOCK_LIST[STOCK_LIST["股票代碼"] != "1101"].iloc[::-1],
+        pd.DataFrame({"股票代碼": ["3711"], "股票名稱": ["日月光投控"], "產業別": ["半導體業"], "市場別": ["上市"]})]))
+    reloaded = MentionSpikeDetector.load(state_path, changed_master)
+
+    old_keys = detector.entity_keys.tolist()
+    for position, key in enumerate(reloaded.entity_keys.tolist()):
+        for field in ("mean", "var", "rolling"):
+            expected = getattr(detector.entities, field)[old_keys.index(key)] if key in old_keys else 0
+            assert getattr(reloaded.entities, field)[position] == expected
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+from psycopg2.pool import PoolError
+
+from stock_prediction_system.model import sql_db_manager
+from stock_prediction_system.model.sql_db_manager import PostgreSQLManager
+
+CONFIG = {"database": {"postgres": {"name": "stock_war_room", "user": "postgres", "password": "postgres"}}}
+
+
+class FakeConnection:
+    def cursor(self):
+        return self
+
+    def close(self):
+        pass
+
+    def get_transaction_status(self):
+        return sql_db_manager.TRANSACTION_STATUS_IDLE
+
+
+class FakeConnectionPool:
+    """與 ThreadedConnectionPool 相同，連線用盡時 getconn 立即拋出 PoolError"""
+    created = 0
+
+    def __init__(self, minconn, maxconn, **kwargs):
+        FakeConnectionPool.created += 1
+        self.maxconn = maxconn
+        self.used = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def getconn(self):
+        with self.lock:
+            if self.used >= self.maxconn:
+                raise PoolError("connection pool exhausted")
+            self.used += 1
+            return FakeConnection()
+
+    def putconn(self, conn):
+        with self.lock:
+            self.used -= 1
+
+    def closeall(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_pool(monkeypatch):
+    FakeConnectionPool.created = 0
+    monkeypatch.setattr(sql_db_manager, "ThreadedConnectionPool", FakeConnectionPool)
+    yield
+    PostgreSQLManager.close_all_pools()
+
+
+def test_pool_is_created_on_first_use():
+    postgres_manager = PostgreSQLManager(CONFIG)
+    assert FakeConnectionPool.created == 0
+    with postgres_manager:
+        pass
+    with PostgreSQLManager(CONFIG):
+        pass
+    assert FakeConnectionPool.created == 1
+
+
+def test_exhausted_pool_waits_for_returned_connection():
+    holder = PostgreSQLManager(CONFIG, maxconn=1).__enter__()
+    timer = threading.Timer(0.2, holder.__exit__, args=(None, None, None))
+    timer.start()
+
+    start = time.monotonic()
+    with PostgreSQLManager(CONFIG, maxconn=1, acquire_timeout=5.0) as postgres_manager:
+        assert postgres_manager.conn is not None
+    assert 0.15 <= time.monotonic() - start < 5.0
+    timer.join()
+
+
+def test_exhausted_pool_raises_clear_error_after_timeout():
+    holder = PostgreSQLManager(CONFIG, maxconn=1).__enter__()
+    with pytest.raises(PoolError, match="exhausted.*maxconn"):
+        with PostgreSQLManager(CONFIG, maxconn=1, acquire_timeout=0.2):
+            pass
+    holder.__exit__(None, None, None)
@@ -0,0 +1,106 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_prediction_system.controller.stock_matcher import DisambiguationRules, ParallelStockMatcher, StockMatcher
+from stock_prediction_system.controller.text_normalizer import TextNormalizer
+
+CONFIG_PATH = Path(__file__).resolve().parents[1] / "config"
+
+
+@pytest.fixture(scope="module")
+def rules():
+    return DisambiguationRules.from_yaml(str(CONFIG_PATH / "stock_disambiguation.yaml"))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2330 營收創高", DisambiguationRules.ACCEPT),
+    ("市場關注 2330", DisambiguationRules.ACCEPT),
+    ("2330", DisambiguationRules.ACCEPT),
+    ("關注 2330,營收創高", DisambiguationRules.ACCEPT),
+    ("營收創高的 2330.", DisambiguationRules.ACCEPT),
+    ("2330-TW 營收創高", DisambiguationRules.ACCEPT),
+    ("2002 營收", DisambiguationRules.CORROBORATE),
+    ("(2330)", DisambiguationRules.CORROBORATE),
+    ("指數收 2330.5 點", DisambiguationRules.REJECT),
+    ("成交 1,2330", DisambiguationRules.REJECT),
+    ("$2330", DisambiguationRules.REJECT),
+    ("漲幅 2330%", DisambiguationRules.REJECT),
+    ("2024/2330", DisambiguationRules.REJECT),
+])
+def test_code_status_at_text_boundaries(rules, text, expected):
+    start = text.index("2330") if "2330" in text else text.index("2002")
+    assert rules.code_status(text, start, start + 3) == expected
+
+
+def test_code_followed_by_full_width_comma_is_matched(rules):
+    text_normalizer = TextNormalizer()
+    stock_lists = pd.DataFrame({"股票名稱": ["台積電"], "股票代碼": ["2330"], "產業別": ["半導體業"]})
+    stock_matcher = StockMatcher(stock_lists, text_normalizer, rules)
+    # 全形逗號正規化後為半形逗號，代碼出現在文字開頭或結尾也要能命中
+    for title in ("2330，營收創高", "外資買超 2330", "外資買超 2330，營收創高"):
+        article = {"clean_text": text_normalizer.normalize_article({"title": title, "content": ""})}
+        assert stock_matcher.match_article(article) == {("台積電", "2330", "半導體業")}
+
+
+def _precision_recall(stock_matcher, text_normalizer, articles, labels):
+    true_positive = false_positive = false_negative = 0
+    for label in labels:
+        article = {"clean_text": text_normalizer.normalize_article(articles[label["news_id"]])}
+        matched_codes = {stock_code for _, stock_code, _ in stock_matcher.match_article(article)}
+        label_codes = set(label["stock_codes"])
+        true_positive += len(matched_codes & label_codes)
+        false_positive += len(matched_codes - label_codes)
+        false_negative += len(label_codes - matched_codes)
+    return true_positive / (true_positive + false_positive), true_positive / (true_positive + false_negative)
+
+
+@pytest.mark.parametrize("split, min_precision", [("tune", 0.97), ("holdout", 0.95)])
+def test_disambiguation_on_labelled_news(stock_lists, sample_news, mention_labels, rules, split, min_precision):
+    # tune 為調整規則時參考的樣本；holdout 在規則定案後才標註，代表未見過的新聞
+    text_normalizer = TextNormalizer()
+    stock_matcher = StockMatcher(stock_lists, text_normalizer, rules)
+    articles = {article["news_id"]: article for article in sample_news}
+    labels = [label for label in mention_labels if label["split"] == split]
+
+    precision, recall = _precision_recall(stock_matcher, text_normalizer, articles, labels)
+    substring_precision, _ = _precision_recall(StockMatcher(stock_lists, text_normalizer), text_normalizer,
+                                               articles, labels)
+    assert precision >= min_precision
+    assert recall >= 0.99
+    assert precision > substring_precision
+
+
+def test_automaton_matches_iterrows_substring_search(stock_lists, sample_news):
+    # 未設定消歧規則時，結果需與原本逐列 `term in title or term in content` 的比對完全相同
+    articles = sample_news[:40]
+    expected = []
+    for article in articles:
+        article_title = article.get("title", "")
+        article_content = article.get("content", "")
+        matched_stocks = set()
+        for _, row in stock_lists.iterrows():
+            if any(term in article_title or term in article_content for term in [row["股票名稱"], row["股票代碼"]]):
+                matched_stocks.add((row["股票名稱"], row["股票代碼"], row["產業別"]))
+        expected.append(matched_stocks)
+
+    stock_matcher = StockMatcher(stock_lists)
+    assert [stock_matcher.match_article(article) for article in articles] == expected
+
+
+@pytest.mark.parametrize("workers, shard_size", [(2, 16), (3, 50)])
+def test_parallel_match_equals_serial_match(stock_lists, sample_news, rules, workers, shard_size):
+    # 文章數不是 shard_size 的倍數，最後一個分片較小；合併後的順序與權重需與單程序完全相同
+    stock_matcher = StockMatcher(stock_lists, TextNormalizer(), rules)
+    articles = [dict(article) for article in sample_news]
+    serial_result = [stock_matcher.match_weighted(article) for article in articles]
+
+    with ParallelStockMatcher(stock_matcher, workers=workers, shard_size=shard_size) as parallel_matcher:
+        parallel_result = parallel_matcher.match_weighted(articles)
+
+    assert len(parallel_result) == len(serial_result)
+    for (serial_ids, serial_weights), (parallel_ids, parallel_weights) in zip(serial_result, parallel_result):
+        np.testing.assert_array_equal(parallel_ids, serial_ids)
+        np.testing.assert_array_equal(parallel_weights, serial_weights)